@@ -0,0 +1,73 @@
+#!/usr/bin/env uv run
+"""
+Micro-benchmark: per-request CPU time to render and tokenize long chat histories
+
+Replays a growing conversation turn by turn, once re-rendering and
+re-tokenizing the whole history (the old path) and once through
+PromptTokenCache. Needs a tokenizer with a chat template:
+
+    uv run scripts/benchmarks/bench_prompt_cache.py /path/to/model [turns]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from transformers import AutoTokenizer
+
+from src.prompt_cache import PromptTokenCache
+
+# Mixed Polish clinical text: long words, diacritics, numbers
+USER_TURN = (
+    "Pies, samiec, 7 lat, 32 kg. Od trzech dni wymioty i apatia; ALT 412 U/l, "
+    "ALP 980 U/l, bilirubina 1,8 mg/dl. Jakie badania różnicowe zleciłbyś w pierwszej kolejności? "
+) * 4
+ASSISTANT_TURN = (
+    "W pierwszej kolejności: USG jamy brzusznej, profil koagulologiczny, kwasy żółciowe "
+    "przed i po posiłku oraz test w kierunku leptospirozy. "
+) * 6
+
+
+def render(tokenizer, messages, add_generation_prompt):
+    return tokenizer.apply_chat_template(messages, add_generation_prompt=add_generation_prompt, tokenize=False)
+
+
+def encode(tokenizer, text):
+    bos = tokenizer.bos_token
+    return tokenizer.encode(text, add_special_tokens=bos is None or not text.startswith(bos))
+
+
+def main():
+    tokenizer = AutoTokenizer.from_pretrained(sys.argv[1])
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    cache = PromptTokenCache(
+        "bench",
+        render=lambda messages, gen: render(tokenizer, messages, gen),
+        encode_prompt=lambda text: encode(tokenizer, text),
+        encode_fragment=lambda text: tokenizer.encode(text, add_special_tokens=False),
+        special_ids=set(tokenizer.all_special_ids),
+        budget_bytes=64 * 1024**2,
+    )
+
+    messages = [{"role": "system", "content": "Jesteś asystentem weterynaryjnym."}]
+    print(f"{'turn':>5} {'prompt tokens':>14} {'full ms':>9} {'cached ms':>10}")
+    for turn in range(1, turns + 1):
+        messages.append({"role": "user", "content": f"{turn}. {USER_TURN}"})
+
+        start = time.process_time()
+        full = encode(tokenizer, render(tokenizer, messages, True))
+        full_ms = (time.process_time() - start) * 1e3
+
+        start = time.process_time()
+        cached = cache.encode(messages)
+        cached_ms = (time.process_time() - start) * 1e3
+
+        assert cached == full, f"token mismatch at turn {turn}"
+        if turn % 5 == 0 or turn == 1:
+            print(f"{turn:>5} {len(full):>14} {full_ms:>9.2f} {cached_ms:>10.2f}")
+        messages.append({"role": "assistant", "content": ASSISTANT_TURN})
+
+
+if __name__ == "__main__":
+    main()
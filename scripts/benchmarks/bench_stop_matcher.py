@@ -0,0 +1,63 @@
+#!/usr/bin/env uv run
+"""
+Micro-benchmark: per-token cost of stop-string matching
+
+Compares the streaming Aho-Corasick matcher with re-scanning the tail of
+the text for every stop string, for growing numbers of stop strings.
+"""
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.engine.stop import StopStringMatcher
+
+TOKENS = 20_000
+TOKEN_CHARS = 4  # Rough average for English BPE tokens
+
+
+def make_deltas(n: int) -> list[str]:
+    rng = random.Random(0)
+    alphabet = string.ascii_lowercase + " "
+    return ["".join(rng.choices(alphabet, k=TOKEN_CHARS)) for _ in range(n)]
+
+
+def make_stops(n: int) -> tuple[str, ...]:
+    # Upper case never occurs in the deltas, so nothing matches and every token is checked
+    rng = random.Random(1)
+    return tuple("".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 12))) for _ in range(n))
+
+
+def bench_matcher(deltas: list[str], stops: tuple[str, ...]) -> float:
+    matcher = StopStringMatcher(stops)
+    start = time.perf_counter()
+    for delta in deltas:
+        matcher.feed(delta)
+    return (time.perf_counter() - start) / len(deltas)
+
+
+def bench_rescan(deltas: list[str], stops: tuple[str, ...]) -> float:
+    longest = max(map(len, stops))
+    text = ""
+    start = time.perf_counter()
+    for delta in deltas:
+        text = (text + delta)[-(longest + len(delta)):]
+        any(stop in text for stop in stops)
+    return (time.perf_counter() - start) / len(deltas)
+
+
+def main():
+    deltas = make_deltas(TOKENS)
+    print(f"{'stops':>6} {'matcher us/token':>18} {'rescan us/token':>16}")
+    for n in (1, 4, 16, 64, 256, 1024):
+        stops = make_stops(n)
+        matcher = bench_matcher(deltas, stops) * 1e6
+        rescan = bench_rescan(deltas, stops) * 1e6
+        print(f"{n:>6} {matcher:>18.2f} {rescan:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
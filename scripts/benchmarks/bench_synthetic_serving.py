@@ -0,0 +1,60 @@
+#!/usr/bin/env uv run
+"""
+Benchmark: scheduler and streaming overhead on the synthetic backend
+
+Streams concurrent requests through a BatchScheduler driving the
+synthetic step model. With zero model latency the throughput is pure
+serving overhead (admission, detokenization, stop matching, hand-off to
+the event loop); with a per-step latency it shows how close batching gets
+to the ideal of ``batch size / step latency`` tokens per second. Runs on
+any machine, no MLX needed.
+"""
+import asyncio
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.engine import BatchScheduler, SamplingParams, SyntheticBackend
+
+MAX_TOKENS = 128
+PROMPT = "Summarise the following visit notes for the owner. " * 8
+
+
+async def consume(stream) -> int:
+    deltas = 0
+    async for _ in stream:
+        deltas += 1
+    return deltas
+
+
+async def bench(concurrency: int, decode_ms: float) -> tuple[float, float]:
+    loaded = SyntheticBackend(decode_ms_per_step=decode_ms, kv_bytes_per_token=1).load("bench/model")
+    prompt = loaded.tokenizer.encode(PROMPT)
+    scheduler = BatchScheduler("bench", loaded.step_model, max_batch_size=concurrency)
+    try:
+        params = SamplingParams(max_tokens=MAX_TOKENS, stop_strings=("STOP",))
+        start = time.perf_counter()
+        streams = [scheduler.stream(prompt, replace(params, seed=i)) for i in range(concurrency)]
+        await asyncio.gather(*(consume(s) for s in streams))
+        elapsed = time.perf_counter() - start
+    finally:
+        scheduler.stop()
+    tokens = concurrency * MAX_TOKENS
+    ideal = tokens / (MAX_TOKENS * decode_ms / 1000) if decode_ms else float("inf")
+    return tokens / elapsed, ideal
+
+
+def main():
+    print(f"{'streams':>8} {'step ms':>8} {'tokens/s':>10} {'ideal':>10} {'us/token':>9}")
+    for decode_ms in (0.0, 10.0):
+        for concurrency in (1, 8, 32):
+            rate, ideal = asyncio.run(bench(concurrency, decode_ms))
+            ideal_text = f"{ideal:>10.0f}" if ideal != float("inf") else f"{'-':>10}"
+            print(f"{concurrency:>8} {decode_ms:>8.1f} {rate:>10.0f} {ideal_text} {1e6 / rate:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
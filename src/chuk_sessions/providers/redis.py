@@ -2,6 +2,7 @@
 """Redis-backed session store (wraps redis.asyncio)."""
 from __future__ import annotations
 
+import importlib.util
 import os
 import ssl
 from collections.abc import Callable
@@ -10,13 +11,8 @@ from typing import AsyncContextManager
 
 from ..exceptions import ProviderError
 
-# Try to import redis, but make it optional
-try:
-    import redis.asyncio as aioredis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
-    aioredis = None
+# Redis is optional, and redis.asyncio is slow to import: only look for it here
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
 
 _DEF_URL = os.getenv("SESSION_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 _tls_insecure = os.getenv("REDIS_TLS_INSECURE", "0") == "1"
@@ -38,6 +34,8 @@ def _check_redis_available():
 class _RedisSession:
     def __init__(self, url: str = _DEF_URL):
         _check_redis_available()
+        import redis.asyncio as aioredis
+
         self._r = aioredis.from_url(url, decode_responses=True, **redis_kwargs)
 
     async def set(self, key: str, value: str):
@@ -0,0 +1,168 @@
+"""
+Single-flight sharing of identical in-flight generations
+"""
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable
+
+from prometheus_client import Counter, Gauge
+
+from .engine import GenerationResult, QueuePosition
+from .response_cache import replay
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+requests_coalesced = Counter(
+    "llm_requests_coalesced_total",
+    "Requests attached to an identical generation already in flight instead of starting their own",
+    ["model"]
+)
+
+flights_active = Gauge(
+    "llm_coalescing_flights",
+    "Deterministic generations currently open for other requests to join",
+    ["model"]
+)
+
+
+class Flight:
+    """
+    One running generation and everything it has produced so far.
+
+    Text deltas are kept for the whole run so followers that join late
+    replay them from the start before following live output.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        key: str,
+        source: AsyncIterator,
+        streaming: bool,
+        on_done: Callable[["Flight"], None],
+    ):
+        self.model_id = model_id
+        self.key = key
+        self.streaming = streaming  # False: the source yields only the result
+        self.deltas: list[str] = []
+        self.position: QueuePosition | None = None
+        self.result: GenerationResult | None = None
+        self.error: BaseException | None = None
+        self.done = False
+        self.followers = 0
+        self._changed = asyncio.Event()
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source: AsyncIterator):
+        try:
+            async for item in source:
+                if isinstance(item, GenerationResult):
+                    self.result = item
+                elif isinstance(item, QueuePosition):
+                    self.position = item
+                else:
+                    self.deltas.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            await source.aclose()
+            self.done = True
+            self._on_done(self)
+            self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class RequestCoalescer:
+    """
+    Attaches identical greedy requests to one running generation.
+
+    ``join`` starts a flight for a key that has none, or attaches to the
+    running one. Streaming followers fan out from its token stream, others
+    wait for the final result. A flight nobody follows any more is
+    cancelled, and a finished one is forgotten at once: completed
+    responses are the response cache's job.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(
+        self,
+        model_id: str,
+        key: str,
+        start: Callable[[], AsyncIterator],
+        streaming: bool,
+    ) -> Flight:
+        """The flight for ``key``, started with ``start()`` when none is running"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight(model_id, key, start(), streaming, on_done=self._forget)
+            self._flights[key] = flight
+            flights_active.labels(model=model_id).inc()
+        else:
+            requests_coalesced.labels(model=model_id).inc()
+        flight.followers += 1
+        return flight
+
+    async def follow(self, flight: Flight) -> AsyncIterator[str | QueuePosition | GenerationResult]:
+        """Deltas from the start of the flight, live ones after that, then the result"""
+        try:
+            sent = 0
+            position = None
+            while True:
+                changed = flight._changed
+                while sent < len(flight.deltas):
+                    yield flight.deltas[sent]
+                    sent += 1
+                if flight.done:
+                    break
+                if not sent and flight.position is not position:
+                    position = flight.position
+                    yield position
+                await changed.wait()
+        finally:
+            self._leave(flight)
+
+        if flight.error is not None:
+            raise flight.error
+        if flight.result is None:
+            raise RuntimeError("Generation ended without a result")
+        if flight.streaming:
+            yield flight.result
+        else:
+            async for item in replay(flight.result):
+                yield item
+
+    async def wait(self, flight: Flight) -> GenerationResult:
+        """The flight's final result"""
+        try:
+            while not flight.done:
+                await flight._changed.wait()
+        finally:
+            self._leave(flight)
+        if flight.error is not None:
+            raise flight.error
+        if flight.result is None:
+            raise RuntimeError("Generation ended without a result")
+        return flight.result
+
+    def _leave(self, flight: Flight):
+        flight.followers -= 1
+        if flight.followers <= 0 and not flight.done:
+            # Everyone went away: stop generating and let the next request start afresh
+            self._forget(flight)
+            flight._task.cancel()
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+            flights_active.labels(model=flight.model_id).dec()
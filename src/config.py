@@ -14,7 +14,7 @@ class ServerConfig(BaseSettings):
     # Server settings
     host: str = Field(default="0.0.0.0", env="SERVER_HOST")
     port: int = Field(default=9123, env="SERVER_PORT")
-    workers: int = Field(default=1, env="SERVER_WORKERS")  # MLX works best with single worker
+    workers: int = Field(default=1, env="SERVER_WORKERS")  # >1 moves the models into a shared engine process
 
     # SSL/TLS settings (optional)
     ssl_certfile: Path | None = Field(default=None, env="SSL_CERT")
@@ -39,6 +39,78 @@ class ServerConfig(BaseSettings):
         env="DEFAULT_MODEL"
     )
     max_model_memory_gb: int = Field(default=24, env="MAX_MODEL_MEMORY_GB")
+    model_registry_refresh_seconds: float = Field(default=60, env="MODEL_REGISTRY_REFRESH_SECONDS")  # 0 disables
+
+    # Model residency: pinned models are never evicted, idle ones unload after the TTL
+    pinned_models: list[str] = Field(default=[], env="PINNED_MODELS")
+    model_idle_ttl_minutes: float = Field(default=0, env="MODEL_IDLE_TTL_MINUTES")  # 0 disables
+    max_concurrent_loads: int = Field(default=1, env="MAX_CONCURRENT_LOADS")  # Others queue
+    weights_prefetch_workers: int = Field(default=4, env="WEIGHTS_PREFETCH_WORKERS")  # 0 disables
+    # Requests for a model that is still loading: "queue" (wait up to the timeout) or "reject"
+    model_not_ready_policy: str = Field(default="queue", env="MODEL_NOT_READY_POLICY")
+    model_queue_timeout_seconds: float = Field(default=300, env="MODEL_QUEUE_TIMEOUT_SECONDS")
+    model_retry_after_seconds: int = Field(default=10, env="MODEL_RETRY_AFTER_SECONDS")
+
+    # Synthetic warmup after each load; the model takes traffic only afterwards
+    enable_warmup: bool = Field(default=True, env="ENABLE_WARMUP")
+    warmup_prompt_lengths: list[int] = Field(default=[16, 256, 1024], env="WARMUP_PROMPT_LENGTHS")
+    warmup_decode_steps: int = Field(default=2, env="WARMUP_DECODE_STEPS")
+
+    # Out-of-process engine: HTTP workers reach the model host over this Unix socket (unset = in-process)
+    engine_socket: Path | None = Field(default=None, env="ENGINE_SOCKET")
+    engine_connect_timeout_seconds: float = Field(default=60, env="ENGINE_CONNECT_TIMEOUT_SECONDS")
+    engine_state_interval_seconds: float = Field(default=1.0, env="ENGINE_STATE_INTERVAL_SECONDS")
+
+    # Inference backend: "mlx" (Apple silicon) or "synthetic" (deterministic stand-in for benchmarks and CI)
+    inference_backend: str = Field(default="mlx", env="INFERENCE_BACKEND")
+    synthetic_prefill_ms_per_token: float = Field(default=0.05, env="SYNTHETIC_PREFILL_MS_PER_TOKEN")
+    synthetic_decode_ms_per_step: float = Field(default=20, env="SYNTHETIC_DECODE_MS_PER_STEP")
+    synthetic_kv_bytes_per_token: int = Field(default=128 * 1024, env="SYNTHETIC_KV_BYTES_PER_TOKEN")
+    synthetic_model_gb: float = Field(default=4, env="SYNTHETIC_MODEL_GB")
+
+    # Generation engine
+    max_batch_size: int = Field(default=8, env="MAX_BATCH_SIZE")  # Upper bound, shrinks with KV budget
+    stream_buffer_tokens: int = Field(default=32, env="STREAM_BUFFER_TOKENS")  # Backpressure per stream
+    disconnect_poll_seconds: float = Field(default=0.5, env="DISCONNECT_POLL_SECONDS")  # Cancel abandoned requests
+
+    # Priority admission: lower class is served first; waiting promotes by one class per aging period
+    service_priorities: dict[str, int] = Field(default={}, env="SERVICE_PRIORITIES")  # Overrides ModelRouter
+    queue_aging_seconds: float = Field(default=5.0, env="QUEUE_AGING_SECONDS")
+    queue_position_interval_seconds: float = Field(default=1.0, env="QUEUE_POSITION_INTERVAL_SECONDS")
+    # Weighted fair share of tokens between tenants (service + API key) within a class
+    service_weights: dict[str, float] = Field(default={}, env="SERVICE_WEIGHTS")  # Overrides ModelRouter
+
+    # Prefix KV cache reuse across requests
+    enable_prefix_cache: bool = Field(default=True, env="ENABLE_PREFIX_CACHE")
+    prefix_cache_gb: float = Field(default=4.0, env="PREFIX_CACHE_GB")  # Per model, capped by memory headroom
+    prefix_cache_min_tokens: int = Field(default=32, env="PREFIX_CACHE_MIN_TOKENS")
+
+    # Rendered + tokenized message histories, so a chat turn only tokenizes its new messages
+    prompt_cache_mb: float = Field(default=64.0, env="PROMPT_CACHE_MB")  # Per model, 0 disables
+
+    # KV caches pinned to chat sessions between turns
+    enable_session_cache: bool = Field(default=True, env="ENABLE_SESSION_CACHE")
+    session_cache_gb: float = Field(default=4.0, env="SESSION_CACHE_GB")  # All sessions, all models
+    session_cache_max_session_gb: float = Field(default=1.0, env="SESSION_CACHE_MAX_SESSION_GB")
+
+    # Embedding and reranker models: inputs from concurrent requests share length-bucketed forward passes
+    encode_max_batch_size: int = Field(default=64, env="ENCODE_MAX_BATCH_SIZE")
+    encode_max_batch_tokens: int = Field(default=16384, env="ENCODE_MAX_BATCH_TOKENS")  # Padded tokens per batch
+    embedding_cache_mb: float = Field(default=256.0, env="EMBEDDING_CACHE_MB")  # Vectors by text hash, 0 disables
+    rerank_stream_chunk_size: int = Field(default=64, env="RERANK_STREAM_CHUNK_SIZE")  # Documents per streamed update
+
+    # Identical greedy (temperature 0) requests in flight at the same time share one generation
+    enable_request_coalescing: bool = Field(default=True, env="ENABLE_REQUEST_COALESCING")
+
+    # Finished responses to deterministic (temperature 0) requests
+    enable_response_cache: bool = Field(default=True, env="ENABLE_RESPONSE_CACHE")
+    response_cache_entries: int = Field(default=4096, env="RESPONSE_CACHE_ENTRIES")  # In-process LRU
+    response_cache_ttl_seconds: float = Field(default=3600, env="RESPONSE_CACHE_TTL_SECONDS")
+    response_cache_redis: bool = Field(default=False, env="RESPONSE_CACHE_REDIS")  # Shared tier at redis_url
+
+    # Disk tier for KV caches evicted from memory (disabled when unset)
+    kv_disk_cache_dir: Path | None = Field(default=None, env="KV_DISK_CACHE_DIR")
+    kv_disk_cache_gb: float = Field(default=32.0, env="KV_DISK_CACHE_GB")
 
     # API settings
     api_prefix: str = Field(default="/api/v1", env="API_PREFIX")
@@ -0,0 +1,120 @@
+"""
+Stop generating for clients that have gone away
+"""
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable
+from typing import Any, TypeVar
+
+from fastapi import HTTPException, Request
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Metrics
+client_disconnects = Counter(
+    "llm_client_disconnects_total",
+    "Requests abandoned by the client before generation finished",
+    ["endpoint", "stream"]
+)
+
+# nginx's "client closed request"; nobody sees it, but it keeps logs honest
+CLIENT_CLOSED_REQUEST = 499
+
+_END = object()
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def _wait_for_disconnect(request: Request, poll_interval: float):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """
+    Await ``work`` unless the client disconnects first.
+
+    On disconnect the work is cancelled, which drops its sequence from the
+    batch at the next token boundary, and a 499 HTTPException is raised.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.create_task(_wait_for_disconnect(request, poll_interval))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task not in done and watcher.exception() is not None:
+            # Can't tell whether the client is still there; finish the work
+            return await task
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+    if not task.done() or task.cancelled():
+        client_disconnects.labels(endpoint=request.url.path, stream="false").inc()
+        logger.info(f"Client disconnected from {request.url.path}, generation cancelled")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    return task.result()
+
+
+async def stream_until_disconnect(
+    request: Request,
+    source: AsyncIterator[Any],
+    poll_interval: float = 0.5,
+) -> AsyncIterator[Any]:
+    """
+    Relay ``source`` to a StreamingResponse until the client disconnects.
+
+    ``source`` runs in its own task and is cancelled at whatever it is
+    awaiting, so its cleanup (freeing the scheduler slot) runs promptly
+    even when the response is stuck writing to a dead socket or abandoned
+    without being closed. One item is handed over at a time to keep the
+    token stream's backpressure intact.
+    """
+    handoff: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def pump():
+        try:
+            async for item in source:
+                await handoff.put(item)
+        except Exception as e:
+            await handoff.put(_Failed(e))
+        else:
+            await handoff.put(_END)
+        finally:
+            # Cancelled between items: the source is parked at a yield
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    producer = asyncio.create_task(pump())
+    watcher = asyncio.create_task(_wait_for_disconnect(request, poll_interval))
+
+    def on_disconnect(task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None or producer.done():
+            return
+        producer.cancel()
+        client_disconnects.labels(endpoint=request.url.path, stream="true").inc()
+        logger.info(f"Client disconnected from {request.url.path} mid-stream, generation cancelled")
+
+    watcher.add_done_callback(on_disconnect)
+    try:
+        while True:
+            getter = asyncio.ensure_future(handoff.get())
+            await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                return
+            item = getter.result()
+            if item is _END:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item
+    finally:
+        watcher.cancel()
+        producer.cancel()
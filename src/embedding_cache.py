@@ -0,0 +1,74 @@
+"""
+Content-addressed cache of embedding vectors
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+embedding_cache_lookups = Counter(
+    "llm_embedding_cache_lookups_total",
+    "Texts looked up in the embedding cache by outcome (hit skips the encoder)",
+    ["model", "outcome"]
+)
+
+# Key, tuple and dict slot per entry, on top of the vector itself
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class EmbeddingCache:
+    """
+    LRU of embedding vectors keyed by a hash of the model and the text.
+
+    Re-embedding an unchanged chunk costs a hash instead of a forward
+    pass. Keys take a model ``revision`` so replaced weights never serve
+    stale vectors. Bounded by ``budget_bytes`` across all models.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._entries: OrderedDict[bytes, tuple[np.ndarray, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(revision: str, text: str) -> bytes:
+        digest = hashlib.blake2b(revision.encode(), digest_size=16)
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.digest()
+
+    def get(self, model_id: str, key: bytes) -> tuple[np.ndarray, int] | None:
+        """Cached (vector, input tokens) for ``key``"""
+        entry = self._entries.get(key)
+        if entry is None:
+            embedding_cache_lookups.labels(model=model_id, outcome="miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        embedding_cache_lookups.labels(model=model_id, outcome="hit").inc()
+        return entry
+
+    def put(self, key: bytes, vector: np.ndarray, tokens: int):
+        nbytes = vector.nbytes + ENTRY_OVERHEAD_BYTES
+        if nbytes > self.budget_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.used_bytes -= old[0].nbytes + ENTRY_OVERHEAD_BYTES
+        # Own copy: callers' arrays may be views into a whole batch
+        self._entries[key] = (vector.copy(), tokens)
+        self.used_bytes += nbytes
+        while self.used_bytes > self.budget_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.used_bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def clear(self):
+        self._entries.clear()
+        self.used_bytes = 0
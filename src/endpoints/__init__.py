@@ -1,4 +1,4 @@
 # API Endpoints
-from . import chat, completions, models, sessions
+from . import chat, completions, embeddings, models, rerank, sessions
 
-__all__ = ["chat", "completions", "models", "sessions"]
+__all__ = ["chat", "completions", "embeddings", "models", "rerank", "sessions"]
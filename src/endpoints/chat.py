@@ -7,16 +7,21 @@ import time
 import uuid
 from collections.abc import AsyncGenerator
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 
 from ..auth import verify_auth
 from ..chuk_sessions import SessionManager
 from ..config import config
-from ..middleware import limiter
+from ..disconnect import cancel_on_disconnect, stream_until_disconnect
+from ..engine import GenerationResult, QueuePosition
+from ..loader import ModelNotReadyError
+from ..middleware import limiter, record_usage
 from ..model_manager import model_manager
 from ..model_router import ModelRouter
 from ..models import ChatCompletionChunk, ChatCompletionRequest, ChatCompletionResponse, Choice, Message, Usage
+from ..residency import ResidencyError
+from ..response_cache import cache_allowed
 
 router = APIRouter()
 
@@ -39,15 +44,16 @@ async def get_session_manager() -> SessionManager:
 @router.post("/chat/completions")
 @limiter.limit(f"{config.rate_limit_per_minute}/minute")
 async def create_chat_completion(
-    request: ChatCompletionRequest,
+    request: Request,
+    body: ChatCompletionRequest,
     auth: dict = Depends(verify_auth)
 ) -> ChatCompletionResponse:
     """Create a chat completion"""
     try:
         # Validate request
-        if request.max_tokens is None:
-            request.max_tokens = config.max_tokens_default
-        elif request.max_tokens > config.max_tokens_limit:
+        if body.max_tokens is None:
+            body.max_tokens = config.max_tokens_default
+        elif body.max_tokens > config.max_tokens_limit:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"max_tokens cannot exceed {config.max_tokens_limit}"
@@ -55,6 +61,7 @@ async def create_chat_completion(
 
         # Extract service from API key
         service = None
+        api_key = None
         if auth.get("method") == "api_key":
             api_key = auth.get("key", "")
             service = ModelRouter.extract_service_from_api_key(api_key)
@@ -62,100 +69,130 @@ async def create_chat_completion(
         # Route to appropriate model
         model_id = ModelRouter.get_model_for_request(
             service=service,
-            user=request.user,
-            requested_model=request.model
+            user=body.user,
+            requested_model=body.model
         )
 
         # Update request with routed model
-        request.model = model_id
+        body.model = model_id
+        priority = ModelRouter.get_priority(service)
+        tenant = ModelRouter.get_tenant(service, api_key)
+        use_cache = cache_allowed(request.headers)
 
         # Get session manager
         sm = await get_session_manager()
 
         # Handle session if provided
-        if request.session_id:
+        if body.session_id:
             # Try to get existing session
-            session = await sm.get_session(request.session_id)
+            session = await sm.get_session(body.session_id)
             if session:
                 # Add messages to session history
-                for msg in request.messages:
+                for msg in body.messages:
                     await sm.add_message(
-                        session_id=request.session_id,
+                        session_id=body.session_id,
                         role=msg.role,
                         content=msg.content
                     )
                 # Get full conversation history
-                messages = await sm.get_messages(request.session_id)
+                messages = await sm.get_messages(body.session_id)
             else:
                 # Create new session if it doesn't exist
                 await sm.create_session(
-                    session_id=request.session_id,
-                    data={"model": request.model, "user": request.user}
+                    session_id=body.session_id,
+                    data={"model": body.model, "user": body.user}
                 )
-                messages = [msg.dict() for msg in request.messages]
+                messages = [msg.dict() for msg in body.messages]
                 # Add initial messages to session
-                for msg in request.messages:
+                for msg in body.messages:
                     await sm.add_message(
-                        session_id=request.session_id,
+                        session_id=body.session_id,
                         role=msg.role,
                         content=msg.content
                     )
         else:
             # No session management, just convert messages
-            messages = [msg.dict() for msg in request.messages]
+            messages = [msg.dict() for msg in body.messages]
+
+        # Wait for (or reject) a model that is still loading before streaming starts
+        await model_manager.get_or_load_model(body.model)
 
         # Generate completion
-        if request.stream:
+        if body.stream:
             return StreamingResponse(
-                stream_chat_completion(request, messages),
+                stream_until_disconnect(
+                    request,
+                    stream_chat_completion(body, messages, priority, tenant, service, use_cache),
+                    config.disconnect_poll_seconds,
+                ),
                 media_type="text/event-stream"
             )
         else:
             # Non-streaming response
-            output = await model_manager.generate_completion(
-                model_id=request.model,
-                messages=messages,
-                temperature=request.temperature,
-                top_p=request.top_p,
-                max_tokens=request.max_tokens,
-                stop=request.stop,
-                stream=False
+            result = await cancel_on_disconnect(
+                request,
+                model_manager.generate_completion(
+                    model_id=body.model,
+                    messages=messages,
+                    temperature=body.temperature,
+                    top_p=body.top_p,
+                    max_tokens=body.max_tokens,
+                    stop=body.stop,
+                    stream=False,
+                    seed=body.seed,
+                    session_id=body.session_id,
+                    priority=priority,
+                    tenant=tenant,
+                    cache=use_cache
+                ),
+                config.disconnect_poll_seconds,
             )
+            output = result.text
+            record_usage(body.model, service, result.prompt_tokens, result.completion_tokens)
 
             # Save assistant response to session if using sessions
-            if request.session_id:
+            if body.session_id:
                 await sm.add_message(
-                    session_id=request.session_id,
+                    session_id=body.session_id,
                     role="assistant",
                     content=output
                 )
 
-            # Count tokens (approximate)
-            prompt_tokens = sum(len(msg["content"].split()) * 1.3 for msg in messages)
-            completion_tokens = len(output.split()) * 1.3
-
             response = ChatCompletionResponse(
                 id=f"chatcmpl-{uuid.uuid4()}",
                 object="chat.completion",
                 created=int(time.time()),
-                model=request.model,
+                model=body.model,
                 system_fingerprint=f"mlx-{config.primary_domain}",
                 choices=[
                     Choice(
                         index=0,
                         message=Message(role="assistant", content=output),
-                        finish_reason="stop"
+                        finish_reason=result.finish_reason
                     )
                 ],
                 usage=Usage(
-                    prompt_tokens=int(prompt_tokens),
-                    completion_tokens=int(completion_tokens),
-                    total_tokens=int(prompt_tokens + completion_tokens)
+                    prompt_tokens=result.prompt_tokens,
+                    completion_tokens=result.completion_tokens,
+                    total_tokens=result.prompt_tokens + result.completion_tokens
                 )
             )
 
             return response
 
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except ResidencyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -164,8 +201,12 @@ async def create_chat_completion(
 
 
 async def stream_chat_completion(
-    request: ChatCompletionRequest,
-    messages: list
+    body: ChatCompletionRequest,
+    messages: list,
+    priority: int = 0,
+    tenant: str | None = None,
+    service: str | None = None,
+    use_cache: bool = True
 ) -> AsyncGenerator[str, None]:
     """Stream chat completion responses"""
     try:
@@ -177,27 +218,41 @@ async def stream_chat_completion(
             id=completion_id,
             object="chat.completion.chunk",
             created=created,
-            model=request.model,
+            model=body.model,
             system_fingerprint=f"mlx-{config.primary_domain}",
             choices=[{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]
         )
         yield f"data: {chunk.json()}\n\n"
 
         # Generate content
-        async for token in model_manager.generate_completion(
-            model_id=request.model,
+        token_stream = await model_manager.generate_completion(
+            model_id=body.model,
             messages=messages,
-            temperature=request.temperature,
-            top_p=request.top_p,
-            max_tokens=request.max_tokens,
-            stop=request.stop,
-            stream=True
-        ):
+            temperature=body.temperature,
+            top_p=body.top_p,
+            max_tokens=body.max_tokens,
+            stop=body.stop,
+            stream=True,
+            seed=body.seed,
+            session_id=body.session_id,
+            priority=priority,
+            tenant=tenant,
+            cache=use_cache
+        )
+        result = None
+        async for token in token_stream:
+            if isinstance(token, QueuePosition):
+                # SSE comment: ignored by OpenAI clients, visible to ours
+                yield f": queue_position {token.position}\n\n"
+                continue
+            if isinstance(token, GenerationResult):
+                result = token
+                continue
             chunk = ChatCompletionChunk(
                 id=completion_id,
                 object="chat.completion.chunk",
                 created=created,
-                model=request.model,
+                model=body.model,
                 system_fingerprint=f"mlx-{config.primary_domain}",
                 choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}]
             )
@@ -209,11 +264,30 @@ async def stream_chat_completion(
             id=completion_id,
             object="chat.completion.chunk",
             created=created,
-            model=request.model,
+            model=body.model,
             system_fingerprint=f"mlx-{config.primary_domain}",
-            choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            choices=[{"index": 0, "delta": {}, "finish_reason": result.finish_reason if result else "stop"}]
         )
         yield f"data: {chunk.json()}\n\n"
+
+        if result is not None:
+            record_usage(body.model, service, result.prompt_tokens, result.completion_tokens)
+            if (body.stream_options or {}).get("include_usage"):
+                # OpenAI convention: one extra chunk, no choices, exact usage
+                chunk = ChatCompletionChunk(
+                    id=completion_id,
+                    object="chat.completion.chunk",
+                    created=created,
+                    model=body.model,
+                    system_fingerprint=f"mlx-{config.primary_domain}",
+                    choices=[],
+                    usage=Usage(
+                        prompt_tokens=result.prompt_tokens,
+                        completion_tokens=result.completion_tokens,
+                        total_tokens=result.prompt_tokens + result.completion_tokens
+                    )
+                )
+                yield f"data: {chunk.json()}\n\n"
         yield "data: [DONE]\n\n"
 
     except Exception as e:
@@ -1,16 +1,21 @@
 """
 Text completion endpoints
 """
+import itertools
 import time
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 
 from ..auth import verify_auth
 from ..config import config
-from ..middleware import limiter
+from ..disconnect import cancel_on_disconnect
+from ..loader import ModelNotReadyError
+from ..middleware import limiter, record_usage
 from ..model_manager import model_manager
+from ..model_router import ModelRouter
 from ..models import CompletionRequest
+from ..residency import ResidencyError
 
 router = APIRouter()
 
@@ -18,55 +23,86 @@ router = APIRouter()
 @router.post("/completions")
 @limiter.limit(f"{config.rate_limit_per_minute}/minute")
 async def create_completion(
-    request: CompletionRequest,
+    request: Request,
+    body: CompletionRequest,
     auth: dict = Depends(verify_auth)
 ):
     """Create a text completion"""
     try:
         # Handle prompt as list or string
-        prompts = request.prompt if isinstance(request.prompt, list) else [request.prompt]
+        prompts = body.prompt if isinstance(body.prompt, list) else [body.prompt]
 
-        completions = []
-        for i, prompt in enumerate(prompts[:request.n]):
-            # Convert to chat format for consistency
-            messages = [{"role": "user", "content": prompt}]
+        service = None
+        api_key = None
+        if auth.get("method") == "api_key":
+            api_key = auth.get("key", "")
+            service = ModelRouter.extract_service_from_api_key(api_key)
+        priority = ModelRouter.get_priority(service)
+        tenant = ModelRouter.get_tenant(service, api_key)
 
-            output = await model_manager.generate_completion(
-                model_id=request.model,
-                messages=messages,
-                temperature=request.temperature,
-                top_p=request.top_p,
-                max_tokens=request.max_tokens,
-                stop=request.stop,
-                stream=False
-            )
+        # All prompts and their n choices go to the scheduler as one batch;
+        # prompts are converted to chat format for consistency
+        batch = await cancel_on_disconnect(
+            request,
+            model_manager.generate_batch(
+                model_id=body.model,
+                prompts=[[{"role": "user", "content": prompt}] for prompt in prompts],
+                n=body.n,
+                temperature=body.temperature,
+                top_p=body.top_p,
+                max_tokens=body.max_tokens,
+                stop=body.stop,
+                seed=body.seed,
+                priority=priority,
+                tenant=tenant
+            ),
+            config.disconnect_poll_seconds,
+        )
 
-            completions.append({
-                "text": output,
+        # OpenAI order: prompt-major, so choice i is prompt i // n
+        completions = [
+            {
+                "text": result.text,
                 "index": i,
                 "logprobs": None,
-                "finish_reason": "stop"
-            })
+                "finish_reason": result.finish_reason
+            }
+            for i, result in enumerate(itertools.chain.from_iterable(batch))
+        ]
 
-        # Calculate usage
-        prompt_tokens = sum(len(p.split()) * 1.3 for p in prompts)
-        completion_tokens = sum(len(c["text"].split()) * 1.3 for c in completions)
+        # Exact counts from the engine; a prompt's n choices share one prompt
+        prompt_tokens = sum(choices[0].prompt_tokens for choices in batch)
+        completion_tokens = sum(result.completion_tokens for choices in batch for result in choices)
+        record_usage(body.model, service, prompt_tokens, completion_tokens)
 
         response = {
             "id": f"cmpl-{uuid.uuid4()}",
             "object": "text_completion",
             "created": int(time.time()),
-            "model": request.model,
+            "model": body.model,
             "choices": completions,
             "usage": {
-                "prompt_tokens": int(prompt_tokens),
-                "completion_tokens": int(completion_tokens),
-                "total_tokens": int(prompt_tokens + completion_tokens)
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
             }
         }
 
         return response
 
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except ResidencyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
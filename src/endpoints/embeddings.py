@@ -0,0 +1,93 @@
+"""
+Embedding endpoints
+"""
+import base64
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+from ..auth import verify_auth
+from ..config import config
+from ..disconnect import cancel_on_disconnect
+from ..loader import ModelNotReadyError
+from ..middleware import limiter, record_usage
+from ..model_manager import model_manager
+from ..model_router import ModelRouter
+from ..models import EmbeddingRequest
+from ..residency import ResidencyError
+
+router = APIRouter()
+
+
+def embedding_data(vectors: np.ndarray, encoding_format: str) -> list[dict]:
+    """OpenAI ``data`` entries; base64 is the raw float32 buffer, without Python floats"""
+    if encoding_format == "base64":
+        rows = np.ascontiguousarray(vectors, dtype="<f4")
+        embeddings = [base64.b64encode(row.tobytes()).decode() for row in rows]
+    else:
+        embeddings = vectors.tolist()
+    return [
+        {"object": "embedding", "index": i, "embedding": embedding}
+        for i, embedding in enumerate(embeddings)
+    ]
+
+
+@router.post("/embeddings")
+@limiter.limit(f"{config.rate_limit_per_minute}/minute")
+async def create_embeddings(
+    request: Request,
+    body: EmbeddingRequest,
+    auth: dict = Depends(verify_auth)
+):
+    """Create embeddings for one or more input texts"""
+    try:
+        inputs = [body.input] if isinstance(body.input, str) else body.input
+        if not inputs:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="input must not be empty"
+            )
+
+        service = None
+        if auth.get("method") == "api_key":
+            service = ModelRouter.extract_service_from_api_key(auth.get("key", ""))
+
+        vectors, prompt_tokens = await cancel_on_disconnect(
+            request,
+            model_manager.embed(body.model, inputs),
+            config.disconnect_poll_seconds,
+        )
+        record_usage(body.model, service, prompt_tokens, 0)
+
+        # Built as plain JSON: response-model validation would walk every float
+        return JSONResponse({
+            "object": "list",
+            "data": embedding_data(vectors, body.encoding_format),
+            "model": body.model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}
+        })
+
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except ResidencyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        ) from e
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        ) from e
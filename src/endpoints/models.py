@@ -4,10 +4,12 @@ Model management endpoints
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 
 from ..auth import optional_auth, verify_auth
 from ..model_manager import model_manager
 from ..models import Model, ModelList
+from ..residency import ResidencyError
 
 router = APIRouter()
 
@@ -39,14 +41,14 @@ async def retrieve_model(model_id: str, auth: dict = Depends(verify_auth)):
     model_id = model_id.replace("--", "/")
 
     # Check if model exists
-    available_models = model_manager.list_available_models()
-    model_info = next((m for m in available_models if m["id"] == model_id), None)
+    entry = await model_manager.registry.resolve(model_id)
 
-    if not model_info:
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Model {model_id} not found"
         )
+    model_id = entry.id
 
     # Get additional info if model is loaded
     loaded_info = model_manager.get_model_info(model_id)
@@ -59,8 +61,10 @@ async def retrieve_model(model_id: str, auth: dict = Depends(verify_auth)):
         "root": model_id,
         "parent": None,
         "permission": [],
-        "loaded": model_info["loaded"],
-        "path": model_info["path"]
+        "loaded": model_id in model_manager.models,
+        "path": str(entry.path),
+        "load_status": model_manager.load_status(model_id),
+        "metadata": entry.as_dict(),
     }
 
     if loaded_info:
@@ -73,10 +77,16 @@ async def retrieve_model(model_id: str, auth: dict = Depends(verify_auth)):
 
 
 @router.post("/models/{model_id}/load")
-async def load_model(model_id: str, auth: dict = Depends(verify_auth)):
-    """Load a model into memory"""
+async def load_model(model_id: str, wait: bool = True, auth: dict = Depends(verify_auth)):
+    """Load a model into memory (``wait=false`` returns 202 and loads in the background)"""
     model_id = model_id.replace("--", "/")
 
+    if not wait:
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "accepted", "load_status": model_manager.start_loading(model_id)}
+        )
+
     try:
         await model_manager.load_model(model_id)
         return {
@@ -84,6 +94,11 @@ async def load_model(model_id: str, auth: dict = Depends(verify_auth)):
             "message": f"Model {model_id} loaded successfully",
             "memory_usage": model_manager.memory_usage
         }
+    except ResidencyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        ) from e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -118,3 +133,21 @@ async def get_memory_usage(auth: dict = Depends(verify_auth)):
         "loaded_models": list(model_manager.models.keys()),
         "current_model": model_manager.current_model
     }
+
+
+@router.get("/models/loading/queue")
+async def get_load_queue(auth: dict = Depends(verify_auth)):
+    """Model loads in progress and waiting for a load slot"""
+    return {"loads": model_manager.load_queue}
+
+
+@router.get("/models/workers/status")
+async def get_worker_status(auth: dict = Depends(verify_auth)):
+    """Per-model inference queues and the load queue"""
+    return {"workers": model_manager.worker_stats, "loads": model_manager.load_queue}
+
+
+@router.get("/models/memory/residency")
+async def get_residency(auth: dict = Depends(verify_auth)):
+    """Resident models, memory budget and recent load/evict decisions"""
+    return model_manager.residency.stats
@@ -0,0 +1,176 @@
+"""
+Reranking endpoints
+"""
+import asyncio
+import json
+import uuid
+from collections.abc import AsyncGenerator
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from ..auth import verify_auth
+from ..config import config
+from ..disconnect import cancel_on_disconnect, stream_until_disconnect
+from ..loader import ModelNotReadyError
+from ..middleware import limiter, record_usage
+from ..model_manager import model_manager
+from ..model_router import ModelRouter
+from ..models import RerankRequest, RerankResponse, RerankResult
+from ..residency import ResidencyError
+
+router = APIRouter()
+
+
+def top_results(
+    scores: np.ndarray,
+    count: int,
+    documents: list[str],
+    return_documents: bool,
+) -> list[RerankResult]:
+    """The ``count`` best-scoring documents, best first; unscored ones hold -inf"""
+    count = min(count, len(scores))
+    if count <= 0:
+        return []
+    best = np.argpartition(-scores, count - 1)[:count]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [
+        RerankResult(
+            index=int(i),
+            relevance_score=float(scores[i]),
+            document={"text": documents[i]} if return_documents else None,
+        )
+        for i in best
+    ]
+
+
+@router.post("/rerank")
+@limiter.limit(f"{config.rate_limit_per_minute}/minute")
+async def create_rerank(
+    request: Request,
+    body: RerankRequest,
+    auth: dict = Depends(verify_auth)
+):
+    """Rank documents by relevance to a query"""
+    try:
+        if not body.documents:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="documents must not be empty"
+            )
+
+        service = None
+        if auth.get("method") == "api_key":
+            service = ModelRouter.extract_service_from_api_key(auth.get("key", ""))
+
+        if body.stream:
+            # Wait for (or reject) a model that is still loading before streaming starts
+            await model_manager.get_or_load_model(body.model)
+            return StreamingResponse(
+                stream_until_disconnect(
+                    request,
+                    stream_rerank(body, service),
+                    config.disconnect_poll_seconds,
+                ),
+                media_type="text/event-stream"
+            )
+
+        scores, tokens = await cancel_on_disconnect(
+            request,
+            model_manager.rerank(body.model, body.query, body.documents),
+            config.disconnect_poll_seconds,
+        )
+        record_usage(body.model, service, tokens, 0)
+
+        return RerankResponse(
+            id=f"rerank-{uuid.uuid4()}",
+            model=body.model,
+            results=top_results(
+                scores, body.top_n or len(body.documents), body.documents, body.return_documents
+            ),
+            usage={"total_tokens": tokens}
+        )
+
+    except HTTPException:
+        raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except ResidencyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        ) from e
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        ) from e
+
+
+async def stream_rerank(body: RerankRequest, service: str | None = None) -> AsyncGenerator[str, None]:
+    """
+    Stream the top results so far as chunks of documents are scored.
+
+    All chunks are submitted at once, so they share encoder batches with
+    each other and with other requests; an event goes out as each one
+    completes, and the last carries the final ranking and usage.
+    """
+    documents = body.documents
+    chunk_size = max(1, config.rerank_stream_chunk_size)
+    top_n = body.top_n or len(documents)
+    scores = np.full(len(documents), -np.inf, dtype=np.float32)
+
+    async def score(start: int) -> tuple[int, np.ndarray, int]:
+        chunk_scores, chunk_tokens = await model_manager.rerank(
+            body.model, body.query, documents[start:start + chunk_size]
+        )
+        return start, chunk_scores, chunk_tokens
+
+    tasks = [asyncio.ensure_future(score(start)) for start in range(0, len(documents), chunk_size)]
+    try:
+        rerank_id = f"rerank-{uuid.uuid4()}"
+        scored = 0
+        tokens = 0
+        for next_chunk in asyncio.as_completed(tasks):
+            start, chunk_scores, chunk_tokens = await next_chunk
+            scores[start:start + len(chunk_scores)] = chunk_scores
+            scored += len(chunk_scores)
+            tokens += chunk_tokens
+            event = {
+                "id": rerank_id,
+                "model": body.model,
+                "scored": scored,
+                "total": len(documents),
+                "results": [
+                    r.dict() for r in top_results(scores, min(top_n, scored), documents, body.return_documents)
+                ],
+            }
+            if scored == len(documents):
+                event["usage"] = {"total_tokens": tokens}
+            yield f"data: {json.dumps(event)}\n\n"
+
+        record_usage(body.model, service, tokens, 0)
+        yield "data: [DONE]\n\n"
+
+    except Exception as e:
+        error_chunk = {
+            "error": {
+                "message": str(e),
+                "type": "server_error",
+                "code": "internal_error"
+            }
+        }
+        yield f"data: {json.dumps(error_chunk)}\n\n"
+    finally:
+        for task in tasks:
+            task.cancel()
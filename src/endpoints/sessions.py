@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 
 from ..auth import optional_auth, verify_auth
+from ..model_manager import model_manager
 from .chat import get_session_manager
 
 router = APIRouter()
@@ -125,6 +126,9 @@ async def delete_session(
             detail="Session not found"
         )
 
+    # Release the KV cache pinned to this conversation
+    model_manager.drop_session_cache(session_id)
+
     return {"message": "Session deleted successfully"}
 
 
@@ -0,0 +1,35 @@
+# Generation engine: scheduling and decoding primitives used by ModelManager
+from .backend import Backend, LoadedModel, MLXBackend, MLXVLMBackend
+from .detokenizer import IncrementalDetokenizer
+from .disk_cache import DiskKVCache
+from .encoder import EncodeBatcher, Encoder
+from .prefix_cache import PrefixCache, PrefixHit
+from .scheduler import BatchScheduler, GenerationResult, SamplingParams, Sequence, StepModel
+from .session_cache import SessionKVCache
+from .streaming import QueuePosition, TokenStream
+from .synthetic import SyntheticBackend, SyntheticEncoder, SyntheticStepModel, SyntheticTokenizer
+
+__all__ = [
+    "Backend",
+    "BatchScheduler",
+    "DiskKVCache",
+    "EncodeBatcher",
+    "Encoder",
+    "GenerationResult",
+    "IncrementalDetokenizer",
+    "LoadedModel",
+    "MLXBackend",
+    "MLXVLMBackend",
+    "PrefixCache",
+    "PrefixHit",
+    "QueuePosition",
+    "SamplingParams",
+    "Sequence",
+    "SessionKVCache",
+    "StepModel",
+    "SyntheticBackend",
+    "SyntheticEncoder",
+    "SyntheticStepModel",
+    "SyntheticTokenizer",
+    "TokenStream",
+]
@@ -0,0 +1,116 @@
+"""
+Inference backends: how models are loaded and what device memory they hold
+"""
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+from . import device
+from .encoder import Encoder
+from .scheduler import StepModel
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoadedModel:
+    """A resident model as the rest of the server uses it"""
+    model: Any
+    tokenizer: Any  # encode/decode, and apply_chat_template when it has a chat_template
+    step_model: StepModel | None  # Prefill, decode step and KV cache handles for the scheduler
+    encoder: Encoder | None = None  # Forward passes of embedding models instead of decoding
+
+
+class Backend(Protocol):
+    """Runtime that turns a model directory into a LoadedModel"""
+
+    name: str
+    needs_weights: bool  # Whether models must exist under models_dir
+
+    def load(self, model_path: str, model_config: dict[str, Any] | None = None) -> LoadedModel:
+        """Load weights and tokenizer; runs on a load thread"""
+        ...
+
+    def load_encoder(
+        self, model_path: str, model_config: dict[str, Any] | None = None, task: str = "embed"
+    ) -> LoadedModel:
+        """Load an embedding ("embed") or cross-encoder ("rerank") model, served through ``LoadedModel.encoder``"""
+        ...
+
+    def footprint_gb(self, model_path: Path) -> float | None:
+        """Resident size if known without loading, else None to estimate from the weights on disk"""
+        ...
+
+    def memory_usage(self) -> dict[str, float]:
+        """Active, peak and cached device memory in GB"""
+        ...
+
+    def clear_cache(self):
+        """Return freed buffers to the system after an unload"""
+        ...
+
+
+class MLXBackend:
+    """mlx_lm models on Apple silicon"""
+
+    name = "mlx"
+    needs_weights = True
+
+    def __init__(self, memory_budget_gb: float = 0):
+        self.memory_budget_gb = memory_budget_gb
+
+    def load(self, model_path: str, model_config: dict[str, Any] | None = None) -> LoadedModel:
+        # MLX is only imported (and Metal limits set) once a model is actually loaded
+        device.set_memory_limits(self.memory_budget_gb)
+        model, tokenizer = self._load(model_path)
+
+        from .mlx_step import MLXStepModel
+
+        return LoadedModel(model, tokenizer, MLXStepModel(model, tokenizer))
+
+    def _load(self, model_path: str) -> tuple[Any, Any]:
+        from mlx_lm import load
+
+        return load(model_path)
+
+    def load_encoder(
+        self, model_path: str, model_config: dict[str, Any] | None = None, task: str = "embed"
+    ) -> LoadedModel:
+        device.set_memory_limits(self.memory_budget_gb)
+        try:
+            from mlx_embeddings.utils import load
+        except ImportError as e:
+            raise ImportError(
+                "Embedding and reranker models require the 'mlx-embeddings' package. "
+                "Install it with: pip install 'mlx-llm-server[embeddings]'"
+            ) from e
+
+        from .mlx_encoder import MLXEncoder
+
+        model, tokenizer = load(model_path)
+        max_length = (model_config or {}).get("context_length")
+        return LoadedModel(model, tokenizer, None, MLXEncoder(model, tokenizer, max_length, task=task))
+
+    def footprint_gb(self, model_path: Path) -> float | None:
+        return None
+
+    def memory_usage(self) -> dict[str, float]:
+        return device.memory_usage()
+
+    def clear_cache(self):
+        device.clear_cache()
+
+
+class MLXVLMBackend(MLXBackend):
+    """Vision-language checkpoints through mlx_vlm, decoded as text by the same step model"""
+
+    name = "mlx_vlm"
+
+    def _load(self, model_path: str) -> tuple[Any, Any]:
+        try:
+            import mlx_vlm
+        except ImportError:
+            logger.warning("mlx_vlm not installed, falling back to standard loading")
+            return super()._load(model_path)
+        return mlx_vlm.load(model_path)
@@ -0,0 +1,55 @@
+"""
+Incremental detokenization for streaming responses
+"""
+from collections.abc import Callable
+
+# Decoders emit U+FFFD while a multi-byte character is only partially decoded
+REPLACEMENT_CHAR = "�"
+
+
+class IncrementalDetokenizer:
+    """
+    Turns a growing list of token ids into text deltas.
+
+    Only a small window of recent tokens is re-decoded for every new token,
+    so the cost per token stays constant regardless of output length. Text
+    is held back while the window ends in an incomplete UTF-8 sequence.
+    """
+
+    def __init__(self, decode: Callable[[list[int]], str]):
+        self._decode = decode
+        self._tokens: list[int] = []
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._chunks: list[str] = []
+
+    @property
+    def text(self) -> str:
+        """Everything emitted so far"""
+        return "".join(self._chunks)
+
+    def add_token(self, token: int) -> str:
+        """Add a token and return the newly completed text, if any"""
+        self._tokens.append(token)
+        prefix_text = self._decode(self._tokens[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self._tokens[self._prefix_offset:])
+        if len(new_text) <= len(prefix_text) or new_text.endswith(REPLACEMENT_CHAR):
+            return ""
+
+        delta = new_text[len(prefix_text):]
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self._tokens)
+        self._chunks.append(delta)
+        return delta
+
+    def finalize(self) -> str:
+        """Flush any text still held back"""
+        if self._read_offset == len(self._tokens):
+            return ""
+        prefix_text = self._decode(self._tokens[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self._tokens[self._prefix_offset:])
+        delta = new_text[len(prefix_text):]
+        self._prefix_offset = self._read_offset = len(self._tokens)
+        if delta:
+            self._chunks.append(delta)
+        return delta
@@ -0,0 +1,60 @@
+"""
+Accelerator memory controls, importing MLX only on first use
+"""
+import logging
+from functools import cache
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def _mlx() -> Any | None:
+    """``mlx.core``, or None where it isn't installed (e.g. Linux CI)"""
+    try:
+        import mlx.core as mx
+    except ImportError:
+        logger.info("mlx not installed; device memory controls disabled")
+        return None
+    return mx
+
+
+def _metal() -> Any | None:
+    mx = _mlx()
+    if mx is None or not mx.metal.is_available():
+        return None
+    return mx.metal
+
+
+@cache
+def set_memory_limits(budget_gb: float):
+    """Cap Metal allocations and the buffer cache to the model budget (once per process)"""
+    metal = _metal()
+    if metal is None or budget_gb <= 0:
+        return
+    metal.set_memory_limit(int(budget_gb * 1024**3))
+    metal.set_cache_limit(int(min(100, budget_gb // 4) * 1024**3))
+
+
+def active_memory_gb() -> float:
+    metal = _metal()
+    return metal.get_active_memory() / 1e9 if metal is not None else 0.0
+
+
+def memory_usage() -> dict[str, float]:
+    """Active, peak and cached device memory in GB (zeros without Metal)"""
+    metal = _metal()
+    if metal is None:
+        return {"active_gb": 0.0, "peak_gb": 0.0, "cache_gb": 0.0}
+    return {
+        "active_gb": metal.get_active_memory() / 1e9,
+        "peak_gb": metal.get_peak_memory() / 1e9,
+        "cache_gb": metal.get_cache_memory() / 1e9,
+    }
+
+
+def clear_cache():
+    """Return freed buffers to the system"""
+    metal = _metal()
+    if metal is not None:
+        metal.clear_cache()
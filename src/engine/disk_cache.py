@@ -0,0 +1,320 @@
+"""
+Disk spill tier for evicted prefix and session KV caches
+"""
+import hashlib
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+import numpy as np
+
+from . import metrics, tensor_file
+from .prefix_cache import PrefixCache, PrefixHit
+
+logger = logging.getLogger(__name__)
+
+TOKENS_TENSOR = "__tokens__"
+
+
+class KVCacheCodec(Protocol):
+    """Conversion between a backend's KV cache handle and plain arrays"""
+
+    def kv_bytes_per_token(self) -> int:
+        ...
+
+    def import_cache(self, handle: Any, n_tokens: int, copy: bool = True) -> Any | None:
+        ...
+
+    def cache_to_arrays(self, handle: Any) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+        """Flatten a cache into named arrays plus string metadata"""
+        ...
+
+    def cache_from_arrays(self, arrays: dict[str, np.ndarray], metadata: dict[str, str]) -> tuple[Any, int]:
+        """Rebuild a cache handle from arrays, returning (handle, size in bytes)"""
+        ...
+
+
+@dataclass
+class _DiskEntry:
+    name: str
+    kind: str  # "prefix" or "session"
+    model_id: str
+    tokens: tuple[int, ...]
+    nbytes: int
+    session_id: str | None = None
+
+
+class _DiskIndexBackend:
+    """Lets a PrefixCache index files on disk: handles are file names, added only through ``add``"""
+
+    def __init__(self, disk: "DiskKVCache", model_id: str):
+        self.disk = disk
+        self.model_id = model_id
+
+    def kv_bytes_per_token(self) -> int:
+        codec = self.disk.codecs.get(self.model_id)
+        return codec.kv_bytes_per_token() if codec else 0
+
+    def import_cache(self, handle: str, n_tokens: int, copy: bool = True) -> Any | None:
+        return self.disk._load_prefix(self.model_id, handle, n_tokens)
+
+
+class DiskKVCache:
+    """
+    Second cache tier below the in-memory prefix and session caches.
+
+    Caches evicted from memory are serialized to safetensors files (one per
+    snapshot, token ids stored alongside) by a background writer. Lookups
+    use a per-model radix index over the spilled prompts; on a hit the file
+    is memory-mapped and handed to the backend to rebuild the cache. The
+    directory is kept under ``max_bytes`` by deleting the least recently
+    used files, and is re-indexed on startup so caches survive restarts.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, min_tokens: int = 32):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.min_tokens = min_tokens
+        self.codecs: dict[str, KVCacheCodec] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._files: OrderedDict[str, _DiskEntry] = OrderedDict()
+        self._prefix_index: dict[str, PrefixCache] = {}
+        self._sessions: dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kv-spill")
+        self._scan()
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Cache statistics for admin endpoints"""
+        lookups = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def register_codec(self, model_id: str, codec: KVCacheCodec):
+        """Enable spilling and reloading for a loaded model"""
+        self.codecs[model_id] = codec
+
+    def unregister_codec(self, model_id: str):
+        """Model unloaded; its files stay on disk for the next load"""
+        self.codecs.pop(model_id, None)
+
+    def spill_prefix(self, model_id: str, tokens: tuple[int, ...], handle: Any):
+        """Persist a prefix snapshot evicted from memory"""
+        if len(tokens) < self.min_tokens:
+            return
+        self._spill("prefix", model_id, tuple(tokens), handle)
+
+    def spill_session(self, session_id: str, model_id: str, tokens: tuple[int, ...], handle: Any):
+        """Persist a session cache evicted from memory"""
+        self._spill("session", model_id, tuple(tokens), handle, session_id=session_id)
+
+    def lookup_prefix(self, model_id: str, tokens: list[int]) -> PrefixHit | None:
+        """Reload the longest spilled prefix of ``tokens``, if any"""
+        with self._lock:
+            index = self._prefix_index.get(model_id)
+        hit = index.lookup(tokens) if index is not None and model_id in self.codecs else None
+        self._record_lookup("prefix", model_id, hit.n_tokens if hit else 0)
+        return hit
+
+    def take_session(self, session_id: str, model_id: str) -> tuple[tuple[int, ...], Any, KVCacheCodec] | None:
+        """Reload and remove a spilled session cache"""
+        with self._lock:
+            name = self._sessions.get(session_id)
+            entry = self._files.get(name) if name else None
+            if entry is not None:
+                self._remove_locked(entry)
+        codec = self.codecs.get(model_id)
+        if entry is None or entry.model_id != model_id or codec is None:
+            self._record_lookup("session", model_id, 0)
+            return None
+
+        loaded = self._read(entry, codec)
+        self._delete_file(entry.name)
+        if loaded is None:
+            self._record_lookup("session", model_id, 0)
+            return None
+        handle, _ = loaded
+        self._record_lookup("session", model_id, len(entry.tokens))
+        return entry.tokens, handle, codec
+
+    def drop_session(self, session_id: str):
+        """Delete a session's spilled cache"""
+        with self._lock:
+            name = self._sessions.get(session_id)
+            entry = self._files.get(name) if name else None
+            if entry is not None:
+                self._remove_locked(entry)
+        if entry is not None:
+            self._delete_file(entry.name)
+
+    def flush(self):
+        """Wait until every queued spill has been written"""
+        self._writer.submit(lambda: None).result()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+
+    def _spill(
+        self,
+        kind: str,
+        model_id: str,
+        tokens: tuple[int, ...],
+        handle: Any,
+        session_id: str | None = None,
+    ):
+        codec = self.codecs.get(model_id)
+        if codec is None:
+            return
+        key = session_id if kind == "session" else ",".join(map(str, tokens))
+        name = hashlib.sha256(f"{kind}:{model_id}:{key}".encode()).hexdigest()[:32] + ".safetensors"
+        entry = _DiskEntry(name=name, kind=kind, model_id=model_id, tokens=tokens, nbytes=0, session_id=session_id)
+        # The handle is owned by the spill now; converting it is the writer's job, not the decode thread's
+        self._writer.submit(self._write, entry, codec, handle)
+
+    def _write(self, entry: _DiskEntry, codec: KVCacheCodec, handle: Any):
+        path = self.directory / entry.name
+        try:
+            arrays, metadata = codec.cache_to_arrays(handle)
+            arrays[TOKENS_TENSOR] = np.asarray(entry.tokens, dtype=np.int32)
+            metadata = {**metadata, "kind": entry.kind, "model_id": entry.model_id}
+            if entry.session_id is not None:
+                metadata["session_id"] = entry.session_id
+            tensor_file.save(path, arrays, metadata)
+            entry.nbytes = path.stat().st_size
+        except Exception as e:
+            logger.warning(f"Failed to spill KV cache to {path}: {e}")
+            return
+        metrics.disk_cache_spills.labels(model=entry.model_id, kind=entry.kind).inc()
+        self._register(entry)
+
+    def _register(self, entry: _DiskEntry):
+        with self._lock:
+            previous = self._files.get(entry.name)
+            if previous is not None:
+                self._remove_locked(previous)
+            self._files[entry.name] = entry
+            self.total_bytes += entry.nbytes
+            if entry.kind == "session":
+                self._sessions[entry.session_id] = entry.name
+            else:
+                self._index_for(entry.model_id).add(entry.tokens, entry.name, entry.nbytes)
+
+            evicted = []
+            while self._files and self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._files.values()))
+                self._remove_locked(oldest)
+                evicted.append(oldest)
+        for old in evicted:
+            self._delete_file(old.name)
+        metrics.disk_cache_bytes.set(self.total_bytes)
+
+    def _index_for(self, model_id: str) -> PrefixCache:
+        index = self._prefix_index.get(model_id)
+        if index is None:
+            index = PrefixCache(
+                model_id,
+                _DiskIndexBackend(self, model_id),
+                budget_bytes=lambda: sys.maxsize,
+                min_tokens=self.min_tokens,
+                track_metrics=False,
+            )
+            self._prefix_index[model_id] = index
+        return index
+
+    def _remove_locked(self, entry: _DiskEntry):
+        if self._files.pop(entry.name, None) is None:
+            return
+        self.total_bytes -= entry.nbytes
+        if entry.kind == "session":
+            if self._sessions.get(entry.session_id) == entry.name:
+                del self._sessions[entry.session_id]
+        else:
+            index = self._prefix_index.get(entry.model_id)
+            if index is not None:
+                index.discard(entry.tokens)
+
+    def _delete_file(self, name: str):
+        try:
+            (self.directory / name).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not delete spilled KV cache {name}: {e}")
+        metrics.disk_cache_bytes.set(self.total_bytes)
+
+    def _load_prefix(self, model_id: str, name: str, n_tokens: int) -> Any | None:
+        codec = self.codecs.get(model_id)
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is not None:
+                self._files.move_to_end(name)
+        if entry is None or codec is None:
+            return None
+        loaded = self._read(entry, codec)
+        if loaded is None:
+            return None
+        handle, _ = loaded
+        return codec.import_cache(handle, n_tokens, copy=False)
+
+    def _read(self, entry: _DiskEntry, codec: KVCacheCodec) -> tuple[Any, int] | None:
+        start = time.monotonic()
+        try:
+            arrays, metadata = tensor_file.load(self.directory / entry.name)
+            arrays.pop(TOKENS_TENSOR, None)
+            loaded = codec.cache_from_arrays(arrays, metadata)
+        except Exception as e:
+            logger.warning(f"Failed to reload spilled KV cache {entry.name}: {e}")
+            with self._lock:
+                self._remove_locked(entry)
+            self._delete_file(entry.name)
+            return None
+        metrics.disk_cache_reload_seconds.labels(model=entry.model_id).observe(time.monotonic() - start)
+        return loaded
+
+    def _record_lookup(self, kind: str, model_id: str, n_tokens: int):
+        if n_tokens:
+            self.hits += 1
+            metrics.disk_cache_hits.labels(model=model_id, kind=kind).inc()
+            metrics.disk_cache_reloaded_tokens.labels(model=model_id).inc(n_tokens)
+        else:
+            self.misses += 1
+            metrics.disk_cache_misses.labels(model=model_id, kind=kind).inc()
+
+    def _scan(self):
+        """Index files left by a previous run, oldest first"""
+        for path in self.directory.glob("*.safetensors.tmp"):
+            path.unlink(missing_ok=True)
+
+        paths = sorted(self.directory.glob("*.safetensors"), key=lambda p: p.stat().st_mtime)
+        for path in paths:
+            try:
+                arrays, metadata = tensor_file.load(path)
+                tokens = tuple(int(t) for t in arrays[TOKENS_TENSOR])
+                entry = _DiskEntry(
+                    name=path.name,
+                    kind=metadata["kind"],
+                    model_id=metadata["model_id"],
+                    tokens=tokens,
+                    nbytes=path.stat().st_size,
+                    session_id=metadata.get("session_id"),
+                )
+            except Exception as e:
+                logger.warning(f"Discarding unreadable KV cache file {path}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            self._register(entry)
+        if self._files:
+            logger.info(f"Indexed {len(self._files)} spilled KV caches ({self.total_bytes / 1e9:.2f} GB)")
@@ -0,0 +1,180 @@
+"""
+Micro-batching for encoder models (embeddings, cross-encoder scores)
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Protocol
+
+import numpy as np
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Inputs up to this many tokens share the first length bucket; above it buckets double
+MIN_BUCKET_TOKENS = 16
+
+
+class Encoder(Protocol):
+    """Forward-only model that maps a padded token batch to one output row per input"""
+
+    max_length: int  # Longest input the model accepts, in tokens
+    pad_token_id: int
+
+    def tokenize(self, texts: list[str], pairs: list[str] | None = None) -> list[list[int]]:
+        """Token ids per text (or text pair) with the model's special tokens, truncated to ``max_length``"""
+        ...
+
+    def encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Run a (batch, length) int32 batch; returns float32 (batch, dim) or (batch,)"""
+        ...
+
+
+@dataclass
+class _Pending:
+    tokens: list[int]
+    future: asyncio.Future
+
+
+class EncodeBatcher:
+    """
+    Shared forward passes for one encoder model.
+
+    Inputs submitted while a batch runs wait for the next one. Each round
+    sorts everything waiting by length and cuts it into batches within
+    power-of-two length buckets, at most ``max_batch_size`` rows and
+    ``max_batch_tokens`` padded tokens each, so a short query never pads
+    out to a long document. Batches run on the batcher's own thread.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        encoder: Encoder,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+    ):
+        self.model_id = model_id
+        self.encoder = encoder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self._pending: list[_Pending] = []
+        self._running = 0
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"encode-{model_id}")
+
+    @property
+    def busy(self) -> bool:
+        """Whether inputs are waiting or being encoded"""
+        return bool(self._pending) or self._running > 0
+
+    async def tokenize(self, texts: list[str], pairs: list[str] | None = None) -> list[list[int]]:
+        """Tokenize in one batched call on a worker thread, off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.encoder.tokenize, texts, pairs)
+
+    async def encode(self, token_lists: list[list[int]]) -> np.ndarray:
+        """Encoder outputs for ``token_lists``, one row each, in order"""
+        if not token_lists:
+            raise ValueError("Nothing to encode")
+        loop = asyncio.get_running_loop()
+        items = [_Pending(tokens, loop.create_future()) for tokens in token_lists]
+        self._pending.extend(items)
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+        try:
+            rows = await asyncio.gather(*(item.future for item in items))
+        except BaseException:
+            for item in items:
+                item.future.cancel()  # Left out of batches that haven't run yet
+            raise
+        return np.stack(rows)
+
+    def stop(self):
+        """Fail waiting inputs and stop the batching task"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for item in self._pending:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError(f"Model {self.model_id} was unloaded"))
+        self._pending = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def batches(self, pending: list[_Pending]) -> list[list[_Pending]]:
+        """Split waiting inputs into length-bucketed batches"""
+        batches: list[list[_Pending]] = []
+        batch: list[_Pending] = []
+        for item in sorted(pending, key=lambda p: len(p.tokens)):
+            # Sorted ascending, so this item sets the batch's padded length
+            padded = (len(batch) + 1) * max(1, len(item.tokens))
+            if batch and (
+                len(batch) == self.max_batch_size
+                or padded > self.max_batch_tokens
+                or _bucket(len(item.tokens)) != _bucket(len(batch[0].tokens))
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(item)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._pending:
+                pending, self._pending = [p for p in self._pending if not p.future.done()], []
+                for batch in self.batches(pending):
+                    batch = [item for item in batch if not item.future.done()]
+                    if not batch:
+                        continue
+                    self._running = len(batch)
+                    try:
+                        outputs = await loop.run_in_executor(
+                            self._executor, self._forward, [item.tokens for item in batch]
+                        )
+                    except Exception as e:
+                        logger.error(f"Encoder batch failed for {self.model_id}: {e}")
+                        for item in batch:
+                            if not item.future.done():
+                                item.future.set_exception(e)
+                        continue
+                    finally:
+                        self._running = 0
+                    for item, row in zip(batch, outputs, strict=True):
+                        if not item.future.done():
+                            item.future.set_result(row)
+
+    def _forward(self, token_lists: list[list[int]]) -> np.ndarray:
+        width = max(len(tokens) for tokens in token_lists)
+        input_ids = np.full((len(token_lists), width), self.encoder.pad_token_id, dtype=np.int32)
+        attention_mask = np.zeros((len(token_lists), width), dtype=np.int32)
+        for row, tokens in enumerate(token_lists):
+            input_ids[row, :len(tokens)] = tokens
+            attention_mask[row, :len(tokens)] = 1
+
+        start = time.perf_counter()
+        outputs = np.asarray(self.encoder.encode(input_ids, attention_mask), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+
+        real = int(attention_mask.sum())
+        metrics.encode_batch_size.labels(model=self.model_id).observe(len(token_lists))
+        metrics.encode_batch_seconds.labels(model=self.model_id).observe(elapsed)
+        metrics.encode_throughput.labels(model=self.model_id).set(len(token_lists) / max(elapsed, 1e-9))
+        metrics.encode_items.labels(model=self.model_id).inc(len(token_lists))
+        metrics.encode_tokens.labels(model=self.model_id, kind="input").inc(real)
+        metrics.encode_tokens.labels(model=self.model_id, kind="padding").inc(input_ids.size - real)
+        return outputs
+
+
+def _bucket(length: int) -> int:
+    return (max(length, MIN_BUCKET_TOKENS) - 1).bit_length()
@@ -0,0 +1,243 @@
+"""
+Prometheus metrics for the generation engine
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+batch_size = Gauge(
+    "llm_engine_batch_size",
+    "Number of sequences in the shared decode batch",
+    ["model"]
+)
+
+pending_sequences = Gauge(
+    "llm_engine_pending_sequences",
+    "Sequences waiting to be admitted into the decode batch",
+    ["model"]
+)
+
+sequences_finished = Counter(
+    "llm_engine_sequences_total",
+    "Sequences retired from the decode batch",
+    ["model", "finish_reason"]
+)
+
+sequences_cancelled = Counter(
+    "llm_engine_sequences_cancelled_total",
+    "Sequences dropped because their client went away",
+    ["model", "stage"]
+)
+
+cancelled_tokens_saved = Counter(
+    "llm_engine_cancelled_tokens_saved_total",
+    "Tokens up to max_tokens that cancelled sequences did not generate",
+    ["model"]
+)
+
+queue_wait = Histogram(
+    "llm_engine_queue_wait_seconds",
+    "Time a request waits in a model's queue before admission to the batch",
+    ["model", "priority"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+service_time = Histogram(
+    "llm_engine_service_seconds",
+    "Time from admission to completion of a request",
+    ["model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+
+tenant_queue_wait = Histogram(
+    "llm_engine_tenant_queue_wait_seconds",
+    "Queue wait per tenant (service:key) on a shared model",
+    ["model", "tenant"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+tenant_tokens = Counter(
+    "llm_engine_tenant_tokens_total",
+    "Tokens processed per tenant; each tenant's rate over the sum is its share of throughput",
+    ["model", "tenant", "kind"]
+)
+
+worker_busy_seconds = Counter(
+    "llm_engine_worker_busy_seconds_total",
+    "Time a model's decode worker spent running steps (rate = utilisation)",
+    ["model"]
+)
+
+time_to_first_token = Histogram(
+    "llm_engine_time_to_first_token_seconds",
+    "Time from submission to the first sampled token",
+    ["model"]
+)
+
+inter_token_latency = Histogram(
+    "llm_engine_inter_token_latency_seconds",
+    "Time between consecutive sampled tokens of one sequence",
+    ["model"],
+    buckets=(0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.2, 0.5, 1.0)
+)
+
+prefix_cache_hits = Counter(
+    "llm_prefix_cache_hits_total",
+    "Prompts that reused a cached KV prefix",
+    ["model"]
+)
+
+prefix_cache_misses = Counter(
+    "llm_prefix_cache_misses_total",
+    "Prompts with no reusable KV prefix",
+    ["model"]
+)
+
+prefix_cache_tokens_saved = Counter(
+    "llm_prefix_cache_tokens_saved_total",
+    "Prompt tokens served from the prefix cache instead of prefill",
+    ["model"]
+)
+
+prefix_cache_bytes_saved = Counter(
+    "llm_prefix_cache_bytes_saved_total",
+    "KV cache bytes reused instead of recomputed",
+    ["model"]
+)
+
+prefix_cache_evictions = Counter(
+    "llm_prefix_cache_evictions_total",
+    "Snapshots evicted from the prefix cache",
+    ["model"]
+)
+
+prefix_cache_bytes = Gauge(
+    "llm_prefix_cache_bytes",
+    "Bytes held by prefix cache snapshots",
+    ["model"]
+)
+
+session_cache_hits = Counter(
+    "llm_session_cache_hits_total",
+    "Session turns that reused the previous turn's KV cache",
+    ["model"]
+)
+
+session_cache_misses = Counter(
+    "llm_session_cache_misses_total",
+    "Session turns that had to prefill their whole history",
+    ["model"]
+)
+
+session_cache_invalidations = Counter(
+    "llm_session_cache_invalidations_total",
+    "Pinned session caches dropped because the history no longer matched",
+    ["model"]
+)
+
+session_cache_tokens_saved = Counter(
+    "llm_session_cache_tokens_saved_total",
+    "History tokens served from pinned session caches instead of prefill",
+    ["model"]
+)
+
+session_cache_evictions = Counter(
+    "llm_session_cache_evictions_total",
+    "Pinned session caches evicted to stay within the memory cap",
+    ["model"]
+)
+
+session_cache_bytes = Gauge(
+    "llm_session_cache_bytes",
+    "Bytes held by pinned session KV caches across all models"
+)
+
+prefill_seconds = Histogram(
+    "llm_engine_prefill_seconds",
+    "Time spent prefilling one prompt (the recompute cost caches avoid)",
+    ["model"]
+)
+
+forked_sequences = Counter(
+    "llm_engine_forked_sequences_total",
+    "Sequences (n > 1 choices) started from a sibling's prefilled prompt instead of their own prefill",
+    ["model"]
+)
+
+prefill_tokens = Counter(
+    "llm_engine_prefill_tokens_total",
+    "Prompt tokens actually run through the model",
+    ["model"]
+)
+
+disk_cache_hits = Counter(
+    "llm_kv_disk_cache_hits_total",
+    "KV caches reloaded from the disk tier",
+    ["model", "kind"]
+)
+
+disk_cache_misses = Counter(
+    "llm_kv_disk_cache_misses_total",
+    "Disk tier lookups that found nothing usable",
+    ["model", "kind"]
+)
+
+disk_cache_reloaded_tokens = Counter(
+    "llm_kv_disk_cache_reloaded_tokens_total",
+    "Prompt tokens restored from disk instead of prefilled",
+    ["model"]
+)
+
+disk_cache_reload_seconds = Histogram(
+    "llm_kv_disk_cache_reload_seconds",
+    "Time to map and rebuild a spilled KV cache",
+    ["model"]
+)
+
+disk_cache_spills = Counter(
+    "llm_kv_disk_cache_spills_total",
+    "KV caches written to the disk tier",
+    ["model", "kind"]
+)
+
+disk_cache_bytes = Gauge(
+    "llm_kv_disk_cache_bytes",
+    "Bytes held by spilled KV cache files"
+)
+
+warmup_seconds = Histogram(
+    "llm_model_warmup_seconds",
+    "Synthetic warmup run after a model load, before it takes traffic",
+    ["model"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+
+encode_batch_size = Histogram(
+    "llm_engine_encode_batch_size",
+    "Inputs per forward pass of an encoder model (embeddings, reranking)",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+encode_batch_seconds = Histogram(
+    "llm_engine_encode_batch_seconds",
+    "Time of one encoder forward pass",
+    ["model"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+encode_throughput = Gauge(
+    "llm_engine_encode_items_per_second",
+    "Inputs (query/document pairs for rerankers) per second in the latest encoder batch",
+    ["model"]
+)
+
+encode_items = Counter(
+    "llm_engine_encode_items_total",
+    "Inputs run through an encoder model; rate() gives inputs (or pairs) per second",
+    ["model"]
+)
+
+encode_tokens = Counter(
+    "llm_engine_encode_tokens_total",
+    "Tokens in encoder batches, real input vs padding",
+    ["model", "kind"]
+)
@@ -0,0 +1,48 @@
+"""
+MLX implementation of the Encoder interface, through mlx_embeddings
+"""
+from typing import Any
+
+import mlx.core as mx
+import numpy as np
+
+# When neither the tokenizer nor the model config states a limit
+DEFAULT_MAX_LENGTH = 512
+
+
+class MLXEncoder:
+    """Runs an mlx_embeddings model on padded batches: embeddings, or relevance scores for rerankers"""
+
+    def __init__(self, model: Any, tokenizer: Any, max_length: int | None = None, task: str = "embed"):
+        self.model = model
+        self.task = task
+        # mlx_embeddings wraps the Hugging Face tokenizer
+        self.tokenizer = getattr(tokenizer, "_tokenizer", tokenizer)
+        self.max_length = max_length or _max_length(model, self.tokenizer)
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+
+    def tokenize(self, texts: list[str], pairs: list[str] | None = None) -> list[list[int]]:
+        # One batched call; pairs keep the whole query and cut the document
+        truncation = "only_second" if pairs is not None else True
+        encoded = self.tokenizer(texts, pairs, truncation=truncation, max_length=self.max_length)
+        return [list(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        outputs = self.model(mx.array(input_ids), attention_mask=mx.array(attention_mask))
+        # Rerankers: one relevance logit per pair (bge-reranker style), squashed to 0..1;
+        # embedding models: pooled and L2-normalized text embeddings
+        result = mx.sigmoid(outputs.logits[:, -1]) if self.task == "rerank" else outputs.text_embeds
+        mx.eval(result)
+        return np.array(result.astype(mx.float32))
+
+
+def _max_length(model: Any, tokenizer: Any) -> int:
+    limits = []
+    model_max_length = getattr(tokenizer, "model_max_length", None)
+    if isinstance(model_max_length, int) and model_max_length < 1_000_000:  # HF uses 1e30 for "unset"
+        limits.append(model_max_length)
+    args = getattr(model, "config", None) or getattr(model, "args", None)
+    positions = getattr(args, "max_position_embeddings", None)
+    if positions:
+        limits.append(positions)
+    return min(limits) if limits else DEFAULT_MAX_LENGTH
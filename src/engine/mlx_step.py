@@ -0,0 +1,192 @@
+"""
+MLX implementation of the scheduler's StepModel interface
+"""
+import copy as _copy
+import json
+from dataclasses import dataclass
+from typing import Any
+
+import mlx.core as mx
+import numpy as np
+from mlx_lm.models import cache as cache_module
+from mlx_lm.models.cache import can_trim_prompt_cache, make_prompt_cache, trim_prompt_cache
+from mlx_lm.sample_utils import make_sampler
+
+from .scheduler import SamplingParams
+
+# Same chunking mlx_lm uses so long prompts don't spike peak memory
+PREFILL_STEP_SIZE = 2048
+
+# Fallback when the model args don't expose attention geometry
+DEFAULT_KV_BYTES_PER_TOKEN = 128 * 1024
+
+
+@dataclass
+class MLXSequenceState:
+    """Per-sequence KV cache and sampler; seeded sequences carry their own PRNG key"""
+    cache: list[Any]
+    sampler: Any
+    key: mx.array | None = None
+
+
+class MLXStepModel:
+    """Drives an mlx_lm model one token at a time for the batch scheduler (per-sequence forward passes)"""
+
+    def __init__(self, model: Any, tokenizer: Any):
+        self.model = model
+        self.tokenizer = tokenizer
+        eos_ids = getattr(tokenizer, "eos_token_ids", None)
+        if eos_ids is None:
+            eos_id = getattr(tokenizer, "eos_token_id", None)
+            eos_ids = [eos_id] if eos_id is not None else []
+        self.eos_token_ids = set(eos_ids)
+
+    def kv_bytes_per_token(self) -> int:
+        """Estimate K+V bytes per token from the model architecture"""
+        args = getattr(self.model, "args", None)
+        layers = getattr(self.model, "layers", None)
+        try:
+            n_layers = len(layers) if layers is not None else args.num_hidden_layers
+            n_heads = args.num_attention_heads
+            n_kv_heads = getattr(args, "num_key_value_heads", None) or n_heads
+            head_dim = getattr(args, "head_dim", None) or args.hidden_size // n_heads
+        except (AttributeError, TypeError):
+            return DEFAULT_KV_BYTES_PER_TOKEN
+        # K and V, float16
+        return 2 * n_layers * n_kv_heads * head_dim * 2
+
+    def prefill(
+        self,
+        tokens: list[int],
+        params: SamplingParams,
+        cache: list[Any] | None = None,
+        cached_tokens: int = 0,
+    ) -> tuple[MLXSequenceState, int]:
+        if cache is None:
+            cache = make_prompt_cache(self.model)
+            cached_tokens = 0
+        # Seeding the global RNG would reseed every other sequence in the
+        # batch, so a seeded sequence samples from its own key instead
+        key = None
+        if params.seed is not None and params.temperature > 0:
+            key = mx.random.key(params.seed)
+            sampler = _keyed_sampler(params.temperature, params.top_p)
+        else:
+            sampler = make_sampler(params.temperature, params.top_p)
+
+        prompt = mx.array(tokens[cached_tokens:])
+        while prompt.size > PREFILL_STEP_SIZE:
+            self.model(prompt[:PREFILL_STEP_SIZE][None], cache=cache)
+            mx.eval([c.state for c in cache])
+            prompt = prompt[PREFILL_STEP_SIZE:]
+
+        state = MLXSequenceState(cache=cache, sampler=sampler, key=key)
+        token = self._sample(state, prompt[None])
+        mx.eval(token)
+        return state, token.item()
+
+    def decode(self, states: list[MLXSequenceState], tokens: list[int]) -> list[int]:
+        """
+        Advance every sequence by one token.
+
+        Limitation: this is not a batched forward pass. Each sequence
+        still runs its own batch-1 forward over its own KV cache; only
+        the final ``mx.eval`` is shared, so the graphs go to the device
+        together. That saves dispatch and sync overhead per step, but the
+        weights are still read once per sequence, so throughput does not
+        grow with batch size the way a stacked, left-padded batch would.
+        """
+        outputs = [
+            self._sample(state, mx.array([[token]]))
+            for state, token in zip(states, tokens, strict=True)
+        ]
+        mx.eval(outputs)
+        return [out.item() for out in outputs]
+
+    def detokenize(self, tokens: list[int]) -> str:
+        return self.tokenizer.decode(tokens)
+
+    def export_cache(self, state: MLXSequenceState) -> tuple[list[Any], int]:
+        snapshot = _copy.deepcopy(state.cache)
+        return snapshot, _cache_nbytes(snapshot)
+
+    def import_cache(self, handle: list[Any], n_tokens: int, copy: bool = True) -> list[Any] | None:
+        excess = handle[0].offset - n_tokens
+        if excess < 0:
+            return None
+        if excess > 0 and not can_trim_prompt_cache(handle):
+            return None
+        cache = _copy.deepcopy(handle) if copy else handle
+        if excess > 0:
+            trim_prompt_cache(cache, excess)
+        return cache
+
+    def release_cache(self, state: MLXSequenceState) -> tuple[list[Any], int]:
+        cache = state.cache
+        state.cache = None
+        return cache, _cache_nbytes(cache)
+
+    def cache_to_arrays(self, handle: list[Any]) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+        arrays = {}
+        layers = []
+        for i, layer in enumerate(handle):
+            state = layer.state
+            bf16 = []
+            for j, array in enumerate(state):
+                if array.dtype == mx.bfloat16:
+                    # numpy has no bfloat16, keep the raw bits
+                    array = array.view(mx.uint16)
+                    bf16.append(j)
+                arrays[f"{i}.{j}"] = np.asarray(array)
+            layers.append({
+                "class": type(layer).__name__,
+                "meta_state": list(layer.meta_state),
+                "n_arrays": len(state),
+                "bf16": bf16,
+            })
+        return arrays, {"layers": json.dumps(layers)}
+
+    def cache_from_arrays(self, arrays: dict[str, np.ndarray], metadata: dict[str, str]) -> tuple[list[Any], int]:
+        cache = []
+        for i, info in enumerate(json.loads(metadata["layers"])):
+            state = []
+            for j in range(info["n_arrays"]):
+                array = mx.array(arrays[f"{i}.{j}"])
+                if j in info["bf16"]:
+                    array = array.view(mx.bfloat16)
+                state.append(array)
+            layer_cls = getattr(cache_module, info["class"])
+            cache.append(layer_cls.from_state(state, info["meta_state"]))
+        return cache, _cache_nbytes(cache)
+
+    def _sample(self, state: MLXSequenceState, inputs: mx.array) -> mx.array:
+        logits = self.model(inputs, cache=state.cache)[:, -1, :]
+        logprobs = logits - mx.logsumexp(logits, axis=-1, keepdims=True)
+        if state.key is None:
+            return state.sampler(logprobs)
+        state.key, subkey = mx.random.split(state.key)
+        return state.sampler(logprobs, subkey)
+
+
+def _keyed_sampler(temperature: float, top_p: float):
+    """Temperature/top-p sampler drawing from an explicit PRNG key"""
+    def sample(logprobs: mx.array, key: mx.array) -> mx.array:
+        if 0 < top_p < 1:
+            probs = mx.exp(logprobs)
+            sorted_probs = mx.sort(probs, axis=-1)[..., ::-1]
+            # Smallest probability still inside the nucleus
+            inside = (mx.cumsum(sorted_probs, axis=-1) - sorted_probs) < top_p
+            floor = mx.where(inside, sorted_probs, mx.inf).min(axis=-1, keepdims=True)
+            logprobs = mx.where(probs >= floor, logprobs, -mx.inf)
+        return mx.random.categorical(logprobs * (1 / temperature), key=key)
+    return sample
+
+
+def _cache_nbytes(cache: list[Any]) -> int:
+    """Bytes held by the populated part of a prompt cache"""
+    return sum(
+        array.nbytes
+        for layer in cache
+        for array in layer.state
+        if hasattr(array, "nbytes")
+    )
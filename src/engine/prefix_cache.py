@@ -0,0 +1,342 @@
+"""
+Radix-tree prefix cache for reusing prompt KV caches across requests
+"""
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class KVCacheReader(Protocol):
+    """Cache operations needed to serve stored snapshots"""
+
+    def kv_bytes_per_token(self) -> int:
+        ...
+
+    def import_cache(self, handle: Any, n_tokens: int, copy: bool = True) -> Any | None:
+        """
+        Cache usable by prefill, truncated to n_tokens, or None if it can't be trimmed.
+
+        With ``copy=False`` the handle itself is trimmed and handed over.
+        """
+        ...
+
+
+class KVCacheBackend(KVCacheReader, Protocol):
+    """Cache operations a StepModel exposes for prefix reuse"""
+
+    def export_cache(self, state: Any) -> tuple[Any, int]:
+        """Snapshot a sequence's KV cache, returning (handle, size in bytes)"""
+        ...
+
+    def release_cache(self, state: Any) -> tuple[Any, int]:
+        """Take a finished sequence's KV cache without copying, returning (handle, size in bytes)"""
+        ...
+
+
+@dataclass
+class PrefixHit:
+    """A reusable KV cache covering the first ``n_tokens`` of a prompt"""
+    cache: Any
+    n_tokens: int
+
+
+class _Node:
+    """Radix tree node; ``edge`` holds the tokens between parent and this node"""
+
+    __slots__ = ("children", "edge", "entry", "parent")
+
+    def __init__(self, edge: tuple[int, ...] = (), parent: "_Node | None" = None):
+        self.edge = edge
+        self.parent = parent
+        self.children: dict[int, _Node] = {}
+        self.entry: _Entry | None = None
+
+
+@dataclass
+class _Entry:
+    tokens: tuple[int, ...]
+    handle: Any
+    nbytes: int
+    node: _Node
+    last_used: int = 0
+
+
+class PrefixCache:
+    """
+    Maps prompt token prefixes to KV cache snapshots for one model.
+
+    Every prefilled prompt is stored as a snapshot at the end of its path in
+    a radix tree over token ids. A new prompt walks the tree as far as it
+    matches; a snapshot at or below that point is copied and trimmed to the
+    matched length, so only the unmatched suffix has to be prefilled.
+    Snapshots are evicted least-recently-used first once their total size
+    exceeds ``budget_bytes``.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        backend: KVCacheReader,
+        budget_bytes: Callable[[], int],
+        min_tokens: int = 32,
+        on_evict: Callable[[tuple[int, ...], Any, int], None] | None = None,
+        fallback: Callable[[list[int]], PrefixHit | None] | None = None,
+        track_metrics: bool = True,
+    ):
+        self.model_id = model_id
+        self.backend = backend
+        self.min_tokens = min_tokens
+        self.track_metrics = track_metrics
+        self._budget_bytes = budget_bytes
+        self._on_evict = on_evict
+        self._fallback = fallback
+        self._root = _Node()
+        self._lru: OrderedDict[tuple[int, ...], _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._clock = 0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Cache statistics for admin endpoints"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+    def lookup(self, tokens: list[int]) -> PrefixHit | None:
+        """Find the longest cached prefix of a prompt (at least one token is left to prefill)"""
+        if len(tokens) < 2:
+            return None
+        # The last prompt token must run through the model to get logits
+        query = tuple(tokens[:-1])
+
+        with self._lock:
+            node, matched, below = self._walk(query)
+            candidates = []
+            if below is not None and matched >= self.min_tokens:
+                descendant = self._any_entry(below)
+                if descendant is not None:
+                    candidates.append((descendant, matched))
+            ancestor = self._nearest_entry(node)
+            if ancestor is not None:
+                candidates.append((ancestor, len(ancestor.tokens)))
+
+        for entry, n_tokens in candidates:
+            cache = self.backend.import_cache(entry.handle, n_tokens)
+            if cache is None:
+                continue
+            with self._lock:
+                self._touch(entry)
+                self.hits += 1
+                self.tokens_saved += n_tokens
+            self._record_hit(n_tokens)
+            return PrefixHit(cache=cache, n_tokens=n_tokens)
+
+        with self._lock:
+            self.misses += 1
+        if self.track_metrics:
+            metrics.prefix_cache_misses.labels(model=self.model_id).inc()
+        if self._fallback is not None:
+            # Lower tier (e.g. disk); the prompt is re-inserted here after prefill
+            return self._fallback(tokens)
+        return None
+
+    def insert(self, tokens: list[int], state: Any):
+        """Snapshot a freshly prefilled sequence under its prompt tokens; needs a KVCacheBackend"""
+        if len(tokens) < self.min_tokens:
+            return
+        key = tuple(tokens)
+        with self._lock:
+            if key in self._lru:
+                self._touch(self._lru[key])
+                return
+
+        handle, nbytes = self.backend.export_cache(state)
+        self.add(key, handle, nbytes)
+
+    def add(self, tokens: tuple[int, ...], handle: Any, nbytes: int):
+        """Store an existing snapshot (e.g. reloaded from a lower cache tier)"""
+        evicted = []
+        with self._lock:
+            if tokens in self._lru:
+                self._touch(self._lru[tokens])
+                return
+            node = self._insert_path(tokens)
+            entry = _Entry(tokens=tokens, handle=handle, nbytes=nbytes, node=node)
+            node.entry = entry
+            self._lru[tokens] = entry
+            self._touch(entry)
+            self.total_bytes += nbytes
+            evicted = self._evict_locked()
+        self._after_evict(evicted)
+
+    def discard(self, tokens: tuple[int, ...]):
+        """Remove a single snapshot without triggering the eviction hook"""
+        with self._lock:
+            entry = self._lru.pop(tuple(tokens), None)
+            if entry is None:
+                return
+            self._remove_entry(entry)
+            self.total_bytes -= entry.nbytes
+        self._update_gauge()
+
+    def evict_to(self, budget_bytes: int):
+        """Shrink the cache below ``budget_bytes``"""
+        with self._lock:
+            evicted = self._evict_locked(budget_bytes)
+        self._after_evict(evicted)
+
+    def clear(self):
+        """Drop every snapshot without spilling"""
+        with self._lock:
+            self._root = _Node()
+            self._lru.clear()
+            self.total_bytes = 0
+        self._update_gauge()
+
+    def _touch(self, entry: _Entry):
+        self._clock += 1
+        entry.last_used = self._clock
+        if entry.tokens in self._lru:
+            self._lru.move_to_end(entry.tokens)
+
+    def _walk(self, tokens: tuple[int, ...]) -> tuple[_Node, int, _Node | None]:
+        """
+        Follow ``tokens`` down the tree.
+
+        Returns the deepest fully matched node, the number of matched tokens
+        and the subtree root holding every snapshot that extends the match.
+        """
+        node = self._root
+        i = 0
+        while i < len(tokens):
+            child = node.children.get(tokens[i])
+            if child is None:
+                return node, i, (node if i else None)
+            common = _common_prefix(child.edge, tokens, i)
+            i += common
+            if common < len(child.edge):
+                return node, i, child
+            node = child
+        return node, i, node
+
+    def _any_entry(self, node: _Node) -> _Entry | None:
+        """Most recently used snapshot in the subtree rooted at ``node``"""
+        best = None
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            entry = current.entry
+            if entry is not None and (best is None or entry.last_used > best.last_used):
+                best = entry
+            stack.extend(current.children.values())
+        return best
+
+    @staticmethod
+    def _nearest_entry(node: _Node | None) -> "_Entry | None":
+        while node is not None:
+            if node.entry is not None:
+                return node.entry
+            node = node.parent
+        return None
+
+    def _insert_path(self, tokens: tuple[int, ...]) -> _Node:
+        node = self._root
+        i = 0
+        while i < len(tokens):
+            child = node.children.get(tokens[i])
+            if child is None:
+                leaf = _Node(edge=tokens[i:], parent=node)
+                node.children[tokens[i]] = leaf
+                return leaf
+            common = _common_prefix(child.edge, tokens, i)
+            if common < len(child.edge):
+                # Split the edge so the shared part becomes its own node
+                middle = _Node(edge=child.edge[:common], parent=node)
+                node.children[tokens[i]] = middle
+                child.edge = child.edge[common:]
+                child.parent = middle
+                middle.children[child.edge[0]] = child
+                child = middle
+            i += common
+            node = child
+        return node
+
+    def _remove_entry(self, entry: _Entry):
+        node = entry.node
+        node.entry = None
+        # Prune empty leaves and merge pass-through nodes
+        while node is not self._root and node.entry is None:
+            parent = node.parent
+            if not node.children:
+                del parent.children[node.edge[0]]
+            elif len(node.children) == 1:
+                (child,) = node.children.values()
+                child.edge = node.edge + child.edge
+                child.parent = parent
+                parent.children[child.edge[0]] = child
+            else:
+                break
+            node = parent
+
+    def _evict_locked(self, budget_bytes: int | None = None) -> list[_Entry]:
+        budget = self._budget_bytes() if budget_bytes is None else budget_bytes
+        evicted = []
+        while self._lru and self.total_bytes > budget:
+            _, entry = self._lru.popitem(last=False)
+            self._remove_entry(entry)
+            self.total_bytes -= entry.nbytes
+            evicted.append(entry)
+        return evicted
+
+    def _after_evict(self, evicted: list[_Entry]):
+        for entry in evicted:
+            if self.track_metrics:
+                metrics.prefix_cache_evictions.labels(model=self.model_id).inc()
+            if self._on_evict:
+                try:
+                    self._on_evict(entry.tokens, entry.handle, entry.nbytes)
+                except Exception as e:
+                    logger.warning(f"Prefix cache eviction hook failed for {self.model_id}: {e}")
+        self._update_gauge()
+
+    def _record_hit(self, n_tokens: int):
+        if not self.track_metrics:
+            return
+        metrics.prefix_cache_hits.labels(model=self.model_id).inc()
+        metrics.prefix_cache_tokens_saved.labels(model=self.model_id).inc(n_tokens)
+        metrics.prefix_cache_bytes_saved.labels(model=self.model_id).inc(
+            n_tokens * self.backend.kv_bytes_per_token()
+        )
+
+    def _update_gauge(self):
+        if not self.track_metrics:
+            return
+        metrics.prefix_cache_bytes.labels(model=self.model_id).set(self.total_bytes)
+
+
+def _common_prefix(edge: tuple[int, ...], tokens: tuple[int, ...], start: int) -> int:
+    n = 0
+    limit = min(len(edge), len(tokens) - start)
+    while n < limit and edge[n] == tokens[start + n]:
+        n += 1
+    return n
@@ -0,0 +1,722 @@
+"""
+Continuous-batching scheduler shared by all requests for one model
+"""
+import asyncio
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+from typing import Any, Protocol
+
+from . import metrics
+from .detokenizer import IncrementalDetokenizer
+from .prefix_cache import PrefixCache, PrefixHit
+from .session_cache import SessionKVCache
+from .stop import StopStringMatcher
+from .streaming import TokenStream
+
+logger = logging.getLogger(__name__)
+
+_seq_ids = itertools.count(1)
+
+# Tenant for requests without service/API key attribution
+DEFAULT_TENANT = "default"
+
+
+@dataclass(frozen=True)
+class SamplingParams:
+    """Per-sequence sampling parameters"""
+    temperature: float = 0.7
+    top_p: float = 1.0
+    max_tokens: int = 2048
+    stop_token_ids: frozenset[int] = frozenset()
+    stop_strings: tuple[str, ...] = ()  # Matched on decoded text, excluded from the output
+    seed: int | None = None
+
+
+@dataclass
+class GenerationResult:
+    """Final output of one sequence"""
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    finish_reason: str
+
+
+class StepModel(Protocol):
+    """Token-level model interface driven by the scheduler"""
+
+    eos_token_ids: set[int]
+
+    def kv_bytes_per_token(self) -> int:
+        """Approximate KV cache footprint of a single token"""
+        ...
+
+    def prefill(
+        self,
+        tokens: list[int],
+        params: SamplingParams,
+        cache: Any = None,
+        cached_tokens: int = 0,
+    ) -> tuple[Any, int]:
+        """
+        Process a prompt, returning (sequence state, first sampled token).
+
+        When ``cache`` is given it already holds the first ``cached_tokens``
+        tokens of the prompt and only the remainder is prefilled.
+        """
+        ...
+
+    def decode(self, states: list[Any], tokens: list[int]) -> list[int]:
+        """Advance every sequence in the batch by one token"""
+        ...
+
+    def detokenize(self, tokens: list[int]) -> str:
+        """Convert token ids back to text"""
+        ...
+
+    def export_cache(self, state: Any) -> tuple[Any, int]:
+        """Snapshot a sequence's KV cache, returning (handle, size in bytes)"""
+        ...
+
+    def import_cache(self, handle: Any, n_tokens: int, copy: bool = True) -> Any | None:
+        """
+        Cache usable by prefill, truncated to n_tokens, or None if it can't be trimmed.
+
+        With ``copy=False`` the handle itself is trimmed and handed over.
+        """
+        ...
+
+    def release_cache(self, state: Any) -> tuple[Any, int]:
+        """Take a finished sequence's KV cache without copying, returning (handle, size in bytes)"""
+        ...
+
+
+@dataclass
+class ForkGroup:
+    """Sequences sampling from the same prompt; the prompt is prefilled once"""
+    remaining: int  # Members still to be prefilled
+    handle: Any = None  # KV snapshot of the prompt, kept until the last member forks it
+
+
+@dataclass
+class Sequence:
+    """A single request travelling through the decode loop"""
+    prompt_tokens: list[int]
+    params: SamplingParams
+    seq_id: int = field(default_factory=lambda: next(_seq_ids))
+    output_tokens: list[int] = field(default_factory=list)
+    finish_reason: str | None = None
+    state: Any = None
+    future: asyncio.Future | None = None
+    loop: asyncio.AbstractEventLoop | None = None
+    stream: TokenStream | None = None
+    detokenizer: IncrementalDetokenizer | None = None
+    stop_matcher: StopStringMatcher | None = None
+    text_chunks: list[str] = field(default_factory=list)  # Emitted text, when decoded incrementally
+    cancelled: bool = False
+    session_id: str | None = None
+    fork_group: ForkGroup | None = None
+    priority: int = 0  # Lower is more urgent
+    tenant: str = DEFAULT_TENANT
+    virtual_finish: float = 0.0  # Fair-queuing tag, set on enqueue
+    decode_steps: int = 0
+    submitted_at: float = field(default_factory=time.monotonic)
+    admitted_at: float | None = None
+    last_token_at: float | None = None
+
+    @property
+    def reserved_tokens(self) -> int:
+        """Upper bound on the number of tokens this sequence can hold in cache"""
+        return len(self.prompt_tokens) + self.params.max_tokens
+
+    @property
+    def finished(self) -> bool:
+        return self.finish_reason is not None
+
+    @property
+    def kv_tokens(self) -> list[int]:
+        """Tokens whose keys/values are in the KV cache (the last sampled one never is)"""
+        return self.prompt_tokens + self.output_tokens[:self.decode_steps]
+
+    @property
+    def paused(self) -> bool:
+        """Streaming consumer is behind, hold this sequence back"""
+        return not self.cancelled and self.stream is not None and self.stream.full()
+
+
+class BatchScheduler:
+    """
+    Runs one decode loop per model on a dedicated thread.
+
+    New sequences are admitted at token boundaries, every active sequence
+    advances by one token per step, and finished sequences are retired
+    immediately without waiting for the rest of the batch. Admission is
+    bounded by ``max_batch_size`` and by the KV cache budget returned from
+    ``kv_budget_bytes`` so the batch shrinks when memory gets tight.
+
+    Waiting sequences are admitted by ``priority`` (lower first). Every
+    ``aging_seconds`` spent waiting promotes a sequence by one class so
+    low-priority work is never starved. Within a class, tenants share the
+    model by self-clocked weighted fair queuing over tokens: each sequence
+    is tagged with a virtual finish time of ``start + tokens / weight``,
+    where its tenant's queued and running work pushes ``start`` back, and
+    the smallest tag goes first. Unused ``max_tokens`` are credited back
+    when a sequence finishes.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        step_model: StepModel,
+        max_batch_size: int = 8,
+        kv_budget_bytes: Callable[[], int | None] | None = None,
+        prefix_cache: PrefixCache | None = None,
+        session_cache: SessionKVCache | None = None,
+        aging_seconds: float | None = None,
+        tenant_weight: Callable[[str], float] | None = None,
+    ):
+        self.model_id = model_id
+        self.step_model = step_model
+        self.max_batch_size = max(1, max_batch_size)
+        self._kv_budget_bytes = kv_budget_bytes
+        self.prefix_cache = prefix_cache
+        self.session_cache = session_cache
+        self._kv_bytes_per_token = max(0, step_model.kv_bytes_per_token())
+        self.aging_seconds = aging_seconds
+        self._tenant_weight = tenant_weight or (lambda tenant: 1.0)
+        self._virtual_time = 0.0
+        self._tenant_finish: dict[str, float] = {}
+
+        self._pending: list[Sequence] = []
+        self._active: list[Sequence] = []
+        self._reserved_bytes = 0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def submit(
+        self,
+        prompt_tokens: list[int],
+        params: SamplingParams,
+        session_id: str | None = None,
+        priority: int = 0,
+        tenant: str | None = None,
+    ) -> GenerationResult:
+        """Queue a prompt for generation and wait for its result"""
+        loop = asyncio.get_running_loop()
+        seq = Sequence(
+            prompt_tokens=list(prompt_tokens),
+            params=params,
+            session_id=session_id,
+            priority=priority,
+            tenant=tenant or DEFAULT_TENANT,
+        )
+        seq.loop = loop
+        seq.future = loop.create_future()
+        if params.stop_strings:
+            self._watch_stops(seq)
+        self._enqueue(seq)
+        try:
+            return await seq.future
+        except asyncio.CancelledError:
+            # Caller gave up (client disconnect, timeout): stop generating for it
+            self.cancel(seq)
+            raise
+
+    async def submit_batch(
+        self,
+        prompts: list[list[int]],
+        params: SamplingParams,
+        n: int = 1,
+        priority: int = 0,
+        tenant: str | None = None,
+    ) -> list[list[GenerationResult]]:
+        """
+        Generate ``n`` continuations for each prompt as one batch.
+
+        All sequences are queued together so they are admitted and decoded
+        side by side. Each prompt is prefilled once; its other ``n - 1``
+        sequences fork that KV cache and only re-run the last prompt token
+        to sample their own first token. With a seed, continuation ``i``
+        uses ``seed + i`` so the choices differ but stay reproducible.
+        """
+        loop = asyncio.get_running_loop()
+        seqs = []
+        for prompt_tokens in prompts:
+            group = ForkGroup(remaining=n) if n > 1 else None
+            for i in range(n):
+                seq_params = params if params.seed is None else replace(params, seed=params.seed + i)
+                seq = Sequence(
+                    prompt_tokens=list(prompt_tokens),
+                    params=seq_params,
+                    fork_group=group,
+                    priority=priority,
+                    tenant=tenant or DEFAULT_TENANT,
+                )
+                seq.loop = loop
+                seq.future = loop.create_future()
+                if seq_params.stop_strings:
+                    self._watch_stops(seq)
+                seqs.append(seq)
+        self._enqueue(*seqs)
+        try:
+            results = await asyncio.gather(*(seq.future for seq in seqs))
+        except BaseException:
+            for seq in seqs:
+                self.cancel(seq)
+            raise
+        return [results[i:i + n] for i in range(0, len(results), n)]
+
+    def stream(
+        self,
+        prompt_tokens: list[int],
+        params: SamplingParams,
+        buffer_size: int = 32,
+        session_id: str | None = None,
+        priority: int = 0,
+        tenant: str | None = None,
+    ) -> TokenStream:
+        """
+        Queue a prompt for streamed generation.
+
+        Returns a TokenStream yielding text deltas as soon as each token is
+        sampled; its ``result`` holds the GenerationResult once exhausted.
+        At most ``buffer_size`` deltas are buffered before the sequence is
+        paused to wait for the reader.
+        """
+        loop = asyncio.get_running_loop()
+        seq = Sequence(
+            prompt_tokens=list(prompt_tokens),
+            params=params,
+            session_id=session_id,
+            priority=priority,
+            tenant=tenant or DEFAULT_TENANT,
+        )
+        seq.loop = loop
+        self._watch_stops(seq)
+        seq.stream = TokenStream(
+            loop,
+            maxsize=buffer_size,
+            on_drain=self._wake,
+            on_close=lambda: self.cancel(seq),
+            queue_position=lambda: self.queue_position(seq),
+        )
+        self._enqueue(seq)
+        return seq.stream
+
+    def _watch_stops(self, seq: Sequence):
+        """Decode as we go, so deltas stream out and stop strings end decoding early"""
+        seq.detokenizer = IncrementalDetokenizer(self.step_model.detokenize)
+        if seq.params.stop_strings:
+            seq.stop_matcher = StopStringMatcher(seq.params.stop_strings)
+
+    def queue_position(self, seq: Sequence) -> int | None:
+        """0-based place in the admission order, None once admitted"""
+        with self._cond:
+            if seq not in self._pending:
+                return None
+            return self._admission_order().index(seq)
+
+    def cancel(self, seq: Sequence):
+        """Drop a sequence at the next token boundary"""
+        seq.cancelled = True
+        self._wake()
+
+    def stop(self):
+        """Stop the decode loop and fail anything still queued"""
+        with self._cond:
+            self._running = False
+            pending = list(self._pending)
+            self._pending.clear()
+            self._cond.notify_all()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self._thread = None
+
+        error = RuntimeError(f"Scheduler for {self.model_id} stopped")
+        for seq in pending + self._active:
+            self._fail(seq, error)
+        self._active.clear()
+        self._reserved_bytes = 0
+        self._tenant_finish.clear()
+        if self.prefix_cache is not None:
+            self.prefix_cache.clear()
+        if self.session_cache is not None:
+            self.session_cache.drop_model(self.model_id)
+        self._update_gauges()
+
+    def _enqueue(self, *seqs: Sequence):
+        with self._cond:
+            if not self._running:
+                self._start_locked()
+            for seq in seqs:
+                self._tag_locked(seq)
+                self._pending.append(seq)
+            self._cond.notify()
+        self._update_gauges()
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _start_locked(self):
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"decode-{self.model_id}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _sequence_bytes(self, seq: Sequence) -> int:
+        return seq.reserved_tokens * self._kv_bytes_per_token
+
+    def _fits(self, seq: Sequence, batch_len: int) -> bool:
+        if batch_len >= self.max_batch_size:
+            return False
+        budget = self._kv_budget_bytes() if self._kv_budget_bytes else None
+        if budget is None or batch_len == 0:
+            # Always make progress on at least one sequence
+            return True
+        return self._reserved_bytes + self._sequence_bytes(seq) <= budget
+
+    def _admit_locked(self) -> list[Sequence]:
+        admitted = []
+        for seq in self._admission_order():
+            if seq.cancelled:
+                self._pending.remove(seq)
+                self._settle_locked(seq)
+                self._leave_fork_group(seq)
+                self._count_cancelled(seq, "queued")
+                continue
+            # Strict order: a big urgent request is not overtaken by small ones
+            if not self._fits(seq, len(self._active) + len(admitted)):
+                break
+            self._pending.remove(seq)
+            self._reserved_bytes += self._sequence_bytes(seq)
+            seq.admitted_at = time.monotonic()
+            self._virtual_time = max(self._virtual_time, seq.virtual_finish)
+            wait = seq.admitted_at - seq.submitted_at
+            metrics.queue_wait.labels(model=self.model_id, priority=str(seq.priority)).observe(wait)
+            metrics.tenant_queue_wait.labels(model=self.model_id, tenant=seq.tenant).observe(wait)
+            if seq.stream is not None:
+                seq.stream.mark_admitted_threadsafe()
+            admitted.append(seq)
+        return admitted
+
+    def _admission_order(self) -> list[Sequence]:
+        """Pending sequences by aged priority class, then fair-queuing tag, then arrival"""
+        now = time.monotonic()
+
+        def rank(seq: Sequence) -> tuple[int, float, float]:
+            priority = seq.priority
+            if self.aging_seconds:
+                priority -= int((now - seq.submitted_at) // self.aging_seconds)
+            return priority, seq.virtual_finish, seq.submitted_at
+
+        return sorted(self._pending, key=rank)
+
+    def _tag_locked(self, seq: Sequence):
+        """Assign the WFQ finish tag; the tenant's backlog pushes it later"""
+        weight = max(self._tenant_weight(seq.tenant), 1e-3)
+        start = max(self._virtual_time, self._tenant_finish.get(seq.tenant, 0.0))
+        seq.virtual_finish = start + seq.reserved_tokens / weight
+        self._tenant_finish[seq.tenant] = seq.virtual_finish
+
+    def _settle_locked(self, seq: Sequence):
+        """Credit back reserved tokens the sequence never processed"""
+        unused = seq.reserved_tokens if seq.admitted_at is None else seq.params.max_tokens - len(seq.output_tokens)
+        finish = self._tenant_finish.get(seq.tenant)
+        if finish is None:
+            return
+        weight = max(self._tenant_weight(seq.tenant), 1e-3)
+        finish -= max(0, unused) / weight
+        if finish <= self._virtual_time:
+            # Caught up: no backlog to remember for this tenant
+            del self._tenant_finish[seq.tenant]
+        else:
+            self._tenant_finish[seq.tenant] = finish
+
+    def _run(self):
+        while True:
+            admitted: list[Sequence] = []
+            try:
+                with self._cond:
+                    while self._running and not self._pending and not self._active:
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    admitted = self._admit_locked()
+                    if not admitted and all(seq.paused for seq in self._active):
+                        if self._active:
+                            # Every stream is waiting on its reader, sleep until one drains
+                            self._cond.wait(timeout=0.05)
+                        continue
+
+                start = time.monotonic()
+                self._step(admitted)
+                metrics.worker_busy_seconds.labels(model=self.model_id).inc(time.monotonic() - start)
+                self._update_gauges()
+            except Exception as e:
+                # Never let the thread die quietly with requests still waiting on it
+                logger.error(f"Decode loop failed for {self.model_id}: {e}", exc_info=True)
+                self._fail_all(admitted, e)
+
+    def _fail_all(self, admitted: list[Sequence], error: BaseException):
+        """Fail every queued, admitted and running sequence and start from an empty batch"""
+        with self._cond:
+            pending = list(self._pending)
+            self._pending.clear()
+            self._tenant_finish.clear()
+        active_ids = {id(seq) for seq in self._active}
+        for seq in pending + [seq for seq in admitted if id(seq) not in active_ids] + self._active:
+            seq.state = None
+            self._fail(seq, error)
+        self._active = []
+        self._reserved_bytes = 0
+        self._update_gauges()
+
+    def _step(self, admitted: list[Sequence]):
+        """One scheduling tick: decode the running batch, then prefill newcomers"""
+        running = [
+            seq for seq in self._active
+            if not seq.finished and not seq.cancelled and not seq.paused
+        ]
+        if running:
+            try:
+                tokens = self.step_model.decode(
+                    [seq.state for seq in running],
+                    [seq.output_tokens[-1] for seq in running],
+                )
+            except Exception as e:
+                logger.error(f"Decode step failed for {self.model_id}: {e}", exc_info=True)
+                for seq in running:
+                    self._fail(seq, e)
+            else:
+                for seq, token in zip(running, tokens, strict=True):
+                    seq.decode_steps += 1
+                    self._append_token(seq, token)
+
+        for seq in admitted:
+            try:
+                seq.state, token = self._prefill(seq)
+            except Exception as e:
+                logger.error(f"Prefill failed for {self.model_id}: {e}", exc_info=True)
+                # Siblings still fork (or prefill) without this member
+                self._leave_fork_group(seq)
+                self._release(seq)
+                self._fail(seq, e)
+                continue
+            self._active.append(seq)
+            self._append_token(seq, token)
+
+        self._retire()
+
+    def _prefill(self, seq: Sequence) -> tuple[Any, int]:
+        pinned = seq.session_id is not None and self.session_cache is not None
+        group = seq.fork_group
+        hit = None
+        if group is not None and group.handle is not None:
+            hit = self._fork(seq, group)
+        forked = hit is not None
+        if hit is None and pinned:
+            hit = self.session_cache.take(seq.session_id, self.model_id, seq.prompt_tokens)
+        if hit is None and self.prefix_cache is not None:
+            hit = self.prefix_cache.lookup(seq.prompt_tokens)
+
+        start = time.monotonic()
+        if hit is None:
+            state, token = self.step_model.prefill(seq.prompt_tokens, seq.params)
+        else:
+            state, token = self.step_model.prefill(
+                seq.prompt_tokens, seq.params, cache=hit.cache, cached_tokens=hit.n_tokens
+            )
+        metrics.prefill_seconds.labels(model=self.model_id).observe(time.monotonic() - start)
+        metrics.prefill_tokens.labels(model=self.model_id).inc(
+            len(seq.prompt_tokens) - (hit.n_tokens if hit else 0)
+        )
+
+        if group is not None:
+            self._leave_fork_group(seq)
+            if group.remaining > 0 and group.handle is None:
+                # First member: snapshot the prompt for the others to fork
+                try:
+                    group.handle, _ = self.step_model.export_cache(state)
+                except Exception as e:
+                    logger.warning(f"Could not snapshot prompt for forking in {self.model_id}: {e}")
+
+        # Session prompts are pinned whole after the turn, no need to snapshot them twice
+        if self.prefix_cache is not None and not pinned and not forked:
+            try:
+                self.prefix_cache.insert(seq.prompt_tokens, state)
+            except Exception as e:
+                # Caching is an optimisation, never fail the request over it
+                logger.warning(f"Prefix cache insert failed for {self.model_id}: {e}")
+        return state, token
+
+    @staticmethod
+    def _leave_fork_group(seq: Sequence):
+        """Count a member out of its group; the last one out drops the prompt snapshot"""
+        group = seq.fork_group
+        if group is None:
+            return
+        seq.fork_group = None
+        group.remaining -= 1
+        if group.remaining <= 0:
+            group.handle = None
+
+    def _fork(self, seq: Sequence, group: ForkGroup) -> PrefixHit | None:
+        """KV cache of the group's prompt minus its last token, which is re-run to sample"""
+        n_tokens = len(seq.prompt_tokens) - 1
+        if n_tokens <= 0:
+            return None
+        # The last member to fork takes the snapshot itself instead of a copy
+        cache = self.step_model.import_cache(group.handle, n_tokens, copy=group.remaining > 1)
+        if cache is None:
+            return None
+        metrics.forked_sequences.labels(model=self.model_id).inc()
+        return PrefixHit(cache=cache, n_tokens=n_tokens)
+
+    def _append_token(self, seq: Sequence, token: int):
+        now = time.monotonic()
+        if seq.last_token_at is None:
+            metrics.time_to_first_token.labels(model=self.model_id).observe(now - seq.submitted_at)
+        else:
+            metrics.inter_token_latency.labels(model=self.model_id).observe(now - seq.last_token_at)
+        seq.last_token_at = now
+
+        if token in self.step_model.eos_token_ids or token in seq.params.stop_token_ids:
+            seq.finish_reason = "stop"
+            return
+        seq.output_tokens.append(token)
+        if seq.detokenizer is not None:
+            self._emit(seq, seq.detokenizer.add_token(token))
+        if not seq.finished and len(seq.output_tokens) >= seq.params.max_tokens:
+            seq.finish_reason = "length"
+
+    def _emit(self, seq: Sequence, delta: str, check_stops: bool = True):
+        """Pass decoded text through the stop matcher to the output"""
+        if check_stops and seq.stop_matcher is not None and delta:
+            delta = seq.stop_matcher.feed(delta)
+            if seq.stop_matcher.stopped:
+                seq.finish_reason = "stop"
+        if delta:
+            seq.text_chunks.append(delta)
+            if seq.stream is not None:
+                seq.stream.put_threadsafe(delta)
+
+    def _retire(self):
+        still_active = []
+        for seq in self._active:
+            if seq.cancelled and not seq.finished:
+                seq.finish_reason = "cancelled"
+                self._release(seq)
+                self._count_cancelled(seq, "running")
+            elif seq.finish_reason == "error" or (seq.future is not None and seq.future.done()):
+                # Failed or abandoned by its caller
+                self._release(seq)
+            elif seq.finished:
+                self._finish(seq)
+            else:
+                still_active.append(seq)
+        self._active = still_active
+
+    def _finish(self, seq: Sequence):
+        try:
+            if seq.detokenizer is not None:
+                matcher = seq.stop_matcher
+                if matcher is None or not matcher.stopped:
+                    self._emit(seq, seq.detokenizer.finalize())
+                if matcher is not None and not matcher.stopped:
+                    self._emit(seq, matcher.flush(), check_stops=False)
+                text = "".join(seq.text_chunks)
+            else:
+                text = self.step_model.detokenize(seq.output_tokens)
+        except Exception as e:
+            self._release(seq)
+            self._fail(seq, e)
+            return
+        result = GenerationResult(
+            text=text,
+            prompt_tokens=len(seq.prompt_tokens),
+            completion_tokens=len(seq.output_tokens),
+            finish_reason=seq.finish_reason or "stop",
+        )
+        if seq.session_id is not None and self.session_cache is not None:
+            try:
+                self.session_cache.pin(
+                    seq.session_id, self.model_id, seq.kv_tokens, self.step_model, seq.state
+                )
+            except Exception as e:
+                logger.warning(f"Could not pin KV cache for session {seq.session_id}: {e}")
+        self._release(seq)
+        metrics.sequences_finished.labels(model=self.model_id, finish_reason=result.finish_reason).inc()
+        self._resolve(seq, result)
+
+    def _count_cancelled(self, seq: Sequence, stage: str):
+        metrics.sequences_cancelled.labels(model=self.model_id, stage=stage).inc()
+        metrics.cancelled_tokens_saved.labels(model=self.model_id).inc(
+            max(0, seq.params.max_tokens - len(seq.output_tokens))
+        )
+
+    def _release(self, seq: Sequence):
+        if seq.state is not None:
+            seq.state = None
+        if seq.admitted_at is not None:
+            metrics.service_time.labels(model=self.model_id).observe(time.monotonic() - seq.admitted_at)
+            metrics.tenant_tokens.labels(model=self.model_id, tenant=seq.tenant, kind="prompt").inc(
+                len(seq.prompt_tokens)
+            )
+            metrics.tenant_tokens.labels(model=self.model_id, tenant=seq.tenant, kind="completion").inc(
+                len(seq.output_tokens)
+            )
+        with self._cond:
+            self._settle_locked(seq)
+        self._reserved_bytes = max(0, self._reserved_bytes - self._sequence_bytes(seq))
+
+    def _resolve(self, seq: Sequence, result: GenerationResult):
+        if seq.stream is not None:
+            seq.stream.finish_threadsafe(result)
+            return
+
+        def _set():
+            if not seq.future.done():
+                seq.future.set_result(result)
+        self._call_soon(seq, _set)
+
+    def _fail(self, seq: Sequence, error: BaseException):
+        if seq.finish_reason is None:
+            seq.finish_reason = "error"
+        if seq.stream is not None:
+            seq.stream.fail_threadsafe(error)
+            return
+
+        def _set():
+            if not seq.future.done():
+                seq.future.set_exception(error)
+        self._call_soon(seq, _set)
+
+    @staticmethod
+    def _call_soon(seq: Sequence, callback: Callable[[], None]):
+        if seq.loop is None or seq.future is None:
+            return
+        # Event loop already closed means nobody is waiting any more
+        with contextlib.suppress(RuntimeError):
+            seq.loop.call_soon_threadsafe(callback)
+
+    def _update_gauges(self):
+        metrics.batch_size.labels(model=self.model_id).set(len(self._active))
+        metrics.pending_sequences.labels(model=self.model_id).set(len(self._pending))
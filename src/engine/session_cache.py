@@ -0,0 +1,230 @@
+"""
+Session-pinned KV caches so multi-turn chats only prefill the new turn
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import metrics
+from .prefix_cache import KVCacheBackend, PrefixHit
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SessionEntry:
+    session_id: str
+    model_id: str
+    tokens: tuple[int, ...]
+    handle: Any
+    nbytes: int
+    backend: KVCacheBackend
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+class SessionKVCache:
+    """
+    Keeps the KV cache left behind by a session's previous turn.
+
+    After a turn finishes, the sequence's cache (prompt plus generated reply)
+    is pinned to its session. On the next turn the new prompt is compared
+    token by token with the pinned sequence: the matching prefix is reused
+    and only the newly appended messages are prefilled. If the history was
+    edited the cache is trimmed to the common prefix, or dropped when too
+    little of it still matches.
+
+    A single instance is shared by all models so ``max_total_bytes`` caps
+    the whole server; sessions are evicted least-recently-used first.
+    """
+
+    def __init__(
+        self,
+        max_total_bytes: int | Callable[[], int],
+        max_session_bytes: int,
+        min_tokens: int = 32,
+        ttl_seconds: float | None = None,
+        on_evict: Callable[[str, str, tuple[int, ...], Any, int], None] | None = None,
+        fallback: Callable[[str, str], tuple[tuple[int, ...], Any, KVCacheBackend] | None] | None = None,
+    ):
+        self._max_total_bytes = max_total_bytes
+        self.max_session_bytes = max_session_bytes
+        self.min_tokens = min_tokens
+        self.ttl_seconds = ttl_seconds
+        self._on_evict = on_evict
+        self._fallback = fallback
+        self._entries: OrderedDict[str, _SessionEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    @property
+    def max_total_bytes(self) -> int:
+        if callable(self._max_total_bytes):
+            return self._max_total_bytes()
+        return self._max_total_bytes
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Cache statistics for admin endpoints"""
+        return {
+            "sessions": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def model_bytes(self, model_id: str) -> int:
+        """Bytes pinned for sessions on one model"""
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values() if e.model_id == model_id)
+
+    def take(self, session_id: str, model_id: str, tokens: list[int]) -> PrefixHit | None:
+        """
+        Claim a session's pinned cache for a new turn.
+
+        The entry is removed from the store: the running sequence now owns
+        the cache and will pin its extended version when the turn finishes.
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+
+        if entry is None and self._fallback is not None:
+            # Evicted earlier, try the lower tier (e.g. disk)
+            restored = self._fallback(session_id, model_id)
+            if restored is not None:
+                restored_tokens, handle, backend = restored
+                entry = _SessionEntry(
+                    session_id=session_id,
+                    model_id=model_id,
+                    tokens=restored_tokens,
+                    handle=handle,
+                    nbytes=0,
+                    backend=backend,
+                )
+        if entry is None:
+            self._miss(model_id)
+            return None
+        if entry.model_id != model_id or self._expired(entry):
+            self._invalidate(entry)
+            return None
+
+        # Leave at least the last prompt token to produce logits
+        matched = _common_prefix(entry.tokens, tokens[:-1])
+        if matched < self.min_tokens:
+            self._invalidate(entry)
+            return None
+
+        cache = entry.backend.import_cache(entry.handle, matched, copy=False)
+        self._update_gauge()
+        if cache is None:
+            self._invalidate(entry)
+            return None
+
+        self.hits += 1
+        metrics.session_cache_hits.labels(model=model_id).inc()
+        metrics.session_cache_tokens_saved.labels(model=model_id).inc(matched)
+        return PrefixHit(cache=cache, n_tokens=matched)
+
+    def pin(self, session_id: str, model_id: str, tokens: list[int], backend: KVCacheBackend, state: Any):
+        """Attach a finished turn's KV cache to its session"""
+        if len(tokens) < self.min_tokens:
+            return
+        handle, nbytes = backend.release_cache(state)
+        if nbytes > self.max_session_bytes:
+            logger.debug(f"Session {session_id} cache too large to pin ({nbytes} bytes)")
+            return
+
+        entry = _SessionEntry(
+            session_id=session_id,
+            model_id=model_id,
+            tokens=tuple(tokens),
+            handle=handle,
+            nbytes=nbytes,
+            backend=backend,
+        )
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self._entries[session_id] = entry
+            self.total_bytes += nbytes
+            evicted = self._evict_locked(self.max_total_bytes)
+        self._after_evict(evicted)
+
+    def drop(self, session_id: str):
+        """Forget a session (deleted or expired upstream)"""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+        self._update_gauge()
+
+    def drop_model(self, model_id: str):
+        """Forget every session pinned to an unloaded model"""
+        with self._lock:
+            for session_id in [s for s, e in self._entries.items() if e.model_id == model_id]:
+                self.total_bytes -= self._entries.pop(session_id).nbytes
+        self._update_gauge()
+
+    def evict_to(self, budget_bytes: int):
+        """Shrink pinned caches below ``budget_bytes``"""
+        with self._lock:
+            evicted = self._evict_locked(budget_bytes)
+        self._after_evict(evicted)
+
+    def _expired(self, entry: _SessionEntry) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - entry.stored_at > self.ttl_seconds
+
+    def _miss(self, model_id: str):
+        self.misses += 1
+        metrics.session_cache_misses.labels(model=model_id).inc()
+
+    def _invalidate(self, entry: _SessionEntry):
+        self.invalidations += 1
+        self._miss(entry.model_id)
+        metrics.session_cache_invalidations.labels(model=entry.model_id).inc()
+        self._update_gauge()
+
+    def _evict_locked(self, budget_bytes: int) -> list[_SessionEntry]:
+        evicted = []
+        while self._entries and self.total_bytes > budget_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry.nbytes
+            evicted.append(entry)
+        return evicted
+
+    def _after_evict(self, evicted: list[_SessionEntry]):
+        for entry in evicted:
+            metrics.session_cache_evictions.labels(model=entry.model_id).inc()
+            if self._on_evict:
+                try:
+                    self._on_evict(entry.session_id, entry.model_id, entry.tokens, entry.handle, entry.nbytes)
+                except Exception as e:
+                    logger.warning(f"Session cache eviction hook failed for {entry.session_id}: {e}")
+        self._update_gauge()
+
+    def _update_gauge(self):
+        metrics.session_cache_bytes.set(self.total_bytes)
+
+
+def _common_prefix(a: tuple[int, ...], b: list[int]) -> int:
+    n = 0
+    limit = min(len(a), len(b))
+    while n < limit and a[n] == b[n]:
+        n += 1
+    return n
@@ -0,0 +1,99 @@
+"""
+Streaming stop-string detection over decoded text
+"""
+from collections import deque
+from functools import lru_cache
+
+
+class StopAutomaton:
+    """
+    Aho-Corasick automaton over a set of stop strings.
+
+    Feeding one character costs amortised O(1) however many stop strings
+    there are. Each state knows its depth (length of the longest suffix of
+    the text that is a prefix of some stop string) and the longest stop
+    string ending there.
+    """
+
+    def __init__(self, stops: tuple[str, ...]):
+        self.stops = stops
+        self._goto: list[dict[str, int]] = [{}]
+        self.depth = [0]
+        self.match = [0]
+        for stop in stops:
+            state = 0
+            for ch in stop:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self.depth.append(self.depth[state] + 1)
+                    self.match.append(0)
+                state = nxt
+            self.match[state] = len(stop)
+
+        # Failure links in BFS order, so a state's link is done before its children
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self.match[child] = self.match[child] or self.match[self._fail[child]]
+                queue.append(child)
+
+    def step(self, state: int, ch: str) -> int:
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(ch, 0)
+
+
+@lru_cache(maxsize=256)
+def compile_stops(stops: tuple[str, ...]) -> StopAutomaton:
+    """Shared automaton for a stop set; clients resend the same few sets"""
+    return StopAutomaton(stops)
+
+
+class StopStringMatcher:
+    """
+    Per-sequence stop-string state over streamed text deltas.
+
+    Text that could still turn out to be the start of a stop string is held
+    back, so a partial match is never emitted and the stop string itself
+    never reaches the client. At most the longest stop string's length is
+    held.
+    """
+
+    def __init__(self, stops: tuple[str, ...]):
+        self._automaton = compile_stops(stops)
+        self._state = 0
+        self._held = ""
+        self.stopped = False
+
+    def feed(self, text: str) -> str:
+        """Add a delta; return the text now safe to emit (up to a match)"""
+        if self.stopped:
+            return ""
+        automaton = self._automaton
+        pending = self._held + text
+        offset = len(self._held)
+        state = self._state
+        for i, ch in enumerate(text):
+            state = automaton.step(state, ch)
+            if automaton.match[state]:
+                self.stopped = True
+                self._held = ""
+                return pending[:offset + i + 1 - automaton.match[state]]
+        self._state = state
+        cut = len(pending) - automaton.depth[state]
+        self._held = pending[cut:]
+        return pending[:cut]
+
+    def flush(self) -> str:
+        """Release held-back text once generation ended without a match"""
+        held, self._held = self._held, ""
+        return held
@@ -0,0 +1,130 @@
+"""
+Bounded hand-off of streamed tokens from the decode thread to asyncio
+"""
+import asyncio
+import contextlib
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class QueuePosition:
+    """Progress event for a stream still waiting for admission"""
+    position: int  # 0 = next to be admitted
+
+
+class _End:
+    """Marks the end of a stream and carries the final result"""
+
+    def __init__(self, result: Any):
+        self.result = result
+
+
+class TokenStream:
+    """
+    Async iterator of text deltas produced on the decode thread.
+
+    The queue itself never blocks the producer. Instead the scheduler checks
+    ``full()`` before decoding the next token for this sequence, so a slow
+    reader pauses only its own sequence while the rest of the batch keeps
+    going. ``on_drain`` wakes the scheduler once there is room again.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        maxsize: int = 32,
+        on_drain: Callable[[], None] | None = None,
+        on_close: Callable[[], None] | None = None,
+        queue_position: Callable[[], int | None] | None = None,
+    ):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._maxsize = max(1, maxsize)
+        self._backlog = 0
+        self._lock = threading.Lock()
+        self._on_drain = on_drain
+        self._on_close = on_close
+        self._closed = False
+        self._queue_position = queue_position
+        self.admitted = asyncio.Event()
+        self.result: Any = None
+
+    def full(self) -> bool:
+        """True while the consumer has maxsize undelivered deltas"""
+        with self._lock:
+            return self._backlog >= self._maxsize
+
+    def queue_position(self) -> int | None:
+        """Place in the scheduler's admission queue, None once generating"""
+        if self.admitted.is_set() or self._queue_position is None:
+            return None
+        return self._queue_position()
+
+    def mark_admitted_threadsafe(self):
+        """The sequence left the queue and is being prefilled (decode thread)"""
+        self._call_soon(self.admitted.set)
+
+    def put_threadsafe(self, delta: str):
+        """Queue a text delta (decode thread)"""
+        with self._lock:
+            self._backlog += 1
+        self._call_soon(self._queue.put_nowait, delta)
+
+    def finish_threadsafe(self, result: Any):
+        """Queue the end marker with the final result (decode thread)"""
+        self._call_soon(self._queue.put_nowait, _End(result))
+
+    def fail_threadsafe(self, error: BaseException):
+        """Queue an exception to be raised in the consumer (decode thread)"""
+        self._call_soon(self._queue.put_nowait, error)
+
+    def close(self):
+        """Stop consuming; the scheduler drops the sequence at the next step"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._on_close:
+            self._on_close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if isinstance(item, _End):
+            self.result = item.result
+            self._closed = True
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            self._closed = True
+            raise item
+
+        with self._lock:
+            was_full = self._backlog >= self._maxsize
+            self._backlog -= 1
+        if was_full and self._on_drain:
+            self._on_drain()
+        return item
+
+    def _call_soon(self, callback: Callable[..., None], *args: Any):
+        # Event loop already closed means nobody is reading any more
+        with contextlib.suppress(RuntimeError):
+            self._loop.call_soon_threadsafe(callback, *args)
+
+
+async def iter_with_queue_position(stream: TokenStream, interval: float = 1.0):
+    """
+    Yield QueuePosition events every ``interval`` seconds while ``stream``
+    waits for admission, then its text deltas.
+    """
+    while (position := stream.queue_position()) is not None:
+        yield QueuePosition(position)
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(stream.admitted.wait(), timeout=interval)
+    async for delta in stream:
+        yield delta
@@ -0,0 +1,292 @@
+"""
+Deterministic stand-in engine for benchmarking the serving stack without a model
+"""
+import time
+import weakref
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .backend import LoadedModel
+from .scheduler import SamplingParams
+
+# Text the synthetic model "generates", cycled from a prompt-dependent offset
+CORPUS = (
+    "The quick brown fox jumps over the lazy dog. "
+    "Pack my box with five dozen liquor jugs. "
+    "How vexingly quick daft zebras jump. "
+    "Sphinx of black quartz, judge my vow. "
+)
+
+
+class SyntheticTokenizer:
+    """
+    Byte-level tokenizer with ChatML special tokens.
+
+    Every UTF-8 byte is one token, so encode/decode round-trip exactly and
+    token counts are predictable from text length.
+    """
+
+    SPECIAL_TOKENS = ("<|endoftext|>", "<|im_start|>", "<|im_end|>")
+
+    chat_template = "chatml"
+    bos_token = None
+
+    def __init__(self):
+        self._special = {text: i for i, text in enumerate(self.SPECIAL_TOKENS)}
+        self.all_special_ids = list(self._special.values())
+        self.eos_token_id = self._special["<|endoftext|>"]
+        self.eos_token_ids = [self.eos_token_id, self._special["<|im_end|>"]]
+        self.vocab_size = len(self.SPECIAL_TOKENS) + 256
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[int]:
+        tokens = []
+        offset = len(self.SPECIAL_TOKENS)
+        start = 0
+        while start < len(text):
+            special = min(
+                ((i, s) for s in self.SPECIAL_TOKENS if (i := text.find(s, start)) >= 0),
+                default=(len(text), None),
+            )
+            tokens.extend(b + offset for b in text[start:special[0]].encode())
+            if special[1] is None:
+                break
+            tokens.append(self._special[special[1]])
+            start = special[0] + len(special[1])
+        return tokens
+
+    def decode(self, tokens: list[int]) -> str:
+        offset = len(self.SPECIAL_TOKENS)
+        parts = []
+        raw = bytearray()
+        for token in tokens:
+            if token < offset:
+                parts.append(raw.decode(errors="replace"))
+                raw.clear()
+                parts.append(self.SPECIAL_TOKENS[token])
+            else:
+                raw.append(token - offset)
+        parts.append(raw.decode(errors="replace"))
+        return "".join(parts)
+
+    def apply_chat_template(self, messages: list, add_generation_prompt: bool = False, tokenize: bool = False):
+        text = "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+        if add_generation_prompt:
+            text += "<|im_start|>assistant\n"
+        return self.encode(text) if tokenize else text
+
+
+@dataclass(eq=False)
+class SyntheticModel:
+    """Placeholder for weights; its size is what the backend reports as resident"""
+    name: str
+    nbytes: int
+
+
+@dataclass
+class SyntheticState:
+    tokens: list[int]
+    position: int  # Next CORPUS token to emit
+
+
+class SyntheticStepModel:
+    """
+    StepModel that sleeps instead of computing.
+
+    The output depends only on the prompt and seed, never on batching or
+    cache hits, so runs are reproducible. Costs are fixed per prompt token
+    and per decode step, and KV handles are plain token lists sized at
+    ``kv_bytes`` per token, so the scheduler's budgets behave as with a
+    real model.
+    """
+
+    def __init__(
+        self,
+        tokenizer: SyntheticTokenizer,
+        prefill_ms_per_token: float = 0.0,
+        decode_ms_per_step: float = 0.0,
+        kv_bytes: int = 128 * 1024,
+    ):
+        self.tokenizer = tokenizer
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_step = decode_ms_per_step
+        self.kv_bytes = kv_bytes
+        self.eos_token_ids = set(tokenizer.eos_token_ids)
+        self._corpus = tokenizer.encode(CORPUS)
+
+    def kv_bytes_per_token(self) -> int:
+        return self.kv_bytes
+
+    def prefill(
+        self,
+        tokens: list[int],
+        params: SamplingParams,
+        cache: list[int] | None = None,
+        cached_tokens: int = 0,
+    ) -> tuple[SyntheticState, int]:
+        if cache is None:
+            cached_tokens = 0
+        _sleep_ms(self.prefill_ms_per_token * (len(tokens) - cached_tokens))
+        seed = zlib.crc32(np.asarray(tokens, dtype=np.uint32).tobytes(), (params.seed or 0) & 0xFFFFFFFF)
+        state = SyntheticState(tokens=list(tokens), position=seed % len(self._corpus))
+        return state, self._next(state)
+
+    def decode(self, states: list[SyntheticState], tokens: list[int]) -> list[int]:
+        _sleep_ms(self.decode_ms_per_step)
+        outputs = []
+        for state, token in zip(states, tokens, strict=True):
+            state.tokens.append(token)
+            outputs.append(self._next(state))
+        return outputs
+
+    def detokenize(self, tokens: list[int]) -> str:
+        return self.tokenizer.decode(tokens)
+
+    def export_cache(self, state: SyntheticState) -> tuple[list[int], int]:
+        tokens = list(state.tokens)
+        return tokens, len(tokens) * self.kv_bytes
+
+    def import_cache(self, handle: list[int], n_tokens: int, copy: bool = True) -> list[int] | None:
+        if n_tokens > len(handle):
+            return None
+        if copy:
+            return handle[:n_tokens]
+        del handle[n_tokens:]
+        return handle
+
+    def release_cache(self, state: SyntheticState) -> tuple[list[int], int]:
+        tokens, state.tokens = state.tokens, []
+        return tokens, len(tokens) * self.kv_bytes
+
+    def cache_to_arrays(self, handle: list[int]) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+        return {"tokens": np.asarray(handle, dtype=np.uint32)}, {}
+
+    def cache_from_arrays(self, arrays: dict[str, np.ndarray], metadata: dict[str, str]) -> tuple[list[int], int]:
+        tokens = arrays["tokens"].tolist()
+        return tokens, len(tokens) * self.kv_bytes
+
+    def _next(self, state: SyntheticState) -> int:
+        token = self._corpus[state.position]
+        state.position = (state.position + 1) % len(self._corpus)
+        return token
+
+
+class SyntheticEncoder:
+    """
+    Encoder whose embeddings are normalized sums of fixed random token vectors.
+
+    Texts sharing tokens get similar vectors, and a row never depends on
+    what it was batched or padded with. As a reranker (``task="rerank"``)
+    a pair scores the similarity of its query and document halves,
+    mapped to 0..1.
+    """
+
+    def __init__(
+        self,
+        tokenizer: SyntheticTokenizer,
+        dimensions: int = 384,
+        max_length: int = 512,
+        ms_per_token: float = 0.0,
+        task: str = "embed",
+    ):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.task = task
+        self.pad_token_id = tokenizer.eos_token_id
+        self.ms_per_token = ms_per_token
+        self._table = np.random.default_rng(0).standard_normal((tokenizer.vocab_size, dimensions)).astype(np.float32)
+
+    def tokenize(self, texts: list[str], pairs: list[str] | None = None) -> list[list[int]]:
+        if pairs is None:
+            return [self.tokenizer.encode(text)[:self.max_length] for text in texts]
+        separator = self.tokenizer.eos_token_id
+        return [
+            [*self.tokenizer.encode(text), separator, *self.tokenizer.encode(pair)][:self.max_length]
+            for text, pair in zip(texts, pairs, strict=True)
+        ]
+
+    def encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        _sleep_ms(self.ms_per_token * attention_mask.size)
+        if self.task == "rerank":
+            # Query is everything before the first separator, the document everything after
+            separator = np.argmax(input_ids == self.tokenizer.eos_token_id, axis=1)[:, None]
+            positions = np.arange(input_ids.shape[1])[None, :]
+            query = self._embed(input_ids, attention_mask * (positions < separator))
+            document = self._embed(input_ids, attention_mask * (positions > separator))
+            return ((query * document).sum(axis=1) + 1) / 2
+        return self._embed(input_ids, attention_mask)
+
+    def _embed(self, input_ids: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        summed = (self._table[input_ids] * mask[..., None]).sum(axis=1)
+        return summed / np.maximum(np.linalg.norm(summed, axis=1, keepdims=True), 1e-6)
+
+
+class SyntheticBackend:
+    """Backend serving SyntheticStepModels (or SyntheticEncoders) under any model ID, with no weights on disk"""
+
+    name = "synthetic"
+    needs_weights = False
+
+    def __init__(
+        self,
+        prefill_ms_per_token: float = 0.0,
+        decode_ms_per_step: float = 0.0,
+        kv_bytes_per_token: int = 128 * 1024,
+        model_gb: float = 1.0,
+    ):
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_step = decode_ms_per_step
+        self.kv_bytes_per_token = kv_bytes_per_token
+        self.model_gb = model_gb
+        self._models: weakref.WeakSet[SyntheticModel] = weakref.WeakSet()
+        self._peak_bytes = 0
+
+    def load(self, model_path: str, model_config: dict[str, Any] | None = None) -> LoadedModel:
+        model = self._resident_model(model_path)
+        tokenizer = SyntheticTokenizer()
+        step_model = SyntheticStepModel(
+            tokenizer,
+            prefill_ms_per_token=self.prefill_ms_per_token,
+            decode_ms_per_step=self.decode_ms_per_step,
+            kv_bytes=self.kv_bytes_per_token,
+        )
+        return LoadedModel(model, tokenizer, step_model)
+
+    def load_encoder(
+        self, model_path: str, model_config: dict[str, Any] | None = None, task: str = "embed"
+    ) -> LoadedModel:
+        model = self._resident_model(model_path)
+        tokenizer = SyntheticTokenizer()
+        encoder = SyntheticEncoder(
+            tokenizer,
+            max_length=(model_config or {}).get("context_length") or 512,
+            ms_per_token=self.prefill_ms_per_token,
+            task=task,
+        )
+        return LoadedModel(model, tokenizer, None, encoder)
+
+    def footprint_gb(self, model_path: Path) -> float | None:
+        return self.model_gb
+
+    def memory_usage(self) -> dict[str, float]:
+        return {"active_gb": self._active_bytes() / 1e9, "peak_gb": self._peak_bytes / 1e9, "cache_gb": 0.0}
+
+    def clear_cache(self):
+        pass
+
+    def _resident_model(self, model_path: str) -> SyntheticModel:
+        model = SyntheticModel(Path(model_path).name, int(self.model_gb * 1e9))
+        self._models.add(model)
+        self._peak_bytes = max(self._peak_bytes, self._active_bytes())
+        return model
+
+    def _active_bytes(self) -> int:
+        return sum(model.nbytes for model in self._models)
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
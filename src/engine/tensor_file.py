@@ -0,0 +1,82 @@
+"""
+Minimal safetensors reader/writer backed by numpy memory maps
+"""
+import json
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+_DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "I64": np.int64,
+    "I32": np.int32,
+    "I16": np.int16,
+    "I8": np.int8,
+    "U64": np.uint64,
+    "U32": np.uint32,
+    "U16": np.uint16,
+    "U8": np.uint8,
+    "BOOL": np.bool_,
+    # numpy has no bfloat16; the raw bits are exposed as uint16
+    "BF16": np.uint16,
+}
+_NAMES = {np.dtype(v): k for k, v in _DTYPES.items() if k != "BF16"}
+
+
+def save(path: Path, tensors: dict[str, np.ndarray], metadata: dict[str, str] | None = None):
+    """Write tensors atomically in safetensors layout"""
+    header: dict = {"__metadata__": metadata or {}}
+    arrays = []
+    offset = 0
+    for name, array in tensors.items():
+        array = np.ascontiguousarray(array)
+        dtype = _NAMES.get(array.dtype)
+        if dtype is None:
+            raise ValueError(f"Unsupported dtype for {name}: {array.dtype}")
+        header[name] = {
+            "dtype": dtype,
+            "shape": list(array.shape),
+            "data_offsets": [offset, offset + array.nbytes],
+        }
+        offset += array.nbytes
+        arrays.append(array)
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    # Pad so tensor data starts 8-byte aligned
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays:
+            f.write(array.data)
+    os.replace(tmp_path, path)
+
+
+def read_header(path: Path) -> tuple[dict, int]:
+    """Return the JSON header and the byte offset where tensor data starts"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    return header, 8 + length
+
+
+def load(path: Path) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+    """Map a safetensors file into read-only numpy arrays without copying"""
+    header, data_start = read_header(path)
+    metadata = header.pop("__metadata__", {}) or {}
+    if not header:
+        return {}, metadata
+
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    tensors = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        raw = mapped[data_start + start:data_start + end]
+        tensors[name] = raw.view(_DTYPES[info["dtype"]]).reshape(info["shape"])
+    return tensors, metadata
@@ -0,0 +1,67 @@
+"""
+Synthetic warmup so the first real request doesn't pay for kernel compilation
+"""
+import logging
+import time
+from typing import Any
+
+from . import metrics
+from .prefix_cache import PrefixCache
+from .scheduler import SamplingParams, StepModel
+
+logger = logging.getLogger(__name__)
+
+# Greedy and short: only the shapes matter, not the text
+WARMUP_PARAMS = SamplingParams(temperature=0.0, max_tokens=1)
+
+
+def synthetic_prompt(base_tokens: list[int], length: int) -> list[int]:
+    """Repeat ``base_tokens`` to exactly ``length`` tokens"""
+    base = base_tokens or [0]
+    return (base * (length // len(base) + 1))[:length]
+
+
+def warmup(
+    model_id: str,
+    step_model: StepModel,
+    prompts: list[list[int]],
+    decode_steps: int = 2,
+    cache_prompts: list[list[int]] | None = None,
+    prefix_cache: PrefixCache | None = None,
+) -> float:
+    """
+    Prefill every prompt, then run ``decode_steps`` batched decode steps.
+
+    Covers the prefill shapes of each prompt length and the decode path at
+    the batch size real traffic will use. ``cache_prompts`` (e.g. service
+    system prompts) are also snapshotted into ``prefix_cache`` so their
+    first real request skips that prefill. Returns the elapsed seconds.
+    """
+    start = time.monotonic()
+    states: list[Any] = []
+    tokens: list[int] = []
+    try:
+        for prompt in prompts:
+            state, token = step_model.prefill(prompt, WARMUP_PARAMS)
+            states.append(state)
+            tokens.append(token)
+        for prompt in cache_prompts or []:
+            state, token = step_model.prefill(prompt, WARMUP_PARAMS)
+            if prefix_cache is not None:
+                prefix_cache.insert(prompt, state)
+            states.append(state)
+            tokens.append(token)
+
+        for _ in range(decode_steps if states else 0):
+            tokens = step_model.decode(states, tokens)
+    finally:
+        for state in states:
+            step_model.release_cache(state)
+
+    elapsed = time.monotonic() - start
+    metrics.warmup_seconds.labels(model=model_id).observe(elapsed)
+    logger.info(
+        f"Warmed up {model_id} in {elapsed:.2f}s "
+        f"({len(prompts)} synthetic, {len(cache_prompts or [])} cached prompts)"
+    )
+    return elapsed
@@ -0,0 +1,479 @@
+"""
+Out-of-process engine: one model host shared by several HTTP workers
+
+The engine process owns the ModelManager (weights, schedulers, KV caches)
+and serves it over a Unix socket. Each HTTP worker uses a
+RemoteModelManager with the same interface, so endpoints don't know
+which one they talk to. Frames are length-prefixed JSON; a streamed
+generation is a run of frames tagged with its request id, multiplexed
+with other requests on the worker's single connection.
+"""
+import asyncio
+import base64
+import contextlib
+import inspect
+import itertools
+import json
+import logging
+import os
+import signal
+import struct
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from dataclasses import asdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+
+from .config import config
+from .engine.scheduler import GenerationResult
+from .engine.streaming import QueuePosition
+from .loader import ModelNotReadyError
+from .model_config import ModelConfig
+from .model_registry import ModelRegistry
+from .residency import ResidencyError
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+_TYPES = {cls.__name__: cls for cls in (GenerationResult, QueuePosition)}
+_READY = object()
+
+# ModelManager methods callable over the socket
+ENGINE_METHODS = frozenset({
+    "generate_completion",
+    "generate_batch",
+    "embed",
+    "rerank",
+    "get_or_load_model",
+    "load_model",
+    "unload_model",
+    "start_loading",
+    "drop_session_cache",
+})
+# These return (model, tokenizer), which stays in the engine
+_RESULT_DROPPED = frozenset({"get_or_load_model", "load_model"})
+
+
+class EngineError(RuntimeError):
+    """The engine process failed a call or went away"""
+
+
+def default_socket_path() -> Path:
+    return Path(tempfile.gettempdir()) / "lbrx-engine.sock"
+
+
+def encode_frame(message: dict[str, Any]) -> bytes:
+    payload = json.dumps(message, separators=(",", ":"), default=str).encode()
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict[str, Any] | None:
+    """Next message, or None once the peer closed the connection"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        return json.loads(await reader.readexactly(length))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, GenerationResult | QueuePosition):
+        return {"__type__": type(value).__name__, **asdict(value)}
+    if isinstance(value, np.ndarray):
+        # Raw bytes rather than a list of floats: embeddings are large
+        data = base64.b64encode(np.ascontiguousarray(value).tobytes()).decode()
+        return {"__type__": "ndarray", "dtype": value.dtype.str, "shape": list(value.shape), "data": data}
+    if isinstance(value, list | tuple):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict) and "__type__" in value:
+        fields = dict(value)
+        if fields["__type__"] == "ndarray":
+            array = np.frombuffer(base64.b64decode(fields["data"]), dtype=fields["dtype"])
+            return array.reshape(fields["shape"])
+        return _TYPES[fields.pop("__type__")](**fields)
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _encode_error(error: Exception) -> dict[str, Any]:
+    frame = {"event": "error", "type": type(error).__name__, "message": str(error)}
+    if isinstance(error, ModelNotReadyError):
+        frame.update(model_id=error.model_id, retry_after=error.retry_after)
+    return frame
+
+
+def _decode_error(frame: dict[str, Any]) -> Exception:
+    """Re-raise the errors endpoints map to HTTP statuses as their own types"""
+    kind, message = frame.get("type"), frame.get("message", "")
+    if kind == "ModelNotReadyError":
+        return ModelNotReadyError(frame["model_id"], frame["retry_after"])
+    if kind == "ResidencyError":
+        return ResidencyError(message)
+    if kind == "ValueError":
+        return ValueError(message)
+    return EngineError(message)
+
+
+class EngineServer:
+    """Serves a ModelManager to RemoteModelManagers over a Unix socket"""
+
+    def __init__(self, manager: Any, socket_path: Path):
+        self.manager = manager
+        self.socket_path = Path(socket_path)
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self):
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()  # Left over from a crashed engine
+        self._server = await asyncio.start_unix_server(self._serve, path=str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Engine listening on {self.socket_path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Everything RemoteModelManager exposes as plain attributes"""
+        manager = self.manager
+        return {
+            "models": list(manager.models),
+            "current_model": manager.current_model,
+            "model_info": manager.model_info,
+            "memory_usage": manager.memory_usage,
+            "load_queue": manager.load_queue,
+            "worker_stats": manager.worker_stats,
+            "residency": manager.residency.stats,
+            "readiness": manager.readiness,
+            "startup_models": manager.startup_models,
+        }
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks: dict[int, asyncio.Task] = {}
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                request_id = frame["id"]
+                if frame["method"] == "cancel":
+                    task = tasks.get(request_id)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self._run(writer, frame))
+                tasks[request_id] = task
+                task.add_done_callback(lambda _, rid=request_id: tasks.pop(rid, None))
+        finally:
+            # The worker is gone: stop generating for it
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+    async def _run(self, writer: asyncio.StreamWriter, frame: dict[str, Any]):
+        request_id, method = frame["id"], frame["method"]
+        args, kwargs = frame.get("args", []), frame.get("kwargs", {})
+
+        async def send(message: dict[str, Any]):
+            writer.write(encode_frame({"id": request_id, **message}))
+            await writer.drain()  # A slow worker pauses this sequence via the token stream
+
+        try:
+            if method == "state":
+                await send({"event": "result", "item": self.snapshot()})
+                return
+            if method not in ENGINE_METHODS:
+                raise ValueError(f"Unknown engine method: {method}")
+            result = getattr(self.manager, method)(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            if method == "generate_completion" and kwargs.get("stream"):
+                await send({"event": "ready"})
+                try:
+                    async for item in result:
+                        await send({"event": "item", "item": _encode(item)})
+                finally:
+                    await result.aclose()
+                await send({"event": "end"})
+            else:
+                await send({"event": "result", "item": None if method in _RESULT_DROPPED else _encode(result)})
+        except ConnectionError:
+            pass  # Worker gone; _serve cancels the rest
+        except Exception as e:
+            with contextlib.suppress(ConnectionError):
+                await send(_encode_error(e))
+
+
+class RemoteModelManager:
+    """
+    ModelManager for HTTP workers whose models live in the engine process.
+
+    Calls travel over one connection per worker. State read synchronously
+    by the admin endpoints (loaded models, memory, load queue) comes from
+    a snapshot refreshed every ``engine_state_interval_seconds``; the
+    model registry is read from the shared models_dir locally.
+    """
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = Path(socket_path)
+        self.registry = ModelRegistry(config.models_dir)
+        self._writer: asyncio.StreamWriter | None = None
+        self._connect_lock: asyncio.Lock | None = None
+        self._pending: dict[int, asyncio.Queue] = {}
+        self._ids = itertools.count(1)
+        self._state: dict[str, Any] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def initialize(self):
+        """Wait for the engine to accept connections and take a first snapshot"""
+        await asyncio.get_running_loop().run_in_executor(None, self.registry.refresh)
+        deadline = time.monotonic() + config.engine_connect_timeout_seconds
+        while True:
+            try:
+                await self._connect()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise EngineError(f"Engine not reachable at {self.socket_path}") from None
+                await asyncio.sleep(0.2)
+        await self.refresh_state()
+        self._spawn(self._poll_state())
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    # Calls forwarded to the engine
+
+    async def generate_completion(
+        self,
+        model_id: str,
+        messages: list,
+        temperature: float = 0.7,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        stop: list | None = None,
+        stream: bool = False,
+        **kwargs
+    ):
+        """Same contract as ModelManager.generate_completion"""
+        kwargs.update(temperature=temperature, top_p=top_p, max_tokens=max_tokens, stop=stop, stream=stream)
+        if not stream:
+            return await self._call("generate_completion", model_id, messages, **kwargs)
+        frames = self._request("generate_completion", model_id, messages, **kwargs)
+        # Load and admission errors surface here, before the response starts, as they do locally
+        await anext(frames)
+        return frames
+
+    async def generate_batch(self, model_id: str, prompts: list[list], n: int = 1, **kwargs) -> list[list[Any]]:
+        return await self._call("generate_batch", model_id, prompts, n=n, **kwargs)
+
+    async def embed(self, model_id: str, texts: list[str]) -> tuple[np.ndarray, int]:
+        vectors, tokens = await self._call("embed", model_id, texts)
+        return vectors, tokens
+
+    async def rerank(self, model_id: str, query: str, documents: list[str]) -> tuple[np.ndarray, int]:
+        scores, tokens = await self._call("rerank", model_id, query, documents)
+        return scores, tokens
+
+    async def get_or_load_model(self, model_id: str) -> None:
+        """Wait for (or be refused) the model; the weights stay in the engine"""
+        await self._call("get_or_load_model", model_id)
+
+    async def load_model(self, model_id: str) -> None:
+        await self._call("load_model", model_id)
+        await self.refresh_state()
+
+    async def unload_model(self, model_id: str):
+        await self._call("unload_model", model_id)
+        await self.refresh_state()
+
+    def start_loading(self, model_id: str) -> dict[str, Any]:
+        self._spawn(self._call("start_loading", model_id))
+        status = self.load_status(model_id)
+        return status if status["state"] != "not_loaded" else {**status, "state": "queued"}
+
+    def drop_session_cache(self, session_id: str):
+        self._spawn(self._call("drop_session_cache", session_id))
+
+    # Snapshot of engine state
+
+    @property
+    def models(self) -> dict[str, None]:
+        return dict.fromkeys(self._state.get("models", []))
+
+    @property
+    def current_model(self) -> str | None:
+        return self._state.get("current_model")
+
+    @property
+    def memory_usage(self) -> dict[str, float]:
+        return self._state.get("memory_usage", {})
+
+    @property
+    def load_queue(self) -> list[dict[str, Any]]:
+        return self._state.get("load_queue", [])
+
+    @property
+    def worker_stats(self) -> dict[str, dict[str, int]]:
+        return self._state.get("worker_stats", {})
+
+    @property
+    def residency(self) -> SimpleNamespace:
+        return SimpleNamespace(stats=self._state.get("residency", {}))
+
+    @property
+    def readiness(self) -> dict[str, Any]:
+        return self._state.get("readiness", {"ready": False, "models": {}})
+
+    @property
+    def startup_models(self) -> list[str]:
+        return self._state.get("startup_models", [])
+
+    def get_model_info(self, model_id: str) -> dict[str, Any] | None:
+        return self._state.get("model_info", {}).get(model_id)
+
+    def load_status(self, model_id: str) -> dict[str, Any]:
+        model_config = ModelConfig.get_model_config(model_id)
+        actual_model_id = model_config["id"] if model_config else model_id
+        for status in self.load_queue:
+            if status["model"] == actual_model_id:
+                return status
+        known = self.readiness.get("models", {}).get(actual_model_id)
+        if known is not None:
+            return known
+        state = "ready" if actual_model_id in self.models else "not_loaded"
+        return {"model": actual_model_id, "state": state}
+
+    def list_available_models(self) -> list:
+        loaded = self.models
+        return [{**entry.as_dict(), "loaded": entry.id in loaded} for entry in self.registry.entries()]
+
+    async def refresh_state(self):
+        self._state = await self._call("state")
+
+    # Transport
+
+    async def _poll_state(self):
+        while True:
+            await asyncio.sleep(config.engine_state_interval_seconds)
+            try:
+                await self.refresh_state()
+            except Exception as e:
+                logger.warning(f"Engine state refresh failed: {e}")
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            reader, writer = await asyncio.open_unix_connection(str(self.socket_path))
+            self._writer = writer
+            self._spawn(self._dispatch(reader, writer))
+
+    async def _dispatch(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Route response frames to the calls waiting for them"""
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                queue = self._pending.get(frame["id"])
+                if queue is not None:
+                    queue.put_nowait(frame)
+        finally:
+            if self._writer is writer:
+                self._writer = None
+            writer.close()
+            for queue in self._pending.values():
+                queue.put_nowait({"event": "error", "type": "EngineError", "message": "Engine connection lost"})
+
+    async def _request(self, method: str, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        """Send a call and yield what comes back; abandoning it cancels the work in the engine"""
+        await self._connect()
+        writer = self._writer
+        request_id = next(self._ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        finished = False
+        try:
+            writer.write(encode_frame({"id": request_id, "method": method, "args": args, "kwargs": kwargs}))
+            await writer.drain()
+            while True:
+                frame = await queue.get()
+                event = frame["event"]
+                if event == "error":
+                    finished = True
+                    raise _decode_error(frame)
+                if event == "end":
+                    finished = True
+                    return
+                if event == "ready":
+                    yield _READY
+                    continue
+                if event == "result":
+                    finished = True
+                    yield _decode(frame["item"])
+                    return
+                yield _decode(frame["item"])
+        finally:
+            self._pending.pop(request_id, None)
+            if not finished and not writer.is_closing():
+                writer.write(encode_frame({"id": request_id, "method": "cancel"}))
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        results = [item async for item in self._request(method, *args, **kwargs)]
+        return results[-1] if results else None
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+async def serve(socket_path: Path):
+    """Run the engine until SIGTERM/SIGINT"""
+    from .middleware import start_metrics_server
+    from .model_manager import ModelManager
+
+    manager = ModelManager()
+    server = EngineServer(manager, socket_path)
+    await manager.initialize()
+    await server.start()
+    if config.enable_metrics:
+        # HTTP workers can't share one metrics port; their counts reach this
+        # server through PROMETHEUS_MULTIPROC_DIR
+        start_metrics_server()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Shutting down engine...")
+    await server.close()
+    await manager.shutdown()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(serve(config.engine_socket or default_socket_path()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Single-flight model loading: one load per model, shared by every caller
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+loads_in_progress = Gauge(
+    "llm_model_loads",
+    "Model loads by stage",
+    ["state"]
+)
+
+load_seconds = Histogram(
+    "llm_model_load_seconds",
+    "Time from load start (slot acquired) to ready, including warmup",
+    ["model"],
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+
+# Read size when pulling weight shards into the page cache
+PREFETCH_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+class ModelNotReadyError(RuntimeError):
+    """The requested model is still loading; retry after ``retry_after`` seconds"""
+
+    def __init__(self, model_id: str, retry_after: int):
+        super().__init__(f"Model {model_id} is loading, retry in {retry_after}s")
+        self.model_id = model_id
+        self.retry_after = retry_after
+
+
+class LoadState(Enum):
+    """Where a model is in its load"""
+    QUEUED = "queued"      # Waiting for a free load slot
+    LOADING = "loading"    # Weights being read
+    WARMING = "warming"    # Loaded, running the warmup pass
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass
+class LoadProgress:
+    """Status of one in-flight or finished load"""
+    model_id: str
+    state: LoadState = LoadState.QUEUED
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    finished_at: float | None = None
+    waiters: int = 0
+    error: str | None = None
+
+    def as_dict(self, queue_position: int | None = None) -> dict[str, Any]:
+        now = time.monotonic()
+        end = self.finished_at or now
+        return {
+            "model": self.model_id,
+            "state": self.state.value,
+            "queue_position": queue_position,
+            "waiters": self.waiters,
+            "queued_seconds": round((self.started_at or end) - self.queued_at, 2),
+            "loading_seconds": round(end - self.started_at, 2) if self.started_at else None,
+            "error": self.error,
+        }
+
+
+class SingleFlightLoader:
+    """
+    Runs ``load_fn`` at most once at a time per key.
+
+    Concurrent callers asking for the same key await the same task, so a
+    cold model is loaded once no matter how many requests hit it. At most
+    ``max_concurrent`` loads run at once; the rest wait in FIFO order and
+    report their queue position. A caller giving up (e.g. client
+    disconnect) does not cancel the load for the others.
+    """
+
+    def __init__(self, load_fn: Callable[..., Awaitable[Any]], max_concurrent: int = 1):
+        self._load_fn = load_fn
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._progress: dict[str, LoadProgress] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._tasks
+
+    def set_state(self, key: str, state: LoadState):
+        """Let the load function report a later stage (e.g. warming up)"""
+        progress = self._progress.get(key)
+        if progress is not None:
+            progress.state = state
+            self._update_gauge()
+
+    def start(self, key: str, *args: Any) -> asyncio.Task:
+        """Start loading ``key`` unless a load is already running"""
+        task = self._tasks.get(key)
+        if task is None:
+            self._progress[key] = LoadProgress(model_id=key)
+            task = asyncio.create_task(self._run(key, *args), name=f"load:{key}")
+            task.add_done_callback(self._forget)
+            self._tasks[key] = task
+            self._update_gauge()
+        return task
+
+    async def load(self, key: str, *args: Any) -> Any:
+        """Load ``key`` or join the load already in flight"""
+        task = self.start(key, *args)
+        progress = self._progress[key]
+        progress.waiters += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            progress.waiters -= 1
+
+    def status(self, key: str) -> dict[str, Any] | None:
+        """Progress of the current or last load of ``key``"""
+        progress = self._progress.get(key)
+        if progress is None:
+            return None
+        return progress.as_dict(self._queue_position(key))
+
+    @property
+    def queue(self) -> list[dict[str, Any]]:
+        """All in-flight loads, running ones first"""
+        in_flight = [p for key, p in self._progress.items() if key in self._tasks]
+        in_flight.sort(key=lambda p: (p.state == LoadState.QUEUED, p.queued_at))
+        return [p.as_dict(self._queue_position(p.model_id)) for p in in_flight]
+
+    async def _run(self, key: str, *args: Any) -> Any:
+        progress = self._progress[key]
+        async with self._slots:
+            progress.state = LoadState.LOADING
+            progress.started_at = time.monotonic()
+            self._update_gauge()
+            try:
+                result = await self._load_fn(key, *args)
+            except BaseException as e:
+                progress.state = LoadState.FAILED
+                progress.error = str(e) or type(e).__name__
+                logger.error(f"Failed to load {key}: {progress.error}")
+                raise
+            finally:
+                progress.finished_at = time.monotonic()
+        progress.state = LoadState.READY
+        load_seconds.labels(model=key).observe(progress.finished_at - progress.started_at)
+        logger.info(f"Loaded {key} in {progress.finished_at - progress.started_at:.1f}s")
+        return result
+
+    def _forget(self, task: asyncio.Task):
+        key = next((k for k, t in self._tasks.items() if t is task), None)
+        if key is not None:
+            del self._tasks[key]
+        self._update_gauge()
+        # Nobody may be waiting any more; don't warn about unretrieved errors
+        if not task.cancelled():
+            task.exception()
+
+    def _update_gauge(self):
+        counts = dict.fromkeys((LoadState.QUEUED, LoadState.LOADING, LoadState.WARMING), 0)
+        for key, progress in self._progress.items():
+            if key in self._tasks and progress.state in counts:
+                counts[progress.state] += 1
+        for state, count in counts.items():
+            loads_in_progress.labels(state=state.value).set(count)
+
+    def _queue_position(self, key: str) -> int | None:
+        progress = self._progress.get(key)
+        if progress is None or progress.state != LoadState.QUEUED:
+            return None
+        queued = sorted(
+            (p for k, p in self._progress.items() if k in self._tasks and p.state == LoadState.QUEUED),
+            key=lambda p: p.queued_at,
+        )
+        return next(i for i, p in enumerate(queued) if p.model_id == key)
+
+
+def prefetch_weights(model_path: Path, max_workers: int = 4) -> int:
+    """
+    Read a model's safetensors shards into the OS page cache in parallel.
+
+    The loader then maps already-resident pages instead of reading shards
+    one after another. Returns the number of bytes read.
+    """
+    shards = sorted(Path(model_path).glob("*.safetensors"))
+    if not shards or max_workers <= 0:
+        return 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shards)), thread_name_prefix="prefetch") as pool:
+        total = sum(pool.map(_read_through, shards))
+    elapsed = time.monotonic() - start
+    logger.info(f"Prefetched {len(shards)} shards of {model_path.name} ({total / 1e9:.1f} GB) in {elapsed:.1f}s")
+    return total
+
+
+def _read_through(path: Path) -> int:
+    # readinto releases the GIL, so shards are read concurrently
+    buffer = bytearray(PREFETCH_CHUNK_BYTES)
+    total = 0
+    try:
+        with open(path, "rb", buffering=0) as f:
+            while n := f.readinto(buffer):
+                total += n
+    except OSError as e:
+        # Only a warm-up; the real load will report the error
+        logger.warning(f"Could not prefetch {path}: {e}")
+    return total
@@ -2,16 +2,20 @@
 Main FastAPI application for MLX LLM Server
 """
 import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from contextlib import asynccontextmanager
 
-import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
-from prometheus_client import start_http_server
+from prometheus_client import multiprocess
 
 from .config import config
-from .endpoints import chat, completions, models, sessions
-from .middleware import setup_middleware
+from .endpoints import chat, completions, embeddings, models, rerank, sessions
+from .middleware import setup_middleware, start_metrics_server
 from .model_manager import model_manager
 
 # Configure logging
@@ -28,19 +32,24 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting MLX LLM Server...")
 
-    # Initialize model manager
+    # Start model loads; the server accepts requests while they run
     await model_manager.initialize()
-    logger.info(f"Default model loaded: {config.default_model}")
+    logger.info(f"Loading startup models in the background: {model_manager.startup_models}")
 
-    # Start metrics server
-    if config.enable_metrics:
-        start_http_server(config.metrics_port)
-        logger.info(f"Metrics server started on port {config.metrics_port}")
+    # Start metrics server (the engine process serves it when models run there)
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if config.enable_metrics and config.engine_socket is None:
+        start_metrics_server()
+    elif config.enable_metrics and not multiproc_dir:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is unset; this worker's HTTP metrics are not exported")
 
     yield
 
     # Shutdown
     logger.info("Shutting down MLX LLM Server...")
+    await model_manager.shutdown()
+    if multiproc_dir:
+        multiprocess.mark_process_dead(os.getpid())
 
 
 # Create FastAPI app
@@ -60,6 +69,8 @@ app = setup_middleware(app)
 # Include routers
 app.include_router(chat.router, prefix=f"{config.api_prefix}", tags=["Chat"])
 app.include_router(completions.router, prefix=f"{config.api_prefix}", tags=["Completions"])
+app.include_router(embeddings.router, prefix=f"{config.api_prefix}", tags=["Embeddings"])
+app.include_router(rerank.router, prefix=f"{config.api_prefix}", tags=["Rerank"])
 app.include_router(models.router, prefix=f"{config.api_prefix}", tags=["Models"])
 app.include_router(sessions.router, prefix=f"{config.api_prefix}", tags=["Sessions"])
 
@@ -76,6 +87,7 @@ async def root():
             "completions": f"{config.api_prefix}/completions",
             "models": f"{config.api_prefix}/models",
             "sessions": f"{config.api_prefix}/sessions",
+            "ready": f"{config.api_prefix}/ready",
             "docs": f"{config.api_prefix}/docs"
         }
     }
@@ -95,6 +107,16 @@ async def health():
     }
 
 
+@app.get(f"{config.api_prefix}/ready")
+async def ready():
+    """Readiness probe: 200 once the default model is loaded, per-model load state"""
+    readiness = model_manager.readiness
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content=readiness
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
@@ -113,21 +135,44 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 def run_server():
     """Run the server with SSL"""
+    import uvicorn  # Not needed by the app itself, e.g. under gunicorn or in tests
+
     logger.info(f"Starting server on https://{config.host}:{config.port}")
     logger.info(f"API available at https://{config.primary_domain}{config.api_prefix}")
     logger.info(f"Also available at https://{config.tailscale_domain}{config.api_prefix}")
 
-    uvicorn.run(
-        "src.main:app",
-        host=config.host,
-        port=config.port,
-        ssl_certfile=str(config.ssl_certfile),
-        ssl_keyfile=str(config.ssl_keyfile),
-        workers=config.workers,
-        log_level="info",
-        access_log=True,
-        reload=False  # Set to True for development
-    )
+    engine = None
+    metrics_dir = None
+    if config.workers > 1 and config.engine_socket is None:
+        # Load models once, in an engine process shared by all HTTP workers
+        from .engine_ipc import default_socket_path
+
+        os.environ["ENGINE_SOCKET"] = str(default_socket_path())
+        if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            # Workers and engine write their metrics here; the engine exports the sum
+            metrics_dir = tempfile.mkdtemp(prefix="mlx-server-metrics-")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+        engine = subprocess.Popen([sys.executable, "-m", "src.engine_ipc"])
+        logger.info(f"Started engine process {engine.pid} for {config.workers} HTTP workers")
+
+    try:
+        uvicorn.run(
+            "src.main:app",
+            host=config.host,
+            port=config.port,
+            ssl_certfile=str(config.ssl_certfile),
+            ssl_keyfile=str(config.ssl_keyfile),
+            workers=config.workers,
+            log_level="info",
+            access_log=True,
+            reload=False  # Set to True for development
+        )
+    finally:
+        if engine is not None:
+            engine.terminate()
+            engine.wait(timeout=30)
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -2,13 +2,14 @@
 Middleware for MLX LLM Server
 """
 import logging
+import os
 import time
 from collections.abc import Callable
 
 from fastapi import Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess, start_http_server
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
@@ -33,7 +34,14 @@ request_duration = Histogram(
 
 active_requests = Gauge(
     "llm_active_requests",
-    "Number of active requests"
+    "Number of active requests",
+    multiprocess_mode="livesum"
+)
+
+tokens_total = Counter(
+    "llm_tokens_total",
+    "Exact prompt and completion tokens served, as counted by the engine",
+    ["model", "service", "kind"]
 )
 
 model_memory_usage = Gauge(
@@ -43,6 +51,28 @@ model_memory_usage = Gauge(
 )
 
 
+def record_usage(model: str, service: str | None, prompt_tokens: int, completion_tokens: int):
+    """Count a response's tokens; rate() over these gives tokens/sec per model and service"""
+    service = service or "default"
+    tokens_total.labels(model=model, service=service, kind="prompt").inc(prompt_tokens)
+    tokens_total.labels(model=model, service=service, kind="completion").inc(completion_tokens)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to export; with PROMETHEUS_MULTIPROC_DIR set, the sum over every process writing there"""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server():
+    """Serve /metrics on the metrics port"""
+    start_http_server(config.metrics_port, registry=metrics_registry())
+    logger.info(f"Metrics server started on port {config.metrics_port}")
+
+
 # Rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
@@ -14,6 +14,17 @@ class ModelType(Enum):
     AUDIO = "audio"       # Audio models (future)
 
 
+# config.json architectures of bare encoder checkpoints (sentence embedding models)
+EMBEDDING_ARCHITECTURES = frozenset({
+    "BertModel",
+    "DistilBertModel",
+    "ModernBertModel",
+    "NomicBertModel",
+    "RobertaModel",
+    "XLMRobertaModel",
+})
+
+
 class ModelConfig:
     """Configuration for available models"""
 
@@ -105,24 +116,43 @@ class ModelConfig:
         # },
     }
 
+    # Every key, full ID and alias -> config; built on first lookup
+    _index: dict[str, dict[str, Any]] | None = None
+
     @classmethod
     def get_model_config(cls, model_id: str) -> dict[str, Any] | None:
         """Get configuration for a specific model"""
-        # Check direct match
-        if model_id in cls.MODELS:
-            return cls.MODELS[model_id]
+        if cls._index is None:
+            cls.reindex()
+        return cls._index.get(model_id)
 
-        # Check if it's a full model ID that matches
-        for config in cls.MODELS.values():
-            if config["id"] == model_id:
-                return config
-
-        # Check aliases
-        if model_id in MODEL_ALIASES:
-            alias_target = MODEL_ALIASES[model_id]
-            return cls.get_model_config(alias_target)
+    @classmethod
+    def reindex(cls):
+        """Rebuild the lookup table after editing MODELS or MODEL_ALIASES"""
+        index = {}
+        # Precedence as before: short name, then full ID, then alias
+        for alias, target in MODEL_ALIASES.items():
+            resolved = cls.MODELS.get(target) or next(
+                (c for c in cls.MODELS.values() if c["id"] == target), None
+            )
+            if resolved is not None:
+                index[alias] = resolved
+        for model_config in reversed(list(cls.MODELS.values())):
+            index[model_config["id"]] = model_config
+        index.update(cls.MODELS)
+        cls._index = index
 
-        return None
+    @classmethod
+    def get_model_type(cls, model_id: str, architecture: str | None = None) -> ModelType:
+        """Configured type, else guessed from the checkpoint's architecture"""
+        model_config = cls.get_model_config(model_id)
+        if model_config is not None:
+            return model_config["type"]
+        if architecture in EMBEDDING_ARCHITECTURES:
+            return ModelType.EMBEDDING
+        if architecture and architecture.endswith("ForSequenceClassification"):
+            return ModelType.RERANKER  # Cross-encoders score a (query, document) pair
+        return ModelType.LLM
 
     @classmethod
     def get_auto_load_models(cls) -> list[str]:
@@ -2,77 +2,273 @@
 Model management for MLX LLM Server
 """
 import asyncio
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
-import mlx.core as mx
-from mlx_lm import generate, load
+import numpy as np
 
+from .coalescer import RequestCoalescer
 from .config import config
-from .model_config import ModelConfig
+from .embedding_cache import EmbeddingCache
+from .engine import (
+    Backend,
+    BatchScheduler,
+    DiskKVCache,
+    EncodeBatcher,
+    GenerationResult,
+    MLXBackend,
+    MLXVLMBackend,
+    PrefixCache,
+    SamplingParams,
+    SessionKVCache,
+    StepModel,
+    SyntheticBackend,
+)
+from .engine.streaming import iter_with_queue_position
+from .engine.warmup import synthetic_prompt, warmup
+from .loader import LoadState, ModelNotReadyError, SingleFlightLoader, prefetch_weights
+from .model_config import ModelConfig, ModelType
+from .model_registry import ModelRegistry
+from .model_router import ModelRouter
+from .prompt_cache import PromptTokenCache
+from .residency import ResidencyManager
+from .response_cache import ResponseCache, cache_key, is_deterministic, replay
 
 logger = logging.getLogger(__name__)
 
+# Text repeated to build the synthetic warmup prompts
+WARMUP_TEXT = "The quick brown fox jumps over the lazy dog. "
+
+# Weights on disk -> resident memory, for models without a configured memory_gb
+WEIGHTS_OVERHEAD = 1.2
+UNCONFIGURED_PRIORITY = 100
+
+# Served by an EncodeBatcher instead of a decode loop (and how errors refer to them)
+ENCODER_TYPES = {ModelType.EMBEDDING: "an embedding model", ModelType.RERANKER: "a reranker"}
+
 
 class ModelManager:
     """Manages MLX model loading, caching, and generation"""
 
     def __init__(self):
+        self.backend = self._create_backend(config.inference_backend)
         self.models: dict[str, tuple[Any, Any]] = {}  # model_id -> (model, tokenizer)
         self.model_info: dict[str, dict[str, Any]] = {}
         self.current_model: str | None = None
         self._lock = asyncio.Lock()
         self.vlm_models: dict[str, Any] = {}  # For VLM models
+        self.schedulers: dict[str, BatchScheduler] = {}  # model_id -> shared decode loop
+        # Replaced, never mutated, so decode threads can sum it while models load and unload
+        self._prefix_caches: tuple[PrefixCache, ...] = ()
+        self.encoders: dict[str, EncodeBatcher] = {}  # model_id -> batched forward passes (embedding models)
+        self.prompt_caches: dict[str, PromptTokenCache] = {}
+        self.residency = ResidencyManager(
+            budget_gb=config.max_model_memory_gb,
+            idle_ttl_seconds=config.model_idle_ttl_minutes * 60 or None,
+            in_use=self._model_in_use,
+        )
+        self._idle_task: asyncio.Task | None = None
+        self.registry = ModelRegistry(config.models_dir)
+        self._registry_task: asyncio.Task | None = None
+        self.startup_models: list[str] = []
+        self._prefetches: dict[Path, asyncio.Future] = {}
+        # Loads get their own threads so they never compete with request work
+        self._load_pool = ThreadPoolExecutor(
+            max_workers=max(1, config.max_concurrent_loads), thread_name_prefix="model-load"
+        )
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weights-prefetch")
+        self._loader = SingleFlightLoader(self._load_and_register, max_concurrent=config.max_concurrent_loads)
+        self.disk_cache: DiskKVCache | None = None
+        if config.kv_disk_cache_dir is not None:
+            self.disk_cache = DiskKVCache(
+                config.kv_disk_cache_dir,
+                max_bytes=int(config.kv_disk_cache_gb * 1024**3),
+                min_tokens=config.prefix_cache_min_tokens,
+            )
+        self.session_cache: SessionKVCache | None = None
+        if config.enable_session_cache:
+            disk = self.disk_cache
+            self.session_cache = SessionKVCache(
+                max_total_bytes=self._session_cache_budget_bytes,
+                max_session_bytes=int(config.session_cache_max_session_gb * 1024**3),
+                min_tokens=config.prefix_cache_min_tokens,
+                ttl_seconds=config.session_ttl_hours * 3600,
+                on_evict=(lambda sid, mid, tokens, handle, nbytes: disk.spill_session(sid, mid, tokens, handle))
+                if disk else None,
+                fallback=disk.take_session if disk else None,
+            )
+        self.embedding_cache: EmbeddingCache | None = None
+        if config.embedding_cache_mb > 0:
+            self.embedding_cache = EmbeddingCache(int(config.embedding_cache_mb * 1024**2))
+        self.coalescer = RequestCoalescer() if config.enable_request_coalescing else None
+        self.response_cache: ResponseCache | None = None
+        if config.enable_response_cache:
+            self.response_cache = ResponseCache(
+                max_entries=config.response_cache_entries,
+                ttl_seconds=config.response_cache_ttl_seconds,
+                redis_url=config.redis_url if config.response_cache_redis else None,
+            )
+
+    @staticmethod
+    def _create_backend(name: str) -> Backend:
+        """Backend selected by ``inference_backend``"""
+        if name == "mlx":
+            return MLXBackend(memory_budget_gb=config.max_model_memory_gb)
+        if name == "synthetic":
+            return SyntheticBackend(
+                prefill_ms_per_token=config.synthetic_prefill_ms_per_token,
+                decode_ms_per_step=config.synthetic_decode_ms_per_step,
+                kv_bytes_per_token=config.synthetic_kv_bytes_per_token,
+                model_gb=config.synthetic_model_gb,
+            )
+        raise ValueError(f"Unknown inference backend: {name}")
 
-        # Set MLX memory limits
-        if config.max_model_memory_gb > 0:
-            mx.metal.set_memory_limit(config.max_model_memory_gb * 1024**3)
-            mx.metal.set_cache_limit(min(100, config.max_model_memory_gb // 4) * 1024**3)
+    def _backend_for(self, model_config: dict[str, Any] | None) -> Backend:
+        """VLM checkpoints go through mlx_vlm when serving with MLX"""
+        if self.backend.name == "mlx" and model_config and model_config.get("server") == "mlx_vlm":
+            return MLXVLMBackend(memory_budget_gb=config.max_model_memory_gb)
+        return self.backend
 
     async def initialize(self):
-        """Initialize with auto-load models"""
-        # Load default model first
-        if config.default_model:
-            await self.load_model(config.default_model)
-
-        # Load other auto-load models
-        auto_load_models = ModelConfig.get_auto_load_models()
-        for model_config in auto_load_models:
-            if model_config["id"] != config.default_model:
-                try:
-                    await self.load_model(model_config["id"])
-                except Exception as e:
-                    logger.error(f"Failed to auto-load {model_config['id']}: {e}")
+        """Start loading auto-load models in the background; returns immediately"""
+        # One scan of models_dir; requests then resolve models from memory
+        await asyncio.get_running_loop().run_in_executor(None, self.registry.refresh)
+        if config.model_registry_refresh_seconds > 0:
+            self._registry_task = asyncio.create_task(self._refresh_registry())
+
+        # Default model first, then the others by priority
+        startup = [config.default_model] if config.default_model else []
+        for model_id in ModelConfig.get_auto_load_models():
+            if self._resolve_model_id(model_id) not in {self._resolve_model_id(m) for m in startup}:
+                startup.append(model_id)
+        self.startup_models = startup
+
+        # Warm every shard in parallel now, even for loads still queued
+        for model_id in startup:
+            model_path = await self._resolve_model_path(self._resolve_model_id(model_id))
+            if model_path.exists():
+                self._prefetch(model_path)
+        for model_id in startup:
+            self.start_loading(model_id)
+
+        if self.residency.idle_ttl_seconds:
+            self._idle_task = asyncio.create_task(self._unload_idle_models())
 
-    async def load_model(self, model_id: str) -> tuple[Any, Any]:
-        """Load a model if not already loaded"""
-        async with self._lock:
-            # Check if it's an alias
-            model_config = ModelConfig.get_model_config(model_id)
-            if model_config:
-                actual_model_id = model_config["id"]
-            else:
-                actual_model_id = model_id
+    @property
+    def worker_stats(self) -> dict[str, dict[str, int]]:
+        """Queue depth and batch size of each model's decode worker"""
+        return {
+            model_id: {"queued": scheduler.pending_count, "running": scheduler.active_count}
+            for model_id, scheduler in self.schedulers.items()
+        }
+
+    @property
+    def readiness(self) -> dict[str, Any]:
+        """Load state of startup models and anything loaded or loading since"""
+        model_ids = dict.fromkeys(self._resolve_model_id(m) for m in self.startup_models)
+        model_ids.update(dict.fromkeys(self.models))
+        model_ids.update(dict.fromkeys(s["model"] for s in self._loader.queue))
+        models = {model_id: self.load_status(model_id) for model_id in model_ids}
+        default = self._resolve_model_id(config.default_model) if config.default_model else None
+        return {
+            "ready": default is None or default in self.models,
+            "models": models,
+        }
 
-            if actual_model_id in self.models:
-                logger.info(f"Model {actual_model_id} already loaded")
-                self.current_model = actual_model_id
-                return self.models[actual_model_id]
+    async def shutdown(self):
+        """Stop background tasks and decode loops"""
+        if self._idle_task:
+            self._idle_task.cancel()
+        if self._registry_task:
+            self._registry_task.cancel()
+        for scheduler in self.schedulers.values():
+            scheduler.stop()
+        for encoder in self.encoders.values():
+            encoder.stop()
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        if self.response_cache is not None:
+            await self.response_cache.close()
+        self._load_pool.shutdown(wait=False, cancel_futures=True)
+        self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
 
-            logger.info(f"Loading model {actual_model_id}...")
+    async def load_model(self, model_id: str) -> tuple[Any, Any]:
+        """Load a model if not already loaded"""
+        actual_model_id = self._resolve_model_id(model_id)
+        if actual_model_id in self.models:
+            # Resident: no lock, no waiting on other models' loads
+            self.current_model = actual_model_id
+            self.residency.touch(actual_model_id)
+            return self.models[actual_model_id]
+
+        # Concurrent requests for the same cold model share one load
+        return await self._loader.load(actual_model_id, model_id)
+
+    def start_loading(self, model_id: str) -> dict[str, Any]:
+        """Begin loading in the background and return its status"""
+        actual_model_id = self._resolve_model_id(model_id)
+        if actual_model_id not in self.models:
+            self._loader.start(actual_model_id, model_id)
+        return self.load_status(model_id)
+
+    def load_status(self, model_id: str) -> dict[str, Any]:
+        """Load progress for a model, or its resident state"""
+        actual_model_id = self._resolve_model_id(model_id)
+        if actual_model_id in self.models and not self._loader.in_flight(actual_model_id):
+            return {"model": actual_model_id, "state": "ready"}
+        return self._loader.status(actual_model_id) or {"model": actual_model_id, "state": "not_loaded"}
 
-            # Determine model path
-            model_path = self._resolve_model_path(actual_model_id)
+    @property
+    def load_queue(self) -> list[dict[str, Any]]:
+        """Loads running or waiting for a load slot"""
+        return self._loader.queue
+
+    async def _load_and_register(self, actual_model_id: str, model_id: str) -> tuple[Any, Any]:
+        """Load weights and build the model's engine (run once per cold model)"""
+        model_config = ModelConfig.get_model_config(model_id)
+        model_type = self._model_type(model_id, actual_model_id)
+        logger.info(f"Loading model {actual_model_id}...")
+
+        # Determine model path
+        backend = self._backend_for(model_config)
+        model_path = await self._resolve_model_path(actual_model_id)
+        if backend.needs_weights:
             if not model_path.exists():
                 raise ValueError(f"Model not found: {model_path}")
+            await self._prefetch(model_path)
 
-            # Load model and tokenizer in thread pool
-            loop = asyncio.get_event_loop()
-            model, tokenizer = await loop.run_in_executor(
-                None, self._load_model_sync, str(model_path)
-            )
+        # Make room and reserve the footprint; only this bookkeeping is locked
+        memory_gb = self._estimate_model_gb(actual_model_id, model_path, backend)
+        priority = model_config.get("priority", UNCONFIGURED_PRIORITY) if model_config else UNCONFIGURED_PRIORITY
+        pinned = actual_model_id in config.pinned_models or model_id in config.pinned_models
+        async with self._lock:
+            for victim in self.residency.plan(actual_model_id, memory_gb):
+                logger.info(f"Evicting {victim} to make room for {actual_model_id}")
+                self._unload_locked(victim, reason="memory_pressure")
+            self.residency.reserve(actual_model_id, memory_gb, priority, pinned)
+
+        # Load model and tokenizer in thread pool
+        loop = asyncio.get_running_loop()
+        load = backend.load
+        if model_type in ENCODER_TYPES:
+            load = functools.partial(backend.load_encoder, task=model_type.value)
+        try:
+            loaded = await loop.run_in_executor(self._load_pool, load, str(model_path), model_config)
+
+            model, tokenizer = loaded.model, loaded.tokenizer
+            if loaded.encoder is not None:
+                self.encoders[actual_model_id] = EncodeBatcher(
+                    actual_model_id,
+                    loaded.encoder,
+                    max_batch_size=config.encode_max_batch_size,
+                    max_batch_tokens=config.encode_max_batch_tokens,
+                )
+            else:
+                await self._start_generation(actual_model_id, tokenizer, loaded.step_model)
 
             # Cache model with actual ID
             self.models[actual_model_id] = (model, tokenizer)
@@ -81,54 +277,158 @@ class ModelManager:
                 "alias": model_id if model_config else None,
                 "path": str(model_path),
                 "loaded_at": datetime.utcnow().isoformat(),
-                "memory_usage": mx.metal.get_active_memory() / 1e9,  # GB
-                "type": model_config["type"].value if model_config else "llm",
+                "memory_usage": self.memory_usage["active_gb"],  # GB
+                "type": model_type.value,
                 "context_length": model_config.get("context_length", 4096) if model_config else 4096,
             }
             self.current_model = actual_model_id
-
-            logger.info(f"Model {model_id} loaded successfully")
-            logger.info(f"Active memory: {mx.metal.get_active_memory() / 1e9:.2f} GB")
-
-            return model, tokenizer
-
-    def _load_model_sync(self, model_path: str) -> tuple[Any, Any]:
-        """Synchronous model loading"""
-        # Check if it's a VLM model
-        model_config = None
-        for model_cfg in ModelConfig.MODELS.values():
-            if model_path.endswith(model_cfg["id"]) or model_cfg["id"] in model_path:
-                model_config = model_cfg
-                break
-
-        if model_config and model_config.get("server") == "mlx_vlm":
-            # VLM models need special handling
+            self.residency.admit(actual_model_id, memory_gb, priority, pinned)
+        except BaseException:
+            # Failed or cancelled part-way: release the reservation and
+            # anything already started for the model
+            self._discard_partial_load(actual_model_id)
+            raise
+
+        logger.info(f"Model {model_id} loaded successfully")
+        logger.info(f"Active memory: {self.memory_usage['active_gb']:.2f} GB")
+
+        return model, tokenizer
+
+    def _discard_partial_load(self, actual_model_id: str):
+        """Undo whatever a failed load registered for ``actual_model_id``"""
+        self._stop_scheduler(actual_model_id)
+        encoder = self.encoders.pop(actual_model_id, None)
+        if encoder:
+            encoder.stop()
+        self.prompt_caches.pop(actual_model_id, None)
+        if self.disk_cache is not None:
+            self.disk_cache.unregister_codec(actual_model_id)
+        self.models.pop(actual_model_id, None)
+        self.model_info.pop(actual_model_id, None)
+        if self.current_model == actual_model_id:
+            self.current_model = None
+        self.residency.remove(actual_model_id, reason="load_failed")
+
+    async def _start_generation(self, actual_model_id: str, tokenizer, step_model: StepModel):
+        """Prefix cache, warmup, decode loop and prompt cache of a freshly loaded generative model"""
+        loop = asyncio.get_running_loop()
+        disk = self.disk_cache
+        if disk is not None:
+            disk.register_codec(actual_model_id, step_model)
+        prefix_cache = None
+        if config.enable_prefix_cache:
+            prefix_cache = PrefixCache(
+                actual_model_id,
+                step_model,
+                budget_bytes=self._prefix_cache_budget_bytes,
+                min_tokens=config.prefix_cache_min_tokens,
+                on_evict=(lambda tokens, handle, nbytes, mid=actual_model_id: disk.spill_prefix(mid, tokens, handle))
+                if disk else None,
+                fallback=(lambda tokens, mid=actual_model_id: disk.lookup_prefix(mid, tokens))
+                if disk else None,
+            )
+        if config.enable_warmup:
+            # Still invisible to requests; compile kernels and seed the prefix cache first
+            self._loader.set_state(actual_model_id, LoadState.WARMING)
             try:
-                import mlx_vlm
-                return mlx_vlm.load(model_path)
-            except ImportError:
-                logger.warning("mlx_vlm not installed, falling back to standard loading")
-
-        return load(model_path)
+                synthetic, system = self._warmup_prompts(actual_model_id, tokenizer)
+                await loop.run_in_executor(
+                    self._load_pool,
+                    lambda: warmup(
+                        actual_model_id,
+                        step_model,
+                        synthetic,
+                        decode_steps=config.warmup_decode_steps,
+                        cache_prompts=system,
+                        prefix_cache=prefix_cache,
+                    ),
+                )
+            except Exception as e:
+                logger.warning(f"Warmup failed for {actual_model_id}, serving cold: {e}")
+
+        self.schedulers[actual_model_id] = BatchScheduler(
+            actual_model_id,
+            step_model,
+            max_batch_size=config.max_batch_size,
+            kv_budget_bytes=self._kv_budget_bytes,
+            prefix_cache=prefix_cache,
+            session_cache=self.session_cache,
+            aging_seconds=config.queue_aging_seconds,
+            tenant_weight=ModelRouter.get_tenant_weight,
+        )
+        if prefix_cache is not None:
+            self._prefix_caches = (*self._prefix_caches, prefix_cache)
+        self.prompt_caches[actual_model_id] = PromptTokenCache(
+            actual_model_id,
+            render=lambda messages, add_generation_prompt: self._render_prompt(
+                tokenizer, messages, add_generation_prompt
+            ),
+            encode_prompt=lambda text: self._encode_prompt(tokenizer, text),
+            encode_fragment=lambda text: tokenizer.encode(text, add_special_tokens=False),
+            special_ids=set(getattr(tokenizer, "all_special_ids", None) or ()),
+            budget_bytes=int(config.prompt_cache_mb * 1024**2),
+        )
+
+    def _stop_scheduler(self, model_id: str):
+        """Stop a model's decode loop and stop counting its prefix cache"""
+        scheduler = self.schedulers.pop(model_id, None)
+        if scheduler is None:
+            return
+        if scheduler.prefix_cache is not None:
+            self._prefix_caches = tuple(c for c in self._prefix_caches if c is not scheduler.prefix_cache)
+        scheduler.stop()
 
     async def unload_model(self, model_id: str):
         """Unload a model to free memory"""
         async with self._lock:
-            if model_id in self.models:
-                del self.models[model_id]
-                del self.model_info[model_id]
-
-                # Force garbage collection
-                import gc
-                gc.collect()
-
-                # Clear MLX cache
-                mx.metal.clear_cache()
+            self._unload_locked(model_id)
 
-                if self.current_model == model_id:
-                    self.current_model = None
-
-                logger.info(f"Model {model_id} unloaded")
+    def _unload_locked(self, model_id: str, reason: str = "requested"):
+        """Unload a model; caller holds ``self._lock``"""
+        if model_id not in self.models:
+            return
+        self._stop_scheduler(model_id)
+        encoder = self.encoders.pop(model_id, None)
+        if encoder:
+            encoder.stop()
+        self.prompt_caches.pop(model_id, None)
+        if self.disk_cache is not None:
+            self.disk_cache.unregister_codec(model_id)
+        del self.models[model_id]
+        del self.model_info[model_id]
+        self.residency.remove(model_id, reason=reason)
+
+        # Force garbage collection
+        import gc
+        gc.collect()
+
+        # Clear MLX cache
+        self.backend.clear_cache()
+
+        if self.current_model == model_id:
+            self.current_model = None
+
+        logger.info(f"Model {model_id} unloaded")
+
+    async def _unload_idle_models(self):
+        """Background task: unload models idle past the TTL"""
+        interval = min(60.0, self.residency.idle_ttl_seconds / 2)
+        while True:
+            await asyncio.sleep(interval)
+            async with self._lock:
+                for model_id in self.residency.idle_models():
+                    logger.info(f"Unloading idle model {model_id}")
+                    self._unload_locked(model_id, reason="idle")
+
+    async def _refresh_registry(self):
+        """Background task: pick up models added to or removed from models_dir"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(config.model_registry_refresh_seconds)
+            try:
+                await loop.run_in_executor(None, self.registry.refresh)
+            except Exception as e:
+                logger.warning(f"Model registry refresh failed: {e}")
 
     async def generate_completion(
         self,
@@ -141,78 +441,384 @@ class ModelManager:
         stream: bool = False,
         **kwargs
     ):
-        """Generate completion for messages"""
-        model, tokenizer = await self.get_or_load_model(model_id)
+        """
+        Generate completion for messages.
+
+        Returns the GenerationResult, or with ``stream`` an async iterator of
+        QueuePosition events and text deltas ending with the GenerationResult.
+        Deterministic requests are answered from the response cache unless
+        ``cache=False`` is passed.
+        """
+        _, tokenizer = await self.get_or_load_model(model_id)
+        actual_model_id = self._resolve_model_id(model_id)
+        self.residency.touch(actual_model_id)
+
+        params = self._sampling_params(temperature, top_p, max_tokens, stop, kwargs.get("seed"))
+        prompt_tokens = self._prompt_tokens(actual_model_id, tokenizer, messages)
+        key = self._request_key(actual_model_id, prompt_tokens, params)
+        cache = self.response_cache if key is not None and kwargs.get("cache", True) else None
+        if cache is not None:
+            cached = await cache.get(actual_model_id, key)
+            if cached is not None:
+                return replay(cached) if stream else cached
+
+        scheduler = await self._scheduler(model_id, actual_model_id)
+        session_id = kwargs.get("session_id")
+        priority = kwargs.get("priority", 0)
+        tenant = kwargs.get("tenant")
+
+        # Identical greedy requests share one running generation; sampled
+        # ones (seeded or not) each get their own
+        if key is not None and self.coalescer is not None and session_id is None:
+            def start():
+                if stream:
+                    source = self._stream_generate(scheduler, prompt_tokens, params, None, priority, tenant)
+                else:
+                    source = self._submit_generate(scheduler, prompt_tokens, params, priority, tenant)
+                return source if cache is None else self._cache_stream(source, cache, key)
+
+            flight = self.coalescer.join(actual_model_id, key, start, streaming=stream)
+            return self.coalescer.follow(flight) if stream else await self.coalescer.wait(flight)
 
-        # Apply chat template
+        # Generate
+        if stream:
+            token_stream = self._stream_generate(scheduler, prompt_tokens, params, session_id, priority, tenant)
+            return token_stream if cache is None else self._cache_stream(token_stream, cache, key)
+        result = await scheduler.submit(
+            prompt_tokens, params, session_id=session_id, priority=priority, tenant=tenant
+        )
+        if cache is not None:
+            await cache.put(key, result)
+        return result
+
+    async def generate_batch(
+        self,
+        model_id: str,
+        prompts: list[list],
+        n: int = 1,
+        temperature: float = 0.7,
+        top_p: float = 1.0,
+        max_tokens: int | None = None,
+        stop: list | None = None,
+        **kwargs
+    ) -> list[list[GenerationResult]]:
+        """
+        Generate ``n`` completions for each message list, batched together.
+
+        Returns one list of ``n`` GenerationResults per prompt, in order.
+        """
+        _, tokenizer = await self.get_or_load_model(model_id)
+        actual_model_id = self._resolve_model_id(model_id)
+        self.residency.touch(actual_model_id)
+
+        params = self._sampling_params(temperature, top_p, max_tokens, stop, kwargs.get("seed"))
+        prompt_tokens = [self._prompt_tokens(actual_model_id, tokenizer, messages) for messages in prompts]
+        scheduler = await self._scheduler(model_id, actual_model_id)
+        return await scheduler.submit_batch(
+            prompt_tokens, params, n=n, priority=kwargs.get("priority", 0), tenant=kwargs.get("tenant")
+        )
+
+    async def embed(self, model_id: str, texts: list[str]) -> tuple[np.ndarray, int]:
+        """
+        Embed ``texts`` with an embedding model.
+
+        Returns a float32 array with one row per text, in order, and the
+        number of input tokens. Texts seen before come from the embedding
+        cache; the rest are truncated to the model's context length and
+        batched with other requests' inputs.
+        """
+        await self.get_or_load_model(model_id)
+        actual_model_id = self._resolve_model_id(model_id)
+        self.residency.touch(actual_model_id)
+        batcher = await self._encoder(model_id, actual_model_id, ModelType.EMBEDDING)
+
+        revision = self._model_revision(actual_model_id)
+        rows: list[tuple[np.ndarray, int] | None] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}  # Text -> positions; duplicates are encoded once
+        for i, text in enumerate(texts):
+            cached = None
+            if self.embedding_cache is not None:
+                cached = self.embedding_cache.get(actual_model_id, EmbeddingCache.key(revision, text))
+            if cached is None:
+                missing.setdefault(text, []).append(i)
+            rows[i] = cached
+
+        if missing:
+            token_lists = await batcher.tokenize(list(missing))
+            vectors = await batcher.encode(token_lists)
+            for (text, positions), tokens, vector in zip(missing.items(), token_lists, vectors, strict=True):
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put(EmbeddingCache.key(revision, text), vector, len(tokens))
+                for i in positions:
+                    rows[i] = (vector, len(tokens))
+
+        return np.stack([vector for vector, _ in rows]), sum(tokens for _, tokens in rows)
+
+    async def rerank(self, model_id: str, query: str, documents: list[str]) -> tuple[np.ndarray, int]:
+        """
+        Score ``documents`` against ``query`` with a cross-encoder.
+
+        Returns float32 relevance scores (0..1) in document order and the
+        number of input tokens. Each pair is truncated to the model's
+        context length by cutting the document, and pairs are batched with
+        other requests' inputs.
+        """
+        await self.get_or_load_model(model_id)
+        actual_model_id = self._resolve_model_id(model_id)
+        self.residency.touch(actual_model_id)
+        batcher = await self._encoder(model_id, actual_model_id, ModelType.RERANKER)
+
+        token_lists = await batcher.tokenize([query] * len(documents), documents)
+        scores = await batcher.encode(token_lists)
+        return scores.reshape(len(documents)), sum(len(tokens) for tokens in token_lists)
+
+    async def _encoder(self, model_id: str, actual_model_id: str, model_type: ModelType) -> EncodeBatcher:
+        encoder = self.encoders.get(actual_model_id)
+        if encoder is None and actual_model_id not in self.models:
+            # Evicted to make room for another model in the meantime
+            await self.load_model(model_id)
+            encoder = self.encoders.get(actual_model_id)
+        if encoder is None or self.model_info[actual_model_id]["type"] != model_type.value:
+            raise ValueError(f"{model_id} is not {ENCODER_TYPES[model_type]}")
+        return encoder
+
+    def _model_type(self, model_id: str, actual_model_id: str) -> ModelType:
+        entry = self.registry.get(actual_model_id)
+        return ModelConfig.get_model_type(model_id, entry.architecture if entry else None)
+
+    @staticmethod
+    def _sampling_params(
+        temperature: float,
+        top_p: float,
+        max_tokens: int | None,
+        stop: str | list | None,
+        seed: int | None,
+    ) -> SamplingParams:
+        if isinstance(stop, str):
+            stop = [stop]
+        return SamplingParams(
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens or config.max_tokens_default,
+            stop_strings=tuple(s for s in stop or () if s),
+            seed=seed,
+        )
+
+    def _request_key(self, actual_model_id: str, prompt_tokens: list[int], params: SamplingParams) -> str | None:
+        """Key shared by requests with the same output, or None when the output is sampled"""
+        if not is_deterministic(params):
+            return None
+        return cache_key(self._model_revision(actual_model_id), prompt_tokens, params)
+
+    def _model_revision(self, actual_model_id: str) -> str:
+        """Model ID plus weights mtime, so cached outputs of replaced weights are never served"""
+        entry = self.registry.get(actual_model_id)
+        return f"{actual_model_id}@{entry.mtime_ns if entry else 0}"
+
+    @staticmethod
+    async def _cache_stream(token_stream, cache: ResponseCache, key: str):
+        """Pass a stream through and cache its result once it completes"""
+        try:
+            async for item in token_stream:
+                if isinstance(item, GenerationResult):
+                    await cache.put(key, item)
+                yield item
+        finally:
+            await token_stream.aclose()
+
+    @staticmethod
+    async def _submit_generate(
+        scheduler: BatchScheduler, prompt_tokens: list[int], params: SamplingParams, priority: int, tenant: str | None
+    ):
+        """Non-streamed generation in the shape of a stream that yields only the result"""
+        yield await scheduler.submit(prompt_tokens, params, priority=priority, tenant=tenant)
+
+    async def _scheduler(self, model_id: str, actual_model_id: str) -> BatchScheduler:
+        if actual_model_id in self.encoders:
+            raise ValueError(f"{model_id} is an encoder model and can't generate text")
+        scheduler = self.schedulers.get(actual_model_id)
+        if scheduler is None:
+            # Evicted to make room for another model while the prompt was prepared
+            await self.load_model(model_id)
+            scheduler = self.schedulers[actual_model_id]
+        return scheduler
+
+    async def _stream_generate(
+        self,
+        scheduler: BatchScheduler,
+        prompt_tokens: list[int],
+        params: SamplingParams,
+        session_id: str | None = None,
+        priority: int = 0,
+        tenant: str | None = None,
+    ):
+        """Stream generation (QueuePosition events while queued, text deltas, then the result)"""
+        token_stream = scheduler.stream(
+            prompt_tokens,
+            params,
+            buffer_size=config.stream_buffer_tokens,
+            session_id=session_id,
+            priority=priority,
+            tenant=tenant,
+        )
+        try:
+            async for delta in iter_with_queue_position(token_stream, config.queue_position_interval_seconds):
+                yield delta
+            yield token_stream.result
+        finally:
+            # Reader went away early (client disconnect, error): free the slot
+            token_stream.close()
+
+    async def get_or_load_model(self, model_id: str) -> tuple[Any, Any]:
+        """
+        Get model, loading if necessary.
+
+        For a model that isn't resident yet, the ``model_not_ready_policy``
+        decides: "queue" waits for the load up to the queue timeout,
+        "reject" starts the load and raises ModelNotReadyError right away.
+        """
+        actual_model_id = self._resolve_model_id(model_id)
+        if actual_model_id in self.models:
+            return self.models[actual_model_id]
+
+        retry_after = config.model_retry_after_seconds
+        if config.model_not_ready_policy == "reject":
+            self.start_loading(model_id)
+            raise ModelNotReadyError(actual_model_id, retry_after)
+        try:
+            return await asyncio.wait_for(
+                self.load_model(model_id), timeout=config.model_queue_timeout_seconds or None
+            )
+        except TimeoutError:
+            raise ModelNotReadyError(actual_model_id, retry_after) from None
+
+    def drop_session_cache(self, session_id: str):
+        """Forget a session's KV cache in memory and on disk"""
+        if self.session_cache is not None:
+            self.session_cache.drop(session_id)
+        if self.disk_cache is not None:
+            self.disk_cache.drop_session(session_id)
+
+    def _resolve_model_id(self, model_id: str) -> str:
+        """Map an alias or short name to the ID models are cached under"""
+        model_config = ModelConfig.get_model_config(model_id)
+        return model_config["id"] if model_config else model_id
+
+    def _warmup_prompts(self, actual_model_id: str, tokenizer) -> tuple[list[list[int]], list[list[int]]]:
+        """Synthetic prompts of each configured length, plus routed services' system prompts"""
+        base = tokenizer.encode(WARMUP_TEXT, add_special_tokens=False)
+        synthetic = [synthetic_prompt(base, n) for n in config.warmup_prompt_lengths if n > 0]
+        system = []
+        for service, text in ModelRouter.SERVICE_SYSTEM_PROMPTS.items():
+            routed = ModelRouter.SERVICE_MODELS.get(service)
+            if routed and self._resolve_model_id(routed) == actual_model_id:
+                rendered = self._render_prompt(
+                    tokenizer, [{"role": "system", "content": text}], add_generation_prompt=False
+                )
+                system.append(self._encode_prompt(tokenizer, rendered))
+        return synthetic, system
+
+    def _render_prompt(self, tokenizer, messages: list, add_generation_prompt: bool = True) -> str:
+        """Apply the chat template, or a plain-text fallback"""
         if hasattr(tokenizer, 'chat_template') and tokenizer.chat_template:
-            prompt = tokenizer.apply_chat_template(
+            return tokenizer.apply_chat_template(
                 messages,
-                add_generation_prompt=True,
+                add_generation_prompt=add_generation_prompt,
                 tokenize=False
             )
+        # Fallback to simple concatenation
+        return self._format_messages(messages, add_generation_prompt)
+
+    def _prompt_tokens(self, model_id: str, tokenizer, messages: list) -> list[int]:
+        """Token ids of the rendered chat, reusing the model's tokenized history"""
+        cache = self.prompt_caches.get(model_id)
+        if cache is not None:
+            return cache.encode(messages)
+        return self._encode_prompt(tokenizer, self._render_prompt(tokenizer, messages))
+
+    def _encode_prompt(self, tokenizer, prompt: str) -> list[int]:
+        """Tokenize a rendered prompt the same way mlx_lm.generate does"""
+        bos_token = getattr(tokenizer, "bos_token", None)
+        add_special_tokens = bos_token is None or not prompt.startswith(bos_token)
+        return tokenizer.encode(prompt, add_special_tokens=add_special_tokens)
+
+    def _prefetch(self, model_path: Path) -> asyncio.Future:
+        """Read a model's shards into the page cache once, in the background"""
+        future = self._prefetches.get(model_path)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._prefetch_pool, prefetch_weights, model_path, config.weights_prefetch_workers)
+            future.add_done_callback(lambda f, p=model_path: self._prefetches.pop(p, None))
+            self._prefetches[model_path] = future
+        return future
+
+    def _model_in_use(self, model_id: str) -> bool:
+        """Whether a model has requests decoding or waiting"""
+        scheduler = self.schedulers.get(model_id)
+        if scheduler is not None and scheduler.active_count + scheduler.pending_count > 0:
+            return True
+        encoder = self.encoders.get(model_id)
+        return encoder is not None and encoder.busy
+
+    def _estimate_model_gb(self, model_id: str, model_path: Path, backend: Backend) -> float:
+        """Projected resident size: the backend's own figure, configured memory_gb, else weights on disk"""
+        footprint = backend.footprint_gb(model_path)
+        if footprint is not None:
+            return footprint
+        configured = ModelConfig.estimate_memory_usage([model_id])
+        if configured:
+            return configured
+        entry = self.registry.get(model_id)
+        if entry is not None and entry.shard_bytes:
+            weights = entry.total_bytes
         else:
-            # Fallback to simple concatenation
-            prompt = self._format_messages(messages)
-
-        # Generation parameters
-        gen_kwargs = {
-            "temp": temperature,
-            "top_p": top_p,
-            "max_tokens": max_tokens or config.max_tokens_default,
-        }
-
-        if stop:
-            # Convert stop strings to token IDs
-            stop_ids = []
-            for stop_str in stop:
-                if stop_str:
-                    tokens = tokenizer.encode(stop_str, add_special_tokens=False)
-                    if tokens:
-                        stop_ids.extend(tokens)
-            if stop_ids:
-                gen_kwargs["stop_tokens"] = stop_ids
-
-        # Generate
-        if stream:
-            return self._stream_generate(model, tokenizer, prompt, **gen_kwargs)
-        else:
-            loop = asyncio.get_event_loop()
-            output = await loop.run_in_executor(
-                None, generate, model, tokenizer, prompt, **gen_kwargs
-            )
-            return output
-
-    async def _stream_generate(self, model, tokenizer, prompt, **kwargs):
-        """Stream generation (yields tokens)"""
-        # This would use mlx_lm's streaming capabilities
-        # For now, return a simple implementation
-        output = generate(model, tokenizer, prompt, **kwargs)
-        yield output
-
-    async def get_or_load_model(self, model_id: str) -> tuple[Any, Any]:
-        """Get model, loading if necessary"""
-        if model_id not in self.models:
-            return await self.load_model(model_id)
-        return self.models[model_id]
-
-    def _resolve_model_path(self, model_id: str) -> Path:
+            weights = sum(p.stat().st_size for p in model_path.glob("*.safetensors"))
+        return weights * WEIGHTS_OVERHEAD / 1024**3
+
+    def _headroom_bytes(self) -> int | None:
+        """Memory left under max_model_memory_gb after resident and reserved model weights"""
+        if config.max_model_memory_gb <= 0:
+            return None
+        # The footprints residency tracks, so unconfigured and synthetic models count too
+        return int(max(0, config.max_model_memory_gb - self.residency.used_gb) * 1024**3)
+
+    def _prefix_cache_budget_bytes(self) -> int:
+        """Per-model prefix cache budget, capped at a share of half the headroom"""
+        budget = int(config.prefix_cache_gb * 1024**3)
+        headroom = self._headroom_bytes()
+        if headroom is not None:
+            budget = min(budget, headroom // (2 * max(1, len(self.models))))
+        return budget
+
+    def _session_cache_budget_bytes(self) -> int:
+        """Global pinned-session budget, capped at a quarter of the headroom"""
+        budget = int(config.session_cache_gb * 1024**3)
+        headroom = self._headroom_bytes()
+        if headroom is not None:
+            budget = min(budget, headroom // 4)
+        return budget
+
+    def _kv_budget_bytes(self) -> int | None:
+        """Memory left for live KV caches after weights and cached prefixes"""
+        headroom = self._headroom_bytes()
+        if headroom is None:
+            return None
+        cached = sum(cache.total_bytes for cache in self._prefix_caches)
+        if self.session_cache is not None:
+            cached += self.session_cache.total_bytes
+        return max(0, headroom - cached)
+
+    async def _resolve_model_path(self, model_id: str) -> Path:
         """Resolve model ID to path"""
-        # Check if it's a full path
-        if "/" in model_id and (config.models_dir / model_id).exists():
-            return config.models_dir / model_id
-
-        # Search in models directory
-        for org_dir in config.models_dir.iterdir():
-            if org_dir.is_dir():
-                for model_dir in org_dir.iterdir():
-                    if model_dir.is_dir() and model_dir.name == model_id:
-                        return model_dir
+        # A miss may be a model copied in since the last refresh
+        entry = await self.registry.resolve(model_id)
+        if entry is not None:
+            return entry.path
 
         # Default to direct path
         return config.models_dir / model_id
 
-    def _format_messages(self, messages: list) -> str:
+    def _format_messages(self, messages: list, add_generation_prompt: bool = True) -> str:
         """Simple message formatting fallback"""
         formatted = ""
         for msg in messages:
@@ -224,26 +830,16 @@ class ModelManager:
                 formatted += f"User: {content}\n\n"
             elif role == "assistant":
                 formatted += f"Assistant: {content}\n\n"
-        formatted += "Assistant: "
+        if add_generation_prompt:
+            formatted += "Assistant: "
         return formatted
 
     def list_available_models(self) -> list:
         """List all available models"""
-        models = []
-
-        # Scan models directory
-        for org_dir in config.models_dir.iterdir():
-            if org_dir.is_dir():
-                for model_dir in org_dir.iterdir():
-                    if model_dir.is_dir() and (model_dir / "config.json").exists():
-                        model_id = f"{org_dir.name}/{model_dir.name}"
-                        models.append({
-                            "id": model_id,
-                            "path": str(model_dir),
-                            "loaded": model_id in self.models,
-                        })
-
-        return models
+        return [
+            {**entry.as_dict(), "loaded": entry.id in self.models}
+            for entry in self.registry.entries()
+        ]
 
     def get_model_info(self, model_id: str) -> dict[str, Any] | None:
         """Get information about a loaded model"""
@@ -252,12 +848,13 @@ class ModelManager:
     @property
     def memory_usage(self) -> dict[str, float]:
         """Get current memory usage"""
-        return {
-            "active_gb": mx.metal.get_active_memory() / 1e9,
-            "peak_gb": mx.metal.get_peak_memory() / 1e9,
-            "cache_gb": mx.metal.get_cache_memory() / 1e9,
-        }
+        return self.backend.memory_usage()
+
 
+# Global model manager instance; with an engine socket the models live in the engine process
+if config.engine_socket is not None:
+    from .engine_ipc import RemoteModelManager
 
-# Global model manager instance
-model_manager = ModelManager()
+    model_manager = RemoteModelManager(config.engine_socket)
+else:
+    model_manager = ModelManager()
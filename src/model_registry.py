@@ -0,0 +1,194 @@
+"""
+In-memory index of the converted models under ``models_dir``
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .engine.tensor_file import read_header
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelEntry:
+    """Metadata for one model directory, read without loading weights"""
+    id: str  # "org/name"
+    path: Path
+    mtime_ns: int  # Directory mtime when indexed; changes when shards are added or removed
+    model_type: str | None = None
+    architecture: str | None = None
+    context_length: int | None = None
+    quantization_bits: int | None = None
+    parameters: int | None = None
+    shard_bytes: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.shard_bytes.values())
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": str(self.path),
+            "model_type": self.model_type,
+            "architecture": self.architecture,
+            "context_length": self.context_length,
+            "quantization_bits": self.quantization_bits,
+            "parameters": self.parameters,
+            "size_gb": round(self.total_bytes / 1024**3, 2),
+            "shards": len(self.shard_bytes),
+        }
+
+
+class ModelRegistry:
+    """
+    Index of ``models_dir/<org>/<model>`` built once and refreshed by mtime.
+
+    ``refresh`` only lists directories whose mtime changed and only
+    re-reads a model whose directory changed, so a refresh of an unchanged
+    tree costs one ``stat`` per directory and nothing is parsed. Lookups by
+    ``org/name`` or by bare directory name are dict hits.
+    """
+
+    def __init__(self, models_dir: Path):
+        self.models_dir = Path(models_dir)
+        self._entries: dict[str, ModelEntry] = {}
+        self._by_name: dict[str, str] = {}
+        self._listings: dict[Path, tuple[int, list[Path]]] = {}  # dir -> (mtime_ns, subdirs)
+        self._lock = threading.Lock()
+        self._refreshed_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, model_id: str) -> bool:
+        return self.get(model_id) is not None
+
+    def get(self, model_id: str) -> ModelEntry | None:
+        """Entry by ``org/name`` or directory name"""
+        entry = self._entries.get(model_id)
+        if entry is None and (full_id := self._by_name.get(model_id)) is not None:
+            entry = self._entries.get(full_id)
+        return entry
+
+    async def resolve(self, model_id: str, min_refresh_interval: float = 1.0) -> ModelEntry | None:
+        """``get``, refreshing first on a miss unless a refresh just ran; the scan runs off the event loop"""
+        entry = self.get(model_id)
+        if entry is None and time.monotonic() - self._refreshed_at >= min_refresh_interval:
+            await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+            entry = self.get(model_id)
+        return entry
+
+    def entries(self) -> list[ModelEntry]:
+        return sorted(self._entries.values(), key=lambda e: e.id)
+
+    def refresh(self) -> int:
+        """Pick up added, removed and changed models; returns how many were (re)read"""
+        with self._lock:
+            seen: dict[str, ModelEntry] = {}
+            parsed = 0
+            for org_dir in self._subdirs(self.models_dir):
+                for model_dir in self._subdirs(org_dir):
+                    model_id = f"{org_dir.name}/{model_dir.name}"
+                    try:
+                        mtime_ns = model_dir.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    entry = self._entries.get(model_id)
+                    if entry is None or entry.mtime_ns != mtime_ns:
+                        entry = _read_entry(model_id, model_dir, mtime_ns)
+                        parsed += entry is not None
+                    if entry is not None:
+                        seen[model_id] = entry
+
+            removed = self._entries.keys() - seen.keys()
+            by_name: dict[str, str] = {}
+            for model_id in sorted(seen):
+                # First org wins for an ambiguous bare name, as the old directory walk did
+                by_name.setdefault(seen[model_id].path.name, model_id)
+            self._entries, self._by_name = seen, by_name
+            self._refreshed_at = time.monotonic()
+
+        if parsed or removed:
+            logger.info(f"Model registry: {len(seen)} models ({parsed} read, {len(removed)} removed)")
+        return parsed
+
+    def _subdirs(self, path: Path) -> list[Path]:
+        """Child directories, re-listed only when ``path``'s mtime changed"""
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            self._listings.pop(path, None)
+            return []
+        cached = self._listings.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        try:
+            subdirs = sorted(Path(e.path) for e in os.scandir(path) if e.is_dir())
+        except OSError as e:
+            logger.warning(f"Could not list {path}: {e}")
+            return []
+        self._listings[path] = (mtime_ns, subdirs)
+        return subdirs
+
+
+def _read_entry(model_id: str, model_dir: Path, mtime_ns: int) -> ModelEntry | None:
+    """Parse config.json and the safetensors headers (a few KB each, no weights)"""
+    try:
+        with open(model_dir / "config.json") as f:
+            model_config = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    text_config = model_config.get("text_config") or model_config
+    quantization = model_config.get("quantization") or model_config.get("quantization_config") or {}
+    bits = quantization.get("bits")
+    architectures = model_config.get("architectures") or [None]
+    entry = ModelEntry(
+        id=model_id,
+        path=model_dir,
+        mtime_ns=mtime_ns,
+        model_type=model_config.get("model_type"),
+        architecture=architectures[0],
+        context_length=text_config.get("max_position_embeddings"),
+        quantization_bits=bits,
+    )
+
+    parameters = 0
+    for shard in sorted(model_dir.glob("*.safetensors")):
+        try:
+            entry.shard_bytes[shard.name] = shard.stat().st_size
+            header, _ = read_header(shard)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Could not read safetensors header of {shard}: {e}")
+            parameters = None
+            continue
+        if parameters is not None:
+            parameters += _count_parameters(header, bits)
+    entry.parameters = parameters or None
+    return entry
+
+
+def _count_parameters(header: dict, bits: int | None) -> int:
+    """Logical parameter count; MLX packs quantized weights 32 // bits per uint32"""
+    header = {name: info for name, info in header.items() if name != "__metadata__"}
+    total = 0
+    for name, info in header.items():
+        base = name.rsplit(".", 1)[0]
+        quantized = bits and f"{base}.scales" in header
+        if quantized and name.endswith((".scales", ".biases")):
+            continue  # Quantization constants, not parameters
+        count = math.prod(info["shape"])
+        if quantized and info["dtype"] == "U32":
+            count = count * 32 // bits
+        total += count
+    return total
@@ -1,8 +1,11 @@
 """
 Model routing based on service and user preferences
 """
+import hashlib
 import logging
 
+from .config import config
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +33,33 @@ class ModelRouter:
         "default": "default"
     }
 
+    # Admission priority per service (lower is served first)
+    SERVICE_PRIORITIES: dict[str, int] = {
+        # Clinical traffic is latency-critical
+        "vista": 0,
+        "lbrxvoice": 1,
+        "forkmeASAPp": 2,
+        "default": 2,
+        # Batch analytics can wait
+        "anydatanext": 4,
+    }
+
+    # Fair-share weight per service when tenants contend for one model;
+    # a weight-4 tenant gets four times the tokens of a weight-1 tenant
+    SERVICE_WEIGHTS: dict[str, float] = {
+        "vista": 4.0,
+        "lbrxvoice": 2.0,
+        "forkmeASAPp": 1.0,
+        "anydatanext": 1.0,
+        "default": 1.0,
+    }
+
+    # System prompts each service sends; prefilled into the prefix cache
+    # when the service's model loads so its first request skips them
+    SERVICE_SYSTEM_PROMPTS: dict[str, str] = {
+        # Example: "vista": "You are a veterinary clinical assistant..."
+    }
+
     # User-specific overrides (VIP treatment)
     USER_OVERRIDES: dict[str, dict[str, str]] = {
         # Example: "user@example.com": {"*": "premium-model"}
@@ -95,6 +125,36 @@ class ModelRouter:
         logger.info(f"Using default model: {default_model}")
         return default_model
 
+    @classmethod
+    def get_priority(cls, service: str | None) -> int:
+        """Admission priority class for a service (config overrides first)"""
+        priorities = {**cls.SERVICE_PRIORITIES, **config.service_priorities}
+        if service and service in priorities:
+            return priorities[service]
+        return priorities.get("default", 2)
+
+    @classmethod
+    def get_tenant(cls, service: str | None, api_key: str | None = None) -> str:
+        """
+        Fair-queuing tenant for a request: ``service:keyhash``.
+
+        Each API key is its own tenant, so one noisy client of a service
+        can't starve the others; the key itself is never exposed in metrics.
+        """
+        tenant = service or "default"
+        if api_key:
+            tenant += ":" + hashlib.sha256(api_key.encode()).hexdigest()[:8]
+        return tenant
+
+    @classmethod
+    def get_tenant_weight(cls, tenant: str) -> float:
+        """Fair-share weight for a tenant, from its service (config overrides first)"""
+        weights = {**cls.SERVICE_WEIGHTS, **config.service_weights}
+        service = tenant.split(":", 1)[0]
+        if service in weights:
+            return weights[service]
+        return weights.get("default", 1.0)
+
     @classmethod
     def get_fallback_model(cls, model_id: str) -> str | None:
         """Get fallback model if primary fails"""
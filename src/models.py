@@ -30,6 +30,7 @@ class ChatCompletionRequest(BaseModel):
     tools: list[dict[str, Any]] | None = None
     tool_choice: str | dict[str, Any] | None = None
     response_format: dict[str, Any] | None = None
+    stream_options: dict[str, Any] | None = None  # {"include_usage": true} adds a final usage chunk
 
     # Custom fields for session management
     session_id: str | None = None
@@ -66,6 +67,7 @@ class ChatCompletionChunk(BaseModel):
     model: str
     system_fingerprint: str
     choices: list[dict[str, Any]]
+    usage: Usage | None = None
 
 
 class CompletionRequest(BaseModel):
@@ -98,7 +100,7 @@ class EmbeddingRequest(BaseModel):
 class EmbeddingData(BaseModel):
     object: Literal["embedding"] = "embedding"
     index: int
-    embedding: list[float]
+    embedding: list[float] | str  # str: base64 of little-endian float32
 
 
 class EmbeddingResponse(BaseModel):
@@ -108,6 +110,29 @@ class EmbeddingResponse(BaseModel):
     usage: dict[str, int]
 
 
+class RerankRequest(BaseModel):
+    model: str
+    query: str
+    documents: list[str]
+    top_n: int | None = Field(default=None, ge=1)  # All documents when unset
+    return_documents: bool = False
+    stream: bool = False  # SSE updates of the top_n so far while documents are scored
+    user: str | None = None
+
+
+class RerankResult(BaseModel):
+    index: int
+    relevance_score: float
+    document: dict[str, str] | None = None
+
+
+class RerankResponse(BaseModel):
+    id: str
+    model: str
+    results: list[RerankResult]
+    usage: dict[str, int]
+
+
 class Model(BaseModel):
     id: str
     object: Literal["model"] = "model"
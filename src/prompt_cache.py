@@ -0,0 +1,171 @@
+"""
+Memoized chat-template rendering and tokenization of message histories
+"""
+import hashlib
+import json
+import logging
+import sys
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+prompt_cache_lookups = Counter(
+    "llm_prompt_cache_lookups_total",
+    "Prompt tokenizations by outcome (hit reuses a tokenized message prefix)",
+    ["model", "outcome"]
+)
+
+prompt_cache_tokens_reused = Counter(
+    "llm_prompt_cache_tokens_reused_total",
+    "Prompt tokens taken from the cache instead of being re-tokenized",
+    ["model"]
+)
+
+
+@dataclass
+class _Entry:
+    text: str  # Rendered messages, without the generation prompt
+    tokens: array
+    nbytes: int
+
+
+class PromptTokenCache:
+    """
+    Per-model cache of rendered and tokenized message-list prefixes.
+
+    Entries are keyed by a hash chain over the messages, so the next turn
+    of a conversation finds the previous history and tokenizes only the
+    text rendered for the new messages (plus the generation prompt). The
+    generation prompt is learned from one render with and one without it;
+    after that a request is rendered once and its history is that render
+    minus the suffix. Pieces are only joined next to a special token, where tokenizers never merge
+    across; the first few reuses per model are still checked against a
+    full encode and the cache switches itself off for templates or
+    tokenizers where the pieces don't add up. LRU-bounded by
+    ``budget_bytes``.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        render: Callable[[list, bool], str],
+        encode_prompt: Callable[[str], list[int]],
+        encode_fragment: Callable[[str], list[int]],
+        special_ids: set[int],
+        budget_bytes: int,
+        verify: int = 4,
+    ):
+        self.model_id = model_id
+        self._render = render
+        self._encode_prompt = encode_prompt
+        self._encode_fragment = encode_fragment
+        self._special_ids = special_ids
+        self.budget_bytes = budget_bytes
+        self._verify = verify
+        self.enabled = budget_bytes > 0
+        self._entries: OrderedDict[bytes, _Entry] = OrderedDict()
+        self.used_bytes = 0
+        self._generation_prompt: str | None = None  # Learned from the first render pair
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def encode(self, messages: list) -> list[int]:
+        """Prompt token ids for ``messages`` with the generation prompt appended"""
+        text = self._render(messages, True)
+        if not self.enabled or not messages:
+            return self._encode_prompt(text)
+        history = self._split_history(messages, text)
+        if history is None:
+            # Template rewrites earlier turns when a generation prompt is added
+            return self._encode_prompt(text)
+
+        keys = _chain_keys(messages)
+        history_tokens = None
+        hit = self._lookup(keys, history)
+        if hit is not None:
+            new = self._encode_fragment(history[len(hit.text):])
+            if self._joinable(hit.tokens, new):
+                history_tokens = [*hit.tokens, *new]
+                prompt_cache_lookups.labels(model=self.model_id, outcome="hit").inc()
+                prompt_cache_tokens_reused.labels(model=self.model_id).inc(len(hit.tokens))
+            else:
+                hit = None
+        if history_tokens is None:
+            history_tokens = self._encode_prompt(history)
+            prompt_cache_lookups.labels(model=self.model_id, outcome="miss").inc()
+        self._store(keys[-1], history, history_tokens)
+
+        generation = self._encode_fragment(text[len(history):])
+        if not self._joinable(history_tokens, generation):
+            return self._encode_prompt(text)
+        tokens = history_tokens + generation
+
+        if hit is not None and self._verify > 0:
+            self._verify -= 1
+            full = self._encode_prompt(text)
+            if full != tokens:
+                logger.warning(f"Incremental tokenization differs for {self.model_id}; prompt cache disabled")
+                self.enabled = False
+                self.clear()
+                return full
+        return tokens
+
+    def clear(self):
+        self._entries.clear()
+        self.used_bytes = 0
+
+    def _split_history(self, messages: list, text: str) -> str | None:
+        """``text`` without the generation prompt, rendering a second time only to learn it"""
+        suffix = self._generation_prompt
+        if suffix is not None and text.endswith(suffix):
+            return text[:len(text) - len(suffix)]
+        history = self._render(messages, False)
+        if not text.startswith(history):
+            return None
+        self._generation_prompt = text[len(history):]
+        return history
+
+    def _joinable(self, left, right) -> bool:
+        """Whether tokenizing two texts apart gives the same ids as together"""
+        return not left or not right or left[-1] in self._special_ids or right[0] in self._special_ids
+
+    def _lookup(self, keys: list[bytes], history: str) -> _Entry | None:
+        # Longest cached prefix of the conversation first
+        for key in reversed(keys):
+            entry = self._entries.get(key)
+            if entry is not None and history.startswith(entry.text):
+                self._entries.move_to_end(key)
+                return entry
+        return None
+
+    def _store(self, key: bytes, text: str, tokens: list[int]):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        packed = array("I", tokens)
+        nbytes = sys.getsizeof(text) + packed.itemsize * len(packed)
+        if nbytes > self.budget_bytes:
+            return
+        self._entries[key] = _Entry(text, packed, nbytes)
+        self.used_bytes += nbytes
+        while self.used_bytes > self.budget_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.used_bytes -= evicted.nbytes
+
+
+def _chain_keys(messages: list) -> list[bytes]:
+    """keys[k] identifies messages[:k + 1]"""
+    keys = []
+    digest = b""
+    for message in messages:
+        payload = json.dumps(message, sort_keys=True, ensure_ascii=False).encode()
+        digest = hashlib.blake2b(digest + payload, digest_size=16).digest()
+        keys.append(digest)
+    return keys
@@ -0,0 +1,190 @@
+"""
+Memory-budgeted model residency: decides which models stay loaded
+"""
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+
+# Metrics
+resident_models = Gauge(
+    "llm_resident_models",
+    "Number of models resident in memory"
+)
+
+resident_memory_gb = Gauge(
+    "llm_resident_memory_gb",
+    "Projected memory of resident models in GB"
+)
+
+residency_decisions = Counter(
+    "llm_residency_decisions_total",
+    "Model residency decisions",
+    ["model", "action", "reason"]
+)
+
+
+class ResidencyError(RuntimeError):
+    """A model cannot be made resident within the memory budget"""
+
+
+@dataclass
+class ResidentModel:
+    """Bookkeeping for one loaded model"""
+    model_id: str
+    memory_gb: float
+    priority: int
+    pinned: bool = False
+    loading: bool = False
+    loaded_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ResidencyManager:
+    """
+    Tracks loaded models against ``budget_gb``.
+
+    Before a load, ``plan`` returns the models to unload so the projected
+    footprint fits; victims are unpinned, idle models, least important
+    ``priority`` (highest number) first and least recently used within a
+    priority. ``idle_models`` lists models unused for longer than
+    ``idle_ttl_seconds``. Every decision is counted in Prometheus and kept
+    in a short event log for the admin endpoints.
+    """
+
+    def __init__(
+        self,
+        budget_gb: float,
+        idle_ttl_seconds: float | None = None,
+        in_use: Callable[[str], bool] | None = None,
+        max_events: int = 200,
+    ):
+        self.budget_gb = budget_gb
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._in_use = in_use or (lambda model_id: False)
+        self.models: dict[str, ResidentModel] = {}
+        # Kept as a running total so decode threads can read it while the loop edits ``models``
+        self._used_gb = 0.0
+        self.events: deque[dict[str, Any]] = deque(maxlen=max_events)
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self.models
+
+    @property
+    def used_gb(self) -> float:
+        return self._used_gb
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        """Residency snapshot for admin endpoints"""
+        now = time.monotonic()
+        return {
+            "budget_gb": self.budget_gb,
+            "used_gb": self.used_gb,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "models": [
+                {
+                    "id": m.model_id,
+                    "memory_gb": m.memory_gb,
+                    "priority": m.priority,
+                    "pinned": m.pinned,
+                    "loading": m.loading,
+                    "idle_seconds": round(now - m.last_used, 1),
+                    "in_use": self._in_use(m.model_id),
+                }
+                for m in self.models.values()
+            ],
+            "events": list(self.events),
+        }
+
+    def plan(self, model_id: str, memory_gb: float) -> list[str]:
+        """
+        Models to unload before loading ``model_id``.
+
+        Raises ResidencyError if the model doesn't fit even after every
+        evictable model is gone.
+        """
+        if self.budget_gb <= 0:
+            return []
+        if memory_gb > self.budget_gb:
+            self._record(model_id, "reject", "exceeds_budget", memory_gb=memory_gb)
+            raise ResidencyError(
+                f"Model {model_id} needs {memory_gb:.1f} GB, more than the {self.budget_gb:.1f} GB budget"
+            )
+
+        free_gb = self.budget_gb - self.used_gb
+        victims = []
+        for candidate in self._eviction_order():
+            if free_gb >= memory_gb:
+                break
+            victims.append(candidate.model_id)
+            free_gb += candidate.memory_gb
+
+        if free_gb < memory_gb:
+            self._record(model_id, "reject", "no_evictable_models", memory_gb=memory_gb)
+            raise ResidencyError(
+                f"Model {model_id} needs {memory_gb:.1f} GB but only {free_gb:.1f} GB can be freed; "
+                f"remaining models are pinned or serving requests"
+            )
+        return victims
+
+    def reserve(self, model_id: str, memory_gb: float, priority: int, pinned: bool = False):
+        """Hold memory for a model whose weights are still loading"""
+        self._set(ResidentModel(model_id, memory_gb, priority, pinned, loading=True))
+        resident_memory_gb.set(self.used_gb)
+
+    def admit(self, model_id: str, memory_gb: float, priority: int, pinned: bool = False):
+        """Record a model as loaded"""
+        self._set(ResidentModel(model_id, memory_gb, priority, pinned))
+        self._record(model_id, "load", "requested", memory_gb=memory_gb)
+
+    def remove(self, model_id: str, reason: str = "requested"):
+        """Record a model as unloaded"""
+        model = self.models.pop(model_id, None)
+        if model is not None:
+            self._used_gb = max(0.0, self._used_gb - model.memory_gb) if self.models else 0.0
+            self._record(model_id, "unload", reason, memory_gb=model.memory_gb)
+
+    def _set(self, model: ResidentModel):
+        previous = self.models.get(model.model_id)
+        self.models[model.model_id] = model
+        self._used_gb += model.memory_gb - (previous.memory_gb if previous else 0.0)
+
+    def touch(self, model_id: str):
+        """Mark a model as just used"""
+        model = self.models.get(model_id)
+        if model is not None:
+            model.last_used = time.monotonic()
+
+    def idle_models(self) -> list[str]:
+        """Unpinned models unused for longer than the idle TTL"""
+        if not self.idle_ttl_seconds:
+            return []
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        return [
+            m.model_id for m in self.models.values()
+            if not m.pinned and not m.loading and m.last_used < cutoff and not self._in_use(m.model_id)
+        ]
+
+    def _eviction_order(self) -> list[ResidentModel]:
+        candidates = [
+            m for m in self.models.values()
+            if not m.pinned and not m.loading and not self._in_use(m.model_id)
+        ]
+        # Lower priority number = more important, so evict high numbers first
+        return sorted(candidates, key=lambda m: (-m.priority, m.last_used))
+
+    def _record(self, model_id: str, action: str, reason: str, **details: Any):
+        residency_decisions.labels(model=model_id, action=action, reason=reason).inc()
+        resident_models.set(len(self.models))
+        resident_memory_gb.set(self.used_gb)
+        event = {"time": time.time(), "model": model_id, "action": action, "reason": reason, **details}
+        self.events.append(event)
+        logger.info(f"Residency: {action} {model_id} ({reason})")
@@ -0,0 +1,185 @@
+"""
+Cache of finished generations for requests whose output is reproducible
+"""
+import hashlib
+import json
+import logging
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Mapping
+from dataclasses import asdict
+from typing import Any
+
+from prometheus_client import Counter
+
+from .engine import GenerationResult, SamplingParams
+
+logger = logging.getLogger(__name__)
+
+# Metrics
+response_cache_lookups = Counter(
+    "llm_response_cache_lookups_total",
+    "Deterministic requests looked up in the response cache by outcome (memory_hit, redis_hit, miss)",
+    ["model", "outcome"]
+)
+
+KEY_VERSION = b"v1"  # Bump when the key layout or the stored value changes
+REPLAY_CHUNK_CHARS = 32  # Text per SSE delta when replaying a cached stream
+CACHEABLE_FINISH_REASONS = ("stop", "length")  # Not cancelled or failed runs
+
+
+def is_deterministic(params: SamplingParams) -> bool:
+    """
+    Only greedy decoding reproduces the same output.
+
+    A fixed seed is not treated as enough: sampled output also depends on
+    kernel numerics that can vary with batch composition, so seeded
+    requests are still generated every time.
+    """
+    return params.temperature == 0
+
+
+def cache_key(model_id: str, prompt_tokens: list[int], params: SamplingParams) -> str:
+    """
+    Canonical hash of the routed model, rendered prompt and sampling params.
+
+    The prompt goes in as token ids, i.e. after the chat template, so
+    requests that render to the same prompt share an entry. Greedy
+    decoding ignores top_p and the seed, so they are left out for it.
+    """
+    greedy = params.temperature == 0
+    digest = hashlib.blake2b(KEY_VERSION, digest_size=16)
+    digest.update(model_id.encode())
+    digest.update(b"\0")
+    digest.update(array("I", prompt_tokens).tobytes())
+    digest.update(json.dumps([
+        params.temperature,
+        None if greedy else params.top_p,
+        params.max_tokens,
+        sorted(params.stop_token_ids),
+        list(params.stop_strings),
+        None if greedy else params.seed,
+    ]).encode())
+    return digest.hexdigest()
+
+
+def cache_allowed(headers: Mapping[str, str]) -> bool:
+    """Clients opt out per request with ``Cache-Control: no-cache`` or ``no-store``"""
+    directives = {d.strip().lower() for d in headers.get("cache-control", "").split(",")}
+    return not directives & {"no-cache", "no-store"}
+
+
+async def replay(result: GenerationResult) -> AsyncIterator[str | GenerationResult]:
+    """A cached result in the shape of a live stream: text deltas, then the result"""
+    for start in range(0, len(result.text), REPLAY_CHUNK_CHARS):
+        yield result.text[start:start + REPLAY_CHUNK_CHARS]
+    yield result
+
+
+class ResponseCache:
+    """
+    Two-tier cache of GenerationResults for deterministic requests.
+
+    An in-process LRU answers repeats without a round trip; with a
+    ``redis_url`` entries are also shared between processes and survive
+    restarts. Both tiers expire entries after ``ttl_seconds``. Redis is
+    best effort: when it is unreachable lookups fall through to generation.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        redis_url: str | None = None,
+        prefix: str = "llm:response:",
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._entries: OrderedDict[str, tuple[float, GenerationResult]] = OrderedDict()
+        self._redis: Any = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, model_id: str, key: str) -> GenerationResult | None:
+        """Cached result for ``key``, from memory first, then Redis"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                response_cache_lookups.labels(model=model_id, outcome="memory_hit").inc()
+                return result
+            del self._entries[key]
+
+        result = await self._redis_get(key)
+        if result is not None:
+            self._remember(key, result)
+            response_cache_lookups.labels(model=model_id, outcome="redis_hit").inc()
+            return result
+
+        response_cache_lookups.labels(model=model_id, outcome="miss").inc()
+        return None
+
+    async def put(self, key: str, result: GenerationResult):
+        """Store a finished result in both tiers"""
+        if result.finish_reason not in CACHEABLE_FINISH_REASONS:
+            return
+        self._remember(key, result)
+        await self._redis_set(key, result)
+
+    def clear(self):
+        """Drop the in-process tier"""
+        self._entries.clear()
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _remember(self, key: str, result: GenerationResult):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _client(self):
+        if self._redis is None and self.redis_url:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                logger.warning("redis is not installed, response cache stays in-process")
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> GenerationResult | None:
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Response cache lookup in Redis failed: {e}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return GenerationResult(**json.loads(raw))
+        except (ValueError, TypeError):
+            return None  # Written by an incompatible version
+
+    async def _redis_set(self, key: str, result: GenerationResult):
+        client = self._client()
+        if client is None:
+            return
+        try:
+            await client.set(self.prefix + key, json.dumps(asdict(result)), ex=max(1, int(self.ttl_seconds)))
+        except Exception as e:
+            logger.warning(f"Response cache write to Redis failed: {e}")
@@ -0,0 +1,63 @@
+"""Test the chat completions endpoint over HTTP"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import config
+from src.endpoints import chat as chat_endpoint
+from src.middleware import limiter, setup_middleware
+
+HEADERS = {"Authorization": "Bearer test"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The chat router behind the app's middleware, rate limiter on, synthetic model"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 0)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "enable_auth", False)
+    monkeypatch.setattr(limiter, "enabled", True)
+    # Requests without a session_id never touch the session store
+    monkeypatch.setattr(chat_endpoint, "session_manager", SimpleNamespace())
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    monkeypatch.setattr(chat_endpoint, "model_manager", manager)
+    app = setup_middleware(FastAPI())
+    app.include_router(chat_endpoint.router)
+    with TestClient(app) as client:
+        yield client
+        client.portal.call(manager.shutdown)
+
+
+def test_chat_completion_with_rate_limiting(client):
+    response = client.post(
+        "/chat/completions",
+        json={"model": "synthetic/tiny", "messages": [{"role": "user", "content": "Hi"}], "max_tokens": 8},
+        headers=HEADERS,
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["choices"][0]["message"]["role"] == "assistant"
+    assert body["usage"]["completion_tokens"] == 8
+
+
+def test_streamed_chat_completion_with_rate_limiting(client):
+    response = client.post(
+        "/chat/completions",
+        json={
+            "model": "synthetic/tiny",
+            "messages": [{"role": "user", "content": "Hi"}],
+            "max_tokens": 8,
+            "stream": True,
+        },
+        headers=HEADERS,
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.text.endswith("data: [DONE]\n\n")
@@ -0,0 +1,152 @@
+"""Test single-flight coalescing of identical in-flight requests"""
+import asyncio
+
+import pytest
+
+from src.coalescer import RequestCoalescer, requests_coalesced
+from src.config import config
+from src.engine import BatchScheduler, GenerationResult
+
+MESSAGES = [{"role": "user", "content": "Refresh the dashboard"}]
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 1)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "enable_request_coalescing", True)
+    monkeypatch.setattr(config, "enable_response_cache", False)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    started = []
+    submit, stream = BatchScheduler.submit, BatchScheduler.stream
+
+    async def counting_submit(self, *args, **kwargs):
+        started.append("submit")
+        return await submit(self, *args, **kwargs)
+
+    def counting_stream(self, *args, **kwargs):
+        started.append("stream")
+        return stream(self, *args, **kwargs)
+
+    monkeypatch.setattr(BatchScheduler, "submit", counting_submit)
+    monkeypatch.setattr(BatchScheduler, "stream", counting_stream)
+    manager.started = started
+    try:
+        yield manager
+    finally:
+        await manager.shutdown()
+
+
+def coalesced(model_id: str) -> float:
+    return requests_coalesced.labels(model=model_id)._value.get()
+
+
+async def test_concurrent_identical_requests_share_one_generation(manager):
+    before = coalesced("synthetic/tiny")
+
+    results = await asyncio.gather(*(
+        manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=16)
+        for _ in range(5)
+    ))
+
+    assert manager.started == ["submit"]
+    assert all(r == results[0] for r in results)
+    assert coalesced("synthetic/tiny") - before == 4
+    assert len(manager.coalescer) == 0
+
+
+async def test_sampled_requests_are_not_coalesced(manager):
+    await asyncio.gather(*(
+        manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.8, max_tokens=4)
+        for _ in range(3)
+    ))
+
+    assert manager.started == ["submit"] * 3
+
+
+async def test_seeded_sampled_requests_are_not_coalesced(manager):
+    await asyncio.gather(*(
+        manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.8, seed=7, max_tokens=4)
+        for _ in range(3)
+    ))
+
+    assert manager.started == ["submit"] * 3
+
+
+async def test_late_streaming_joiner_catches_up(manager):
+    """A stream that joins mid-generation replays earlier deltas, then follows live"""
+    first = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=30, stream=True)
+    head = []
+    async for item in first:
+        if isinstance(item, str):
+            head.append(item)
+        if len(head) == 5:
+            break
+
+    late = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=30, stream=True)
+    late_items = [item async for item in late]
+    rest = [item async for item in first]
+
+    result = late_items[-1]
+    assert isinstance(result, GenerationResult)
+    assert rest[-1] == result
+    assert "".join(i for i in late_items if isinstance(i, str)) == result.text
+    assert "".join(head) + "".join(i for i in rest if isinstance(i, str)) == result.text
+    assert manager.started == ["stream"]
+
+
+async def test_streaming_follower_of_a_plain_request_gets_deltas(manager):
+    """Joining a non-streamed generation still yields text deltas and the result"""
+    leader = asyncio.create_task(
+        manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=40)
+    )
+    await asyncio.sleep(0)
+    stream = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=40, stream=True)
+    items = [item async for item in stream]
+
+    assert items[-1] == await leader
+    assert "".join(i for i in items if isinstance(i, str)) == items[-1].text
+    assert manager.started == ["submit"]
+
+
+async def test_generation_stops_when_every_follower_leaves(manager):
+    streams = [
+        await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=10_000, stream=True)
+        for _ in range(2)
+    ]
+    for stream in streams:
+        async for item in stream:
+            if isinstance(item, str):
+                break
+        await stream.aclose()
+
+    scheduler = manager.schedulers[manager._resolve_model_id("synthetic/tiny")]
+    for _ in range(200):
+        if scheduler.active_count + scheduler.pending_count == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert scheduler.active_count + scheduler.pending_count == 0
+    assert len(manager.coalescer) == 0
+
+
+async def test_errors_reach_every_follower():
+    coalescer = RequestCoalescer()
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("boom")
+        yield
+
+    flights = [coalescer.join("m", "k", failing, streaming=False) for _ in range(3)]
+    waiters = [asyncio.create_task(coalescer.wait(f)) for f in flights]
+    await asyncio.sleep(0)
+    release.set()
+
+    errors = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flights[0] is flights[2]
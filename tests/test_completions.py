@@ -0,0 +1,41 @@
+"""Test the text completions endpoint over HTTP"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import config
+from src.endpoints import completions as completions_endpoint
+from src.middleware import limiter, setup_middleware
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The completions router behind the app's middleware, rate limiter on, synthetic model"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 0)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "enable_auth", False)
+    monkeypatch.setattr(limiter, "enabled", True)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    monkeypatch.setattr(completions_endpoint, "model_manager", manager)
+    app = setup_middleware(FastAPI())
+    app.include_router(completions_endpoint.router)
+    with TestClient(app) as client:
+        yield client
+        client.portal.call(manager.shutdown)
+
+
+def test_completion_with_rate_limiting(client):
+    response = client.post(
+        "/completions",
+        json={"model": "synthetic/tiny", "prompt": ["Once", "Twice"], "max_tokens": 4, "n": 2},
+        headers={"Authorization": "Bearer test"},
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [c["index"] for c in body["choices"]] == [0, 1, 2, 3]
+    assert body["usage"]["completion_tokens"] == 16
@@ -0,0 +1,85 @@
+"""Test that abandoned requests stop generating"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from src.disconnect import cancel_on_disconnect, stream_until_disconnect
+from src.engine.scheduler import BatchScheduler, SamplingParams
+
+from .test_scheduler import StubStepModel
+
+
+class FakeRequest:
+    """Looks disconnected once ``disconnect_after`` seconds have passed"""
+
+    def __init__(self, disconnect_after):
+        self.url = SimpleNamespace(path="/v1/test")
+        self._deadline = time.monotonic() + disconnect_after
+
+    async def is_disconnected(self):
+        return time.monotonic() >= self._deadline
+
+
+def cancelled(stage):
+    return REGISTRY.get_sample_value(
+        "llm_engine_sequences_cancelled_total", {"model": "stub-cancel", "stage": stage}
+    ) or 0
+
+
+async def test_disconnect_cancels_non_streaming_generation():
+    stub = StubStepModel(vocab_size=10_000, step_delay=0.002)
+    scheduler = BatchScheduler("stub-cancel", stub)
+    before = cancelled("running")
+    try:
+        with pytest.raises(HTTPException) as exc:
+            await cancel_on_disconnect(
+                FakeRequest(0.02), scheduler.submit([1], SamplingParams(max_tokens=5000)), poll_interval=0.005
+            )
+        assert exc.value.status_code == 499
+        await asyncio.sleep(0.02)
+        assert scheduler._active == []
+    finally:
+        scheduler.stop()
+
+    assert cancelled("running") - before == 1
+    assert len(stub.batch_sizes) < 100
+
+
+async def test_disconnect_stops_stream_even_if_reader_is_stuck():
+    """A response that never pulls again (dead socket) still frees its sequence"""
+    stub = StubStepModel(vocab_size=10_000, step_delay=0.001)
+    scheduler = BatchScheduler("stub-cancel", stub)
+
+    async def deltas():
+        stream = scheduler.stream([1], SamplingParams(max_tokens=5000), buffer_size=4)
+        try:
+            async for delta in stream:
+                yield delta
+        finally:
+            stream.close()
+
+    try:
+        relay = stream_until_disconnect(FakeRequest(0.02), deltas(), poll_interval=0.005)
+        assert await anext(relay)
+        # Parked at a yield from here on, like a response blocked on send
+        await asyncio.sleep(0.05)
+        assert scheduler._active == []
+        assert scheduler._pending == []
+    finally:
+        scheduler.stop()
+
+
+async def test_stream_relays_everything_without_disconnect():
+    stub = StubStepModel()
+    scheduler = BatchScheduler("stub-cancel", stub)
+    try:
+        stream = scheduler.stream([1], SamplingParams(max_tokens=3))
+        relayed = [d async for d in stream_until_disconnect(FakeRequest(60), stream, poll_interval=0.005)]
+    finally:
+        scheduler.stop()
+
+    assert "".join(relayed) == "2 3 4"
@@ -0,0 +1,201 @@
+"""Test the disk spill tier for prefix and session KV caches"""
+import threading
+
+import numpy as np
+
+from src.engine import tensor_file
+from src.engine.disk_cache import DiskKVCache
+from src.engine.prefix_cache import PrefixCache
+from src.engine.scheduler import BatchScheduler, SamplingParams
+from src.engine.session_cache import SessionKVCache
+
+from .test_scheduler import StubStepModel
+
+
+class ArrayStubModel(StubStepModel):
+    """Stub whose list-of-token caches round-trip through numpy arrays"""
+
+    def cache_to_arrays(self, handle):
+        return {"kv": np.asarray(handle, dtype=np.int64)}, {"format": "stub"}
+
+    def cache_from_arrays(self, arrays, metadata):
+        assert metadata["format"] == "stub"
+        tokens = [int(t) for t in arrays["kv"]]
+        return tokens, len(tokens) * self.kv_bytes
+
+
+def test_tensor_file_round_trip(tmp_path):
+    """Tensors and metadata survive a save/load and come back memory-mapped"""
+    path = tmp_path / "t.safetensors"
+    tensors = {
+        "a": np.arange(12, dtype=np.float16).reshape(3, 4),
+        "b": np.array([1, 2, 3], dtype=np.int32),
+    }
+    tensor_file.save(path, tensors, {"k": "v"})
+
+    loaded, metadata = tensor_file.load(path)
+    assert metadata == {"k": "v"}
+    np.testing.assert_array_equal(loaded["a"], tensors["a"])
+    np.testing.assert_array_equal(loaded["b"], tensors["b"])
+    assert isinstance(loaded["a"].base, np.memmap)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_spilled_prefix_is_reloaded(tmp_path):
+    """A prefix evicted from memory is found again on disk"""
+    model = ArrayStubModel()
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("m", model)
+    prompt = list(range(1, 41))
+
+    disk.spill_prefix("m", tuple(prompt), prompt)
+    disk.flush()
+    hit = disk.lookup_prefix("m", [*prompt[:20], 99, 98])
+
+    assert hit is not None
+    assert hit.n_tokens == 20
+    assert hit.cache == prompt[:20]
+    assert disk.lookup_prefix("m", [7, 7, 7, 7, 7]) is None
+    assert disk.stats["hits"] == 1
+    assert disk.stats["misses"] == 1
+    disk.close()
+
+
+def test_spill_converts_on_the_writer_thread(tmp_path):
+    """The evicting thread only queues the handle; the writer flattens it"""
+    threads = []
+
+    class RecordingModel(ArrayStubModel):
+        def cache_to_arrays(self, handle):
+            threads.append(threading.current_thread())
+            return super().cache_to_arrays(handle)
+
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("m", RecordingModel())
+
+    disk.spill_prefix("m", tuple(range(8)), list(range(8)))
+    disk.flush()
+
+    assert len(threads) == 1
+    assert threads[0] is not threading.current_thread()
+    assert disk.stats["files"] == 1
+    disk.close()
+
+
+def test_spilled_session_is_taken_once(tmp_path):
+    """A session cache comes back from disk once and its file is removed"""
+    model = ArrayStubModel()
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("m", model)
+
+    disk.spill_session("s1", "m", tuple(range(10)), list(range(10)))
+    disk.flush()
+    restored = disk.take_session("s1", "m")
+
+    assert restored is not None
+    tokens, handle, codec = restored
+    assert tokens == tuple(range(10))
+    assert handle == list(range(10))
+    assert codec is model
+    assert disk.take_session("s1", "m") is None
+    assert not list(tmp_path.glob("*.safetensors"))
+    disk.close()
+
+
+def test_disk_budget_evicts_oldest_files(tmp_path):
+    """The directory stays under max_bytes by deleting the oldest spills"""
+    model = ArrayStubModel()
+    probe = DiskKVCache(tmp_path / "probe", max_bytes=1 << 20)
+    probe.register_codec("m", model)
+    probe.spill_session("x", "m", tuple(range(40)), list(range(40)))
+    probe.flush()
+    file_size = probe.total_bytes
+    probe.close()
+
+    disk = DiskKVCache(tmp_path / "kv", max_bytes=2 * file_size, min_tokens=4)
+    disk.register_codec("m", model)
+    for i in range(3):
+        disk.spill_session(f"s{i}", "m", tuple(range(i, i + 40)), list(range(i, i + 40)))
+    disk.flush()
+
+    assert disk.total_bytes <= 2 * file_size
+    assert disk.take_session("s0", "m") is None
+    assert disk.take_session("s2", "m") is not None
+    disk.close()
+
+
+def test_index_survives_restart(tmp_path):
+    """Spilled files are re-indexed when a new cache opens the directory"""
+    model = ArrayStubModel()
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("m", model)
+    disk.spill_prefix("m", tuple(range(1, 33)), list(range(1, 33)))
+    disk.spill_session("s1", "m", tuple(range(8)), list(range(8)))
+    disk.close()
+    (tmp_path / "stale.safetensors.tmp").write_bytes(b"partial")
+
+    reopened = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    reopened.register_codec("m", model)
+
+    assert reopened.stats["files"] == 2
+    assert not (tmp_path / "stale.safetensors.tmp").exists()
+    assert reopened.lookup_prefix("m", [*list(range(1, 33)), 0]).n_tokens == 32
+    assert reopened.take_session("s1", "m")[0] == tuple(range(8))
+    reopened.close()
+
+
+async def test_scheduler_reloads_evicted_prefix_from_disk(tmp_path):
+    """With no memory budget, a repeated prompt is served from the disk tier"""
+    model = ArrayStubModel()
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("stub", model)
+    prefix_cache = PrefixCache(
+        "stub",
+        model,
+        budget_bytes=lambda: 0,
+        min_tokens=4,
+        on_evict=lambda tokens, handle, nbytes: disk.spill_prefix("stub", tokens, handle),
+        fallback=lambda tokens: disk.lookup_prefix("stub", tokens),
+    )
+    scheduler = BatchScheduler("stub", model, prefix_cache=prefix_cache)
+    prompt = list(range(1, 50))
+    try:
+        first = await scheduler.submit(prompt, SamplingParams(max_tokens=3))
+        disk.flush()
+        second = await scheduler.submit(prompt, SamplingParams(max_tokens=3))
+    finally:
+        scheduler.stop()
+        disk.close()
+
+    assert first.text == second.text
+    assert model.prefilled_tokens[0] == len(prompt)
+    assert model.prefilled_tokens[1] < len(prompt)
+    assert disk.stats["hits"] == 1
+
+
+async def test_session_restored_from_disk_after_eviction(tmp_path):
+    """An evicted session is reloaded from disk on its next turn"""
+    model = ArrayStubModel()
+    disk = DiskKVCache(tmp_path, max_bytes=1 << 20, min_tokens=4)
+    disk.register_codec("stub", model)
+    sessions = SessionKVCache(
+        max_total_bytes=0,
+        max_session_bytes=1 << 20,
+        min_tokens=4,
+        on_evict=lambda sid, mid, tokens, handle, nbytes: disk.spill_session(sid, mid, tokens, handle),
+        fallback=disk.take_session,
+    )
+    scheduler = BatchScheduler("stub", model, session_cache=sessions)
+    turn1 = list(range(1, 30))
+    try:
+        first = await scheduler.submit(turn1, SamplingParams(max_tokens=3), session_id="s1")
+        disk.flush()
+        assert "s1" not in sessions
+        turn2 = turn1 + [int(t) for t in first.text.split()] + [60, 61, 62]
+        await scheduler.submit(turn2, SamplingParams(max_tokens=3), session_id="s1")
+    finally:
+        scheduler.stop()
+        disk.close()
+
+    assert model.prefilled_tokens[1] < len(turn2)
+    assert sessions.stats["hits"] == 1
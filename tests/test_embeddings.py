@@ -0,0 +1,161 @@
+"""Test embeddings through ModelManager and the vector cache"""
+import base64
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import config
+from src.embedding_cache import EmbeddingCache
+from src.endpoints import embeddings as embeddings_endpoint
+from src.endpoints.embeddings import embedding_data
+from src.middleware import limiter, setup_middleware
+from src.model_config import ModelConfig, ModelType
+
+
+def synthetic_embedding_model(monkeypatch):
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "embedding_cache_mb", 1)
+    monkeypatch.setitem(ModelConfig.MODELS, "test-embed", {
+        "id": "synthetic/embed",
+        "type": ModelType.EMBEDDING,
+        "context_length": 16,
+        "priority": 50,
+    })
+    ModelConfig.reindex()
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    synthetic_embedding_model(monkeypatch)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    try:
+        yield manager
+    finally:
+        await manager.shutdown()
+        monkeypatch.undo()
+        ModelConfig.reindex()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The embeddings router behind the app's middleware, rate limiter on"""
+    synthetic_embedding_model(monkeypatch)
+    monkeypatch.setattr(config, "enable_auth", False)
+    monkeypatch.setattr(limiter, "enabled", True)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    monkeypatch.setattr(embeddings_endpoint, "model_manager", manager)
+    app = setup_middleware(FastAPI())
+    app.include_router(embeddings_endpoint.router)
+    try:
+        with TestClient(app) as client:
+            yield client
+            client.portal.call(manager.shutdown)
+    finally:
+        monkeypatch.undo()
+        ModelConfig.reindex()
+
+
+def spy_on_encoder(manager, model_id: str) -> list[int]:
+    batcher = manager.encoders[model_id]
+    encode = batcher.encoder.encode
+    rows = []
+
+    def recording(input_ids, attention_mask):
+        rows.append(len(input_ids))
+        return encode(input_ids, attention_mask)
+
+    batcher.encoder.encode = recording
+    return rows
+
+
+async def test_embeddings_are_normalized_and_ordered(manager):
+    vectors, tokens = await manager.embed("test-embed", ["cat", "a dog", "cat"])
+
+    assert vectors.shape == (3, 384)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert np.array_equal(vectors[0], vectors[2])
+    assert tokens == 3 + 5 + 3
+    assert manager.model_info["synthetic/embed"]["type"] == "embed"
+
+
+async def test_unchanged_texts_skip_the_encoder(manager):
+    first, _ = await manager.embed("test-embed", ["chunk one", "chunk two"])
+    rows = spy_on_encoder(manager, "synthetic/embed")
+
+    again, tokens = await manager.embed("test-embed", ["chunk two", "chunk three", "chunk one"])
+
+    assert rows == [1]
+    assert np.array_equal(again[0], first[1])
+    assert np.array_equal(again[2], first[0])
+    assert tokens == 9 + 11 + 9
+
+
+async def test_long_inputs_are_truncated_to_the_context_length(manager):
+    vectors, tokens = await manager.embed("test-embed", ["x" * 100, "x" * 16])
+
+    assert tokens == 32
+    assert np.array_equal(vectors[0], vectors[1])
+
+
+async def test_generative_models_are_refused(manager):
+    with pytest.raises(ValueError, match="not an embedding model"):
+        await manager.embed("synthetic/tiny", ["text"])
+    with pytest.raises(ValueError, match="can't generate text"):
+        await manager.generate_completion("test-embed", [{"role": "user", "content": "Hi"}])
+
+
+def test_embeddings_endpoint_serves_requests_with_rate_limiting(client):
+    response = client.post(
+        "/embeddings",
+        json={"model": "test-embed", "input": ["cat", "a dog"]},
+        headers={"Authorization": "Bearer test"},
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [d["index"] for d in body["data"]] == [0, 1]
+    assert len(body["data"][0]["embedding"]) == 384
+    assert body["usage"] == {"prompt_tokens": 3 + 5, "total_tokens": 3 + 5}
+
+    response = client.post(
+        "/embeddings",
+        json={"model": "test-embed", "input": []},
+        headers={"Authorization": "Bearer test"},
+    )
+    assert response.status_code == 400
+
+
+def test_base64_matches_float_encoding():
+    vectors = np.random.default_rng(1).standard_normal((2, 8)).astype(np.float32)
+
+    floats = embedding_data(vectors, "float")
+    packed = embedding_data(vectors, "base64")
+
+    decoded = [np.frombuffer(base64.b64decode(d["embedding"]), dtype="<f4") for d in packed]
+    assert [d["index"] for d in packed] == [0, 1]
+    assert np.array_equal(np.stack(decoded), np.array([d["embedding"] for d in floats], dtype=np.float32))
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    vector = np.zeros(64, dtype=np.float32)
+    cache = EmbeddingCache(budget_bytes=3 * (vector.nbytes + 200))
+    keys = [EmbeddingCache.key("m@1", str(i)) for i in range(4)]
+
+    for key in keys[:3]:
+        cache.put(key, vector, 1)
+    cache.get("m", keys[0])
+    cache.put(keys[3], vector, 1)
+
+    assert cache.get("m", keys[1]) is None
+    assert cache.get("m", keys[0]) is not None
+    assert len(cache) == 3
+    assert EmbeddingCache.key("m@1", "a") != EmbeddingCache.key("m@2", "a")
@@ -0,0 +1,93 @@
+"""Test micro-batching of encoder forward passes"""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.engine import EncodeBatcher
+
+
+class RecordingEncoder:
+    """Returns each row's token sum and records the padded batch shapes"""
+
+    max_length = 512
+    pad_token_id = 0
+
+    def __init__(self, fail: bool = False):
+        self.shapes = []
+        self.tokenized = []
+        self.fail = fail
+
+    def tokenize(self, texts, pairs=None):
+        self.tokenized.append(threading.current_thread())
+        return [list(range(1, len(text) + 1)) for text in texts]
+
+    def encode(self, input_ids, attention_mask):
+        if self.fail:
+            raise RuntimeError("device lost")
+        self.shapes.append(input_ids.shape)
+        return (input_ids * attention_mask).sum(axis=1, keepdims=True).astype(np.float32)
+
+
+async def test_concurrent_requests_share_batches():
+    encoder = RecordingEncoder()
+    batcher = EncodeBatcher("m", encoder, max_batch_size=8)
+    try:
+        results = await asyncio.gather(*(batcher.encode([[1, 2], [3]]) for _ in range(3)))
+    finally:
+        batcher.stop()
+
+    assert all(r.tolist() == [[3.0], [3.0]] for r in results)
+    assert sum(shape[0] for shape in encoder.shapes) == 6
+    assert len(encoder.shapes) < 6
+
+
+def test_batches_are_length_bucketed():
+    """Sorted by length and cut by bucket, row count and padded tokens"""
+    batcher = EncodeBatcher("m", RecordingEncoder(), max_batch_size=3, max_batch_tokens=64)
+    loop = asyncio.new_event_loop()
+    try:
+        pending = [
+            type("P", (), {"tokens": [1] * n, "future": loop.create_future()})()
+            for n in (30, 2, 3, 1, 20, 2, 40)
+        ]
+        batches = batcher.batches(pending)
+    finally:
+        batcher.stop()
+        loop.close()
+
+    assert [[len(p.tokens) for p in batch] for batch in batches] == [[1, 2, 2], [3], [20, 30], [40]]
+
+
+async def test_rows_come_back_in_request_order():
+    batcher = EncodeBatcher("m", RecordingEncoder())
+    try:
+        result = await batcher.encode([[5, 5, 5], [1], [2, 2]])
+    finally:
+        batcher.stop()
+
+    assert result[:, 0].tolist() == [15.0, 1.0, 4.0]
+
+
+async def test_failed_batch_fails_its_requests():
+    batcher = EncodeBatcher("m", RecordingEncoder(fail=True))
+    try:
+        with pytest.raises(RuntimeError, match="device lost"):
+            await batcher.encode([[1]])
+    finally:
+        batcher.stop()
+    assert not batcher.busy
+
+
+async def test_tokenize_runs_one_batched_call_off_the_event_loop():
+    encoder = RecordingEncoder()
+    batcher = EncodeBatcher("m", encoder)
+    try:
+        token_lists = await batcher.tokenize(["ab", "abc"])
+    finally:
+        batcher.stop()
+
+    assert token_lists == [[1, 2], [1, 2, 3]]
+    assert len(encoder.tokenized) == 1
+    assert encoder.tokenized[0] is not threading.current_thread()
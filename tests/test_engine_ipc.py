@@ -0,0 +1,136 @@
+"""Test serving a ModelManager to HTTP workers over the engine socket"""
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from src.config import config
+from src.engine import GenerationResult
+from src.engine_ipc import EngineError, EngineServer, RemoteModelManager, _decode, _encode, encode_frame
+from src.loader import ModelNotReadyError
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+@pytest.fixture
+async def engine(tmp_path, monkeypatch):
+    """A synthetic-backend engine and a worker-side client connected to it"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 1)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "default_model", "")
+    monkeypatch.setattr(config, "engine_state_interval_seconds", 0.05)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    server = EngineServer(manager, tmp_path / "engine.sock")
+    await server.start()
+    remote = RemoteModelManager(server.socket_path)
+    await remote.initialize()
+    try:
+        yield manager, server, remote
+    finally:
+        await remote.shutdown()
+        await server.close()
+        await manager.shutdown()
+
+
+async def test_generate_matches_in_process(engine):
+    """A remote completion is the same GenerationResult the engine produces"""
+    manager, _, remote = engine
+
+    result = await remote.generate_completion("synthetic/tiny", MESSAGES, max_tokens=6, seed=3)
+    local = await manager.generate_completion("synthetic/tiny", MESSAGES, max_tokens=6, seed=3)
+
+    assert isinstance(result, GenerationResult)
+    assert result == local
+
+
+async def test_streams_deltas_then_result(engine):
+    """Streaming yields text deltas and ends with the GenerationResult"""
+    _, _, remote = engine
+
+    stream = await remote.generate_completion("synthetic/tiny", MESSAGES, max_tokens=5, stream=True)
+    items = [item async for item in stream]
+
+    assert isinstance(items[-1], GenerationResult)
+    assert "".join(i for i in items if isinstance(i, str)) == items[-1].text
+
+
+async def test_batch_results_round_trip(engine):
+    """generate_batch returns nested GenerationResults"""
+    _, _, remote = engine
+
+    results = await remote.generate_batch("synthetic/tiny", [MESSAGES, MESSAGES], n=2, max_tokens=3)
+
+    assert [len(choices) for choices in results] == [2, 2]
+    assert all(isinstance(r, GenerationResult) for choices in results for r in choices)
+
+
+async def test_abandoned_stream_cancels_generation(engine):
+    """Closing a stream early frees the sequence in the engine"""
+    manager, _, remote = engine
+
+    stream = await remote.generate_completion("synthetic/tiny", MESSAGES, max_tokens=10_000, stream=True)
+    async for item in stream:
+        if isinstance(item, str):
+            break
+    await stream.aclose()
+
+    scheduler = manager.schedulers[manager._resolve_model_id("synthetic/tiny")]
+    for _ in range(200):
+        if scheduler.active_count + scheduler.pending_count == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert scheduler.active_count + scheduler.pending_count == 0
+
+
+async def test_errors_keep_their_type(engine, monkeypatch):
+    """Errors endpoints map to HTTP statuses arrive as the same exception"""
+    manager, _, remote = engine
+
+    async def not_ready(model_id, *args, **kwargs):
+        raise ModelNotReadyError(model_id, retry_after=7)
+
+    monkeypatch.setattr(manager, "generate_completion", not_ready)
+    with pytest.raises(ModelNotReadyError) as excinfo:
+        await remote.generate_completion("synthetic/tiny", MESSAGES, stream=True)
+    assert excinfo.value.retry_after == 7
+
+
+async def test_state_snapshot_follows_loads(engine):
+    """Loaded models and memory show up in the worker's synchronous view"""
+    _, _, remote = engine
+
+    await remote.load_model("synthetic/tiny")
+
+    assert "synthetic/tiny" in remote.models
+    assert remote.load_status("synthetic/tiny")["state"] == "ready"
+    assert remote.memory_usage["active_gb"] > 0
+    assert remote.get_model_info("synthetic/tiny")["id"] == "synthetic/tiny"
+
+
+async def test_engine_going_away_fails_calls(engine):
+    """In-flight calls fail instead of hanging when the engine disappears"""
+    _, server, remote = engine
+    stream = await remote.generate_completion("synthetic/tiny", MESSAGES, max_tokens=10_000, stream=True)
+
+    server._server.close()
+    remote._writer.transport.abort()
+
+    with pytest.raises(EngineError):
+        async for _ in stream:
+            pass
+
+
+def test_arrays_cross_the_socket_as_raw_bytes():
+    """Embedding matrices keep dtype, shape and exact values through a JSON frame"""
+    vectors = np.random.default_rng(0).standard_normal((3, 5)).astype(np.float32)
+
+    decoded = _decode(json.loads(encode_frame({"item": _encode((vectors, 7))})[4:])["item"])
+
+    assert decoded[1] == 7
+    assert decoded[0].dtype == np.float32
+    assert np.array_equal(decoded[0], vectors)
@@ -0,0 +1,53 @@
+"""Keep imports that don't need a model fast and free of MLX"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+# Packages that only a model load should import
+HEAVY = {"mlx", "mlx_lm", "mlx_vlm", "transformers", "jinja2", "torch", "uvicorn"}
+
+# Cumulative import time budgets, seconds; measured well under half of these
+LIGHT_BUDGETS = {
+    "src.config": 1.0,
+    "src.models": 1.0,
+    "src.chuk_sessions": 1.0,
+}
+APP_BUDGET = 4.0
+
+
+def profile_import(module: str) -> tuple[dict[str, float], set[str]]:
+    """Import ``module`` in a fresh interpreter; (top-level cumulative seconds, packages loaded)"""
+    code = f"import sys, {module}; print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, timeout=60, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, micros, name = line.split("|")
+        if not name.startswith("  "):  # Indentation marks nested imports
+            cumulative[name.strip()] = int(micros) / 1e6
+    return cumulative, set(result.stdout.split())
+
+
+@pytest.mark.parametrize("module", LIGHT_BUDGETS)
+def test_light_modules_import_within_budget(module):
+    """config, models and chuk_sessions load without the engine, MLX or redis"""
+    cumulative, packages = profile_import(module)
+
+    assert cumulative[module] < LIGHT_BUDGETS[module]
+    assert not packages & (HEAVY | {"numpy", "redis", "fastapi"})
+
+
+def test_app_imports_without_mlx():
+    """The app and its routers import on Linux; MLX waits for the first model load"""
+    cumulative, packages = profile_import("src.main")
+
+    assert cumulative["src.main"] < APP_BUDGET
+    assert not packages & HEAVY
@@ -0,0 +1,128 @@
+"""Test single-flight model loading with a fake slow loader"""
+import asyncio
+
+import pytest
+
+from src.loader import SingleFlightLoader, prefetch_weights
+
+
+class FakeLoader:
+    """Sleeps instead of reading weights and counts calls per model"""
+
+    def __init__(self, delay=0.05, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls: dict[str, int] = {}
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, model_id, *args):
+        self.calls[model_id] = self.calls.get(model_id, 0) + 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        if model_id in self.fail:
+            raise ValueError(f"cannot load {model_id}")
+        return f"weights:{model_id}"
+
+
+async def test_concurrent_requests_share_one_load():
+    """Many callers of a cold model trigger a single load"""
+    fake = FakeLoader()
+    loader = SingleFlightLoader(fake)
+
+    results = await asyncio.gather(*[loader.load("qwen") for _ in range(10)])
+
+    assert results == ["weights:qwen"] * 10
+    assert fake.calls == {"qwen": 1}
+    assert loader.status("qwen")["state"] == "ready"
+
+
+async def test_loads_are_queued_beyond_concurrency_limit():
+    """Other models wait for a load slot and report their position"""
+    fake = FakeLoader(delay=0.05)
+    loader = SingleFlightLoader(fake, max_concurrent=1)
+
+    tasks = [asyncio.create_task(loader.load(m)) for m in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+
+    assert loader.status("a")["state"] == "loading"
+    assert loader.status("b")["queue_position"] == 0
+    assert loader.status("c")["queue_position"] == 1
+    assert [s["model"] for s in loader.queue] == ["a", "b", "c"]
+
+    await asyncio.gather(*tasks)
+    assert fake.max_running == 1
+    assert loader.queue == []
+
+
+async def test_independent_models_load_in_parallel():
+    """With free slots a slow load does not delay another model"""
+    fake = FakeLoader(delay=0.05)
+    loader = SingleFlightLoader(fake, max_concurrent=2)
+
+    await asyncio.gather(loader.load("a"), loader.load("b"))
+
+    assert fake.max_running == 2
+
+
+async def test_failure_reaches_every_waiter_and_allows_retry():
+    """A failed load is reported to all callers; the next call retries"""
+    fake = FakeLoader(fail={"broken"})
+    loader = SingleFlightLoader(fake)
+
+    results = await asyncio.gather(loader.load("broken"), loader.load("broken"), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    status = loader.status("broken")
+    assert status["state"] == "failed"
+    assert "cannot load" in status["error"]
+
+    fake.fail.clear()
+    assert await loader.load("broken") == "weights:broken"
+    assert fake.calls["broken"] == 2
+
+
+async def test_cancelled_waiter_does_not_cancel_load():
+    """A caller giving up leaves the shared load running for the others"""
+    fake = FakeLoader(delay=0.05)
+    loader = SingleFlightLoader(fake)
+
+    impatient = asyncio.create_task(loader.load("m"))
+    patient = asyncio.create_task(loader.load("m"))
+    await asyncio.sleep(0.01)
+    impatient.cancel()
+
+    assert await patient == "weights:m"
+    with pytest.raises(asyncio.CancelledError):
+        await impatient
+    assert fake.calls == {"m": 1}
+
+
+async def test_background_start_reports_progress():
+    """start() returns immediately and the status tracks the load"""
+    fake = FakeLoader(delay=0.05)
+    loader = SingleFlightLoader(fake)
+
+    task = loader.start("m")
+    await asyncio.sleep(0.01)
+    assert loader.status("m")["state"] == "loading"
+    assert loader.in_flight("m")
+
+    await task
+    assert not loader.in_flight("m")
+    assert loader.status("m")["loading_seconds"] >= 0.04
+
+
+def test_prefetch_reads_every_shard(tmp_path):
+    """All safetensors shards are read through; other files are ignored"""
+    for i, size in enumerate((1000, 5000, 0)):
+        (tmp_path / f"model-0000{i}.safetensors").write_bytes(b"x" * size)
+    (tmp_path / "tokenizer.json").write_bytes(b"{}" * 100)
+
+    assert prefetch_weights(tmp_path, max_workers=2) == 6000
+    assert prefetch_weights(tmp_path, max_workers=0) == 0
+    assert prefetch_weights(tmp_path / "missing") == 0
@@ -0,0 +1,41 @@
+"""Test exporting metrics recorded by several server processes"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from prometheus_client import generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.middleware import metrics_registry
+
+ROOT = Path(__file__).parent.parent
+
+# What an HTTP worker records for a served request
+WORKER = "from src.middleware import record_usage; record_usage('qwen', 'vista', 5, 7)"
+
+
+def exported_samples(registry) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(generate_latest(registry).decode())
+        for sample in family.samples
+    }
+
+
+def test_worker_counters_reach_the_exported_metrics(tmp_path, monkeypatch):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", WORKER], cwd=ROOT, env=env, check=True, timeout=60)
+
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    samples = exported_samples(metrics_registry())
+
+    labels = (("model", "qwen"), ("service", "vista"))
+    assert samples[("llm_tokens_total", (("kind", "completion"), *labels))] == 14
+    assert samples[("llm_tokens_total", (("kind", "prompt"), *labels))] == 10
+
+
+def test_single_process_exports_its_own_registry(monkeypatch):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    assert ("llm_active_requests", ()) in exported_samples(metrics_registry())
@@ -0,0 +1,162 @@
+"""Test the mtime-refreshed model registry"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from src.engine import tensor_file
+from src.model_config import ModelConfig
+from src.model_registry import ModelRegistry
+
+
+def make_model(models_dir, model_id, shards=None, quantization=None, model_type="llama"):
+    """A model directory with a config.json and tiny safetensors shards"""
+    model_dir = models_dir / model_id
+    model_dir.mkdir(parents=True)
+    model_config = {"model_type": model_type, "architectures": ["LlamaForCausalLM"], "max_position_embeddings": 4096}
+    if quantization:
+        model_config["quantization"] = quantization
+    (model_dir / "config.json").write_text(json.dumps(model_config))
+    shards = shards or {"model.safetensors": {"embed.weight": np.zeros((8, 4), np.float16)}}
+    for name, tensors in shards.items():
+        tensor_file.save(model_dir / name, tensors)
+    return model_dir
+
+
+def bump_mtime(path):
+    """Move a directory's mtime forward so coarse filesystem clocks still see a change"""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_indexes_metadata_from_headers(tmp_path):
+    """Parameters, shards and context length come from config.json and headers"""
+    make_model(tmp_path, "org/tiny", shards={
+        "model-00001-of-00002.safetensors": {"a.weight": np.zeros((8, 4), np.float16)},
+        "model-00002-of-00002.safetensors": {"b.weight": np.zeros((2, 3), np.float32)},
+    })
+    registry = ModelRegistry(tmp_path)
+
+    assert registry.refresh() == 1
+    entry = registry.get("org/tiny")
+    assert entry.parameters == 8 * 4 + 2 * 3
+    assert entry.context_length == 4096
+    assert entry.model_type == "llama"
+    assert entry.architecture == "LlamaForCausalLM"
+    assert len(entry.shard_bytes) == 2
+    assert entry.total_bytes == sum((entry.path / name).stat().st_size for name in entry.shard_bytes)
+
+
+def test_counts_quantized_parameters_unpacked(tmp_path):
+    """4-bit weights pack 8 per uint32; scales and biases are not parameters"""
+    make_model(tmp_path, "org/q4", quantization={"bits": 4, "group_size": 64}, shards={
+        "model.safetensors": {
+            "proj.weight": np.zeros((16, 8), np.uint32),
+            "proj.scales": np.zeros((16, 1), np.float16),
+            "proj.biases": np.zeros((16, 1), np.float16),
+            "norm.weight": np.zeros((16,), np.float16),
+        },
+    })
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+
+    entry = registry.get("org/q4")
+    assert entry.quantization_bits == 4
+    assert entry.parameters == 16 * 8 * 8 + 16
+
+
+def test_resolves_bare_directory_name(tmp_path):
+    """A model can be looked up by its directory name alone"""
+    make_model(tmp_path, "org/tiny")
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+
+    assert registry.get("tiny").id == "org/tiny"
+    assert "tiny" in registry
+    assert registry.get("missing") is None
+
+
+def test_skips_directories_without_config(tmp_path):
+    """Only directories with a config.json are models"""
+    (tmp_path / "org" / "partial-download").mkdir(parents=True)
+    registry = ModelRegistry(tmp_path)
+
+    assert registry.refresh() == 0
+    assert len(registry) == 0
+
+
+def test_unchanged_tree_is_not_reparsed(tmp_path):
+    """A refresh with nothing changed reads no config or header"""
+    make_model(tmp_path, "org/tiny")
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+    entry = registry.get("org/tiny")
+
+    assert registry.refresh() == 0
+    assert registry.get("org/tiny") is entry
+
+
+def test_refresh_picks_up_added_changed_and_removed_models(tmp_path):
+    """New models appear, changed ones are re-read and deleted ones drop out"""
+    make_model(tmp_path, "org/tiny")
+    make_model(tmp_path, "org/gone")
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+
+    make_model(tmp_path, "other/new")
+    tensor_file.save(tmp_path / "org/tiny/extra.safetensors", {"c.weight": np.zeros((5,), np.float16)})
+    bump_mtime(tmp_path / "org/tiny")
+    for child in (tmp_path / "org/gone").iterdir():
+        child.unlink()
+    (tmp_path / "org/gone").rmdir()
+    bump_mtime(tmp_path / "org")
+
+    assert registry.refresh() == 2
+    assert registry.get("other/new") is not None
+    assert registry.get("org/tiny").parameters == 8 * 4 + 5
+    assert registry.get("org/gone") is None
+    assert [e.id for e in registry.entries()] == ["org/tiny", "other/new"]
+
+
+async def test_resolve_refreshes_on_miss(tmp_path):
+    """A model copied in after startup is found without waiting for the next refresh"""
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+    make_model(tmp_path, "org/late")
+
+    assert await registry.resolve("org/late", min_refresh_interval=0) is not None
+
+
+async def test_resolve_refreshes_off_the_event_loop(tmp_path, monkeypatch):
+    registry = ModelRegistry(tmp_path)
+    threads = []
+    refresh = registry.refresh
+
+    def recording_refresh():
+        threads.append(threading.current_thread())
+        return refresh()
+
+    monkeypatch.setattr(registry, "refresh", recording_refresh)
+    make_model(tmp_path, "org/late")
+
+    assert await registry.resolve("org/late") is not None
+    assert threads and threads[0] is not threading.current_thread()
+
+
+async def test_resolve_rate_limits_refresh_on_miss(tmp_path):
+    """Lookups of unknown models don't rescan on every request"""
+    registry = ModelRegistry(tmp_path)
+    registry.refresh()
+    make_model(tmp_path, "org/late")
+
+    assert await registry.resolve("org/late", min_refresh_interval=60) is None
+
+
+def test_model_config_lookup_table():
+    """Short names, full IDs and aliases all resolve through the index"""
+    by_name = ModelConfig.get_model_config("qwen3-14b")
+
+    assert ModelConfig.get_model_config(by_name["id"]) is by_name
+    assert ModelConfig.get_model_config("qwen") is by_name
+    assert ModelConfig.get_model_config("no-such-model") is None
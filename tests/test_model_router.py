@@ -67,4 +67,16 @@ class TestModelRouter:
         assert model == "premium-model"
         
         # Clean up
-        del ModelRouter.USER_OVERRIDES["test@example.com"]
\ No newline at end of file
+        del ModelRouter.USER_OVERRIDES["test@example.com"]
+    def test_tenant_per_api_key(self):
+        """Each API key of a service is its own fair-queuing tenant"""
+        a = ModelRouter.get_tenant("vista", "vista_aaaaa")
+        b = ModelRouter.get_tenant("vista", "vista_bbbbb")
+        assert a != b
+        assert a.startswith("vista:") and "aaaaa" not in a
+        assert ModelRouter.get_tenant(None) == "default"
+
+    def test_tenant_weight_follows_service(self):
+        """Tenant weight comes from its service, unknown services get the default"""
+        assert ModelRouter.get_tenant_weight(ModelRouter.get_tenant("vista", "vista_x")) == 4.0
+        assert ModelRouter.get_tenant_weight("unknown:1234") == 1.0
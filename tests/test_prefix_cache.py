@@ -0,0 +1,143 @@
+"""Test radix-tree prefix KV cache reuse"""
+import asyncio
+
+from src.engine.prefix_cache import PrefixCache
+from src.engine.scheduler import BatchScheduler, SamplingParams
+
+from .test_scheduler import StubStepModel
+
+
+class ListBackend:
+    """KV cache stand-in: a snapshot is the list of cached token ids"""
+
+    def __init__(self, trimmable=True):
+        self.trimmable = trimmable
+
+    def kv_bytes_per_token(self):
+        return 1
+
+    def export_cache(self, state):
+        return list(state), len(state)
+
+    def import_cache(self, handle, n_tokens, copy=True):
+        if n_tokens > len(handle) or (n_tokens < len(handle) and not self.trimmable):
+            return None
+        return handle[:n_tokens]
+
+
+SYSTEM = list(range(100, 140))
+
+
+def make_cache(budget=10_000, trimmable=True, on_evict=None):
+    return PrefixCache("test", ListBackend(trimmable), lambda: budget, min_tokens=4, on_evict=on_evict)
+
+
+class TestPrefixCache:
+    """Test lookup, insertion and eviction"""
+
+    def test_miss_on_empty_cache(self):
+        cache = make_cache()
+        assert cache.lookup([*SYSTEM, 1, 2]) is None
+        assert cache.misses == 1
+
+    def test_shared_system_prompt_is_reused(self):
+        cache = make_cache()
+        cache.insert([*SYSTEM, 1, 2, 3], [*SYSTEM, 1, 2, 3])
+
+        hit = cache.lookup([*SYSTEM, 7, 8, 9])
+
+        assert hit is not None
+        assert hit.n_tokens == len(SYSTEM)
+        assert hit.cache == SYSTEM
+        assert cache.tokens_saved == len(SYSTEM)
+
+    def test_repeated_prompt_leaves_last_token(self):
+        cache = make_cache()
+        prompt = [*SYSTEM, 1, 2, 3]
+        cache.insert(prompt, prompt)
+
+        hit = cache.lookup(prompt)
+
+        assert hit.n_tokens == len(prompt) - 1
+
+    def test_extension_of_cached_prompt_reuses_all_of_it(self):
+        cache = make_cache()
+        cache.insert(SYSTEM, SYSTEM)
+
+        hit = cache.lookup([*SYSTEM, 5, 6])
+
+        assert hit.n_tokens == len(SYSTEM)
+
+    def test_untrimmable_backend_falls_back_to_ancestor(self):
+        cache = make_cache(trimmable=False)
+        cache.insert(SYSTEM, SYSTEM)
+        cache.insert([*SYSTEM, 1, 2, 3], [*SYSTEM, 1, 2, 3])
+
+        hit = cache.lookup([*SYSTEM, 1, 2, 9, 9])
+
+        assert hit.n_tokens == len(SYSTEM)
+
+    def test_short_prefixes_are_ignored(self):
+        cache = make_cache()
+        cache.insert([1, 2, 3, 4, 5], [1, 2, 3, 4, 5])
+
+        assert cache.lookup([1, 2, 9, 9]) is None
+
+    def test_lru_eviction_within_budget(self):
+        evicted = []
+        cache = make_cache(budget=100, on_evict=lambda tokens, handle, nbytes: evicted.append(tokens))
+        first = [*SYSTEM, 1]
+        second = [*SYSTEM, 2]
+        third = [*SYSTEM, 3]
+        cache.insert(first, first)
+        cache.insert(second, second)
+        # Touch the first so the second becomes least recently used
+        cache.lookup([*first, 0])
+        cache.insert(third, third)
+
+        assert cache.total_bytes <= 100
+        assert evicted == [tuple(second)]
+        assert len(cache) == 2
+
+    def test_eviction_prunes_tree(self):
+        cache = make_cache(budget=50)
+        cache.insert([*SYSTEM, 1], [*SYSTEM, 1])
+        cache.insert([9] * 10, [9] * 10)
+
+        assert len(cache) == 1
+        assert cache.lookup([*SYSTEM, 1, 2]) is None
+        hit = cache.lookup([9] * 12)
+        assert hit.n_tokens == 10
+
+
+async def test_scheduler_prefills_only_uncached_suffix():
+    """Second request with the same system prompt prefills just its own turn"""
+    stub = StubStepModel()
+    prefix_cache = PrefixCache("stub", stub, lambda: 10_000, min_tokens=4)
+    scheduler = BatchScheduler("stub", stub, prefix_cache=prefix_cache)
+    try:
+        first = await scheduler.submit([*SYSTEM, 1, 2], SamplingParams(max_tokens=3))
+        second = await scheduler.submit([*SYSTEM, 5, 6, 7], SamplingParams(max_tokens=3))
+    finally:
+        scheduler.stop()
+
+    assert first.completion_tokens == second.completion_tokens == 3
+    assert stub.prefilled_tokens == [len(SYSTEM) + 2, 3]
+    assert prefix_cache.hits == 1
+
+
+async def test_concurrent_requests_with_prefix_cache():
+    """Prefix reuse works while sequences share the decode loop"""
+    stub = StubStepModel(step_delay=0.001)
+    prefix_cache = PrefixCache("stub", stub, lambda: 10_000, min_tokens=4)
+    scheduler = BatchScheduler("stub", stub, prefix_cache=prefix_cache)
+    try:
+        await scheduler.submit([*SYSTEM, 1], SamplingParams(max_tokens=2))
+        results = await asyncio.gather(*[
+            scheduler.submit([*SYSTEM, i, i], SamplingParams(max_tokens=5)) for i in range(2, 6)
+        ])
+    finally:
+        scheduler.stop()
+
+    assert all(r.completion_tokens == 5 for r in results)
+    assert prefix_cache.hits == 4
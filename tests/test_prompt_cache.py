@@ -0,0 +1,135 @@
+"""Test the rendered/tokenized message-history cache"""
+import re
+
+from src.prompt_cache import PromptTokenCache
+
+SPECIALS = {"<|im_start|>": 1, "<|im_end|>": 2}
+SPECIAL_RE = re.compile("|".join(re.escape(s) for s in SPECIALS))
+
+
+class CharTokenizer:
+    """ChatML template; one token per character, special tokens kept whole"""
+
+    def __init__(self, dummy_prefix=False):
+        self.encoded_chars = 0
+        self.renders = 0
+        self.dummy_prefix = dummy_prefix
+
+    def render(self, messages, add_generation_prompt):
+        self.renders += 1
+        text = "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+        return text + ("<|im_start|>assistant\n" if add_generation_prompt else "")
+
+    def encode(self, text):
+        self.encoded_chars += len(text)
+        tokens = [0] if self.dummy_prefix and text else []
+        pos = 0
+        for match in SPECIAL_RE.finditer(text):
+            tokens += [100 + ord(c) for c in text[pos:match.start()]]
+            tokens.append(SPECIALS[match.group()])
+            pos = match.end()
+        return tokens + [100 + ord(c) for c in text[pos:]]
+
+    def full(self, messages):
+        return self.encode(self.render(messages, True))
+
+
+def make_cache(tokenizer, budget_bytes=1 << 20, encode_fragment=None):
+    return PromptTokenCache(
+        "test",
+        render=tokenizer.render,
+        encode_prompt=tokenizer.encode,
+        encode_fragment=encode_fragment or tokenizer.encode,
+        special_ids=set(SPECIALS.values()),
+        budget_bytes=budget_bytes,
+    )
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "You are a veterinary assistant. " * 20}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i} about the patient"})
+        messages.append({"role": "assistant", "content": f"Answer {i} with details"})
+    return messages
+
+
+def test_next_turn_only_tokenizes_new_messages():
+    tokenizer = CharTokenizer()
+    cache = make_cache(tokenizer)
+    history = conversation(5)[:-1]
+    assert cache.encode(history) == tokenizer.full(history)
+
+    follow_up = [*history, {"role": "assistant", "content": "Sure."}, {"role": "user", "content": "And now?"}]
+    tokenizer.encoded_chars = 0
+    tokens = cache.encode(follow_up)
+    incremental_chars = tokenizer.encoded_chars
+
+    assert tokens == tokenizer.full(follow_up)
+    # The check against a full encode is part of the first reuses; subtract it
+    full_chars = len(tokenizer.render(follow_up, True))
+    assert incremental_chars - full_chars < 100
+
+
+def test_identical_request_reuses_whole_history():
+    tokenizer = CharTokenizer()
+    cache = make_cache(tokenizer)
+    messages = conversation(3)[:-1]
+    first = cache.encode(messages)
+    assert cache.encode(messages) == first
+
+
+def test_renders_each_request_once_after_learning_the_generation_prompt():
+    tokenizer = CharTokenizer()
+    cache = make_cache(tokenizer)
+    messages = conversation(4)
+    cache.encode(messages[:1])
+    for end in range(3, len(messages) + 1, 2):
+        tokenizer.renders = 0
+        assert cache.encode(messages[:end]) == tokenizer.full(messages[:end])
+        # One render for the cache, one for the reference above
+        assert tokenizer.renders == 2
+
+
+def test_generation_prompt_that_changes_is_relearned():
+    tokenizer = CharTokenizer()
+    render = tokenizer.render
+    tokenizer.render = lambda messages, gen: render(messages, gen) + ("think\n" if gen and len(messages) > 2 else "")
+    cache = make_cache(tokenizer)
+    messages = conversation(3)[:-1]
+    assert cache.encode(messages[:2]) == tokenizer.full(messages[:2])
+    assert cache.encode(messages) == tokenizer.full(messages)
+    assert cache.encode(messages[:4]) == tokenizer.full(messages[:4])
+
+
+def test_does_not_join_where_tokens_could_merge():
+    tokenizer = CharTokenizer()
+    # Like SentencePiece's dummy prefix: a fragment does not tokenize the same mid-text
+    fragment_tokenizer = CharTokenizer(dummy_prefix=True)
+    cache = make_cache(tokenizer, encode_fragment=fragment_tokenizer.encode)
+    messages = conversation(2)[:-1]
+    assert cache.encode(messages) == tokenizer.full(messages)
+
+    follow_up = [*messages, {"role": "assistant", "content": "ok"}, {"role": "user", "content": "next"}]
+    assert cache.encode(follow_up) == tokenizer.full(follow_up)
+
+
+def test_disables_itself_when_pieces_do_not_add_up():
+    tokenizer = CharTokenizer()
+    cache = make_cache(tokenizer, encode_fragment=lambda text: [*tokenizer.encode(text), 2] if text else [])
+    messages = conversation(2)[:-1]
+    cache.encode(messages)
+
+    follow_up = [*messages, {"role": "assistant", "content": "ok"}, {"role": "user", "content": "next"}]
+    assert cache.encode(follow_up) == tokenizer.full(follow_up)
+    assert not cache.enabled
+    assert len(cache) == 0
+
+
+def test_memory_is_bounded():
+    tokenizer = CharTokenizer()
+    cache = make_cache(tokenizer, budget_bytes=20_000)
+    for i in range(50):
+        messages = [{"role": "user", "content": f"prompt {i} " * 50}]
+        assert cache.encode(messages) == tokenizer.full(messages)
+    assert 0 < cache.used_bytes <= 20_000
+    assert 0 < len(cache) < 50
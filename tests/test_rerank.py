@@ -0,0 +1,138 @@
+"""Test cross-encoder reranking"""
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import config
+from src.endpoints import rerank as rerank_endpoint
+from src.endpoints.rerank import stream_rerank, top_results
+from src.middleware import limiter, setup_middleware
+from src.model_config import ModelConfig, ModelType
+from src.models import RerankRequest
+
+QUERY = "feline vaccination schedule"
+DOCUMENTS = [
+    "tractor maintenance manual",
+    "feline vaccination schedule",
+    "canine vaccination schedule",
+    "feline diet",
+]
+
+
+def synthetic_reranker(monkeypatch):
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setitem(ModelConfig.MODELS, "test-rerank", {
+        "id": "synthetic/rerank",
+        "type": ModelType.RERANKER,
+        "context_length": 40,
+        "priority": 50,
+    })
+    ModelConfig.reindex()
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    synthetic_reranker(monkeypatch)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    monkeypatch.setattr(rerank_endpoint, "model_manager", manager)
+    try:
+        yield manager
+    finally:
+        await manager.shutdown()
+        monkeypatch.undo()
+        ModelConfig.reindex()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The rerank router behind the app's middleware, rate limiter on"""
+    synthetic_reranker(monkeypatch)
+    monkeypatch.setattr(config, "enable_auth", False)
+    monkeypatch.setattr(limiter, "enabled", True)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    monkeypatch.setattr(rerank_endpoint, "model_manager", manager)
+    app = setup_middleware(FastAPI())
+    app.include_router(rerank_endpoint.router)
+    try:
+        with TestClient(app) as client:
+            yield client
+            client.portal.call(manager.shutdown)
+    finally:
+        monkeypatch.undo()
+        ModelConfig.reindex()
+
+
+async def test_scores_rank_the_matching_document_first(manager):
+    scores, tokens = await manager.rerank("test-rerank", QUERY, DOCUMENTS)
+
+    assert scores.shape == (4,)
+    assert np.all((scores >= 0) & (scores <= 1))
+    assert np.argmax(scores) == 1
+    assert scores[2] > scores[0]
+    assert tokens == sum(min(40, len(QUERY) + 1 + len(d)) for d in DOCUMENTS)
+
+
+async def test_long_documents_are_cut_to_the_context_length(manager):
+    _, tokens = await manager.rerank("test-rerank", QUERY, ["x" * 500, "short"])
+
+    assert tokens == 40 + len(QUERY) + 1 + 5
+
+
+async def test_reranker_and_embedding_models_are_not_interchangeable(manager):
+    with pytest.raises(ValueError, match="not an embedding model"):
+        await manager.embed("test-rerank", ["text"])
+    with pytest.raises(ValueError, match="not a reranker"):
+        await manager.rerank("synthetic/tiny", QUERY, DOCUMENTS)
+
+
+def test_rerank_endpoint_serves_requests_with_rate_limiting(client):
+    headers = {"Authorization": "Bearer test"}
+    response = client.post(
+        "/rerank",
+        json={"model": "test-rerank", "query": QUERY, "documents": DOCUMENTS, "top_n": 2, "return_documents": True},
+        headers=headers,
+    )
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(r["index"], r["document"]["text"]) for r in results] == [(1, DOCUMENTS[1]), (2, DOCUMENTS[2])]
+
+    response = client.post(
+        "/rerank",
+        json={"model": "test-rerank", "query": QUERY, "documents": DOCUMENTS, "stream": True},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.text.endswith("data: [DONE]\n\n")
+
+
+def test_top_results_are_sorted_and_limited():
+    scores = np.array([0.2, 0.9, -np.inf, 0.5], dtype=np.float32)
+
+    results = top_results(scores, 2, ["a", "b", "c", "d"], return_documents=True)
+
+    assert [(r.index, r.document["text"]) for r in results] == [(1, "b"), (3, "d")]
+    assert top_results(scores, 10, ["a", "b", "c", "d"], False)[-1].index == 2
+
+
+async def test_stream_sends_partial_top_k_then_the_final_ranking(manager, monkeypatch):
+    monkeypatch.setattr(config, "rerank_stream_chunk_size", 1)
+    request = RerankRequest(model="test-rerank", query=QUERY, documents=DOCUMENTS, top_n=2, stream=True)
+
+    frames = [frame async for frame in stream_rerank(request)]
+    events = [json.loads(f[len("data: "):]) for f in frames[:-1]]
+
+    assert frames[-1] == "data: [DONE]\n\n"
+    assert [e["scored"] for e in events] == [1, 2, 3, 4]
+    assert all(len(e["results"]) == min(2, e["scored"]) for e in events)
+    assert [r["index"] for r in events[-1]["results"]] == [1, 2]
+    assert events[-1]["usage"]["total_tokens"] > 0
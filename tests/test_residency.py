@@ -0,0 +1,94 @@
+"""Test memory-budgeted model residency decisions"""
+import time
+
+import pytest
+
+from src.residency import ResidencyError, ResidencyManager
+
+
+def test_fits_without_eviction():
+    """A model that fits the free budget evicts nothing"""
+    residency = ResidencyManager(budget_gb=24)
+    residency.admit("qwen3-14b", 10, priority=1)
+
+    assert residency.plan("mistral-7b", 8) == []
+
+
+def test_evicts_least_important_model_first():
+    """Higher priority numbers are evicted before more important models"""
+    residency = ResidencyManager(budget_gb=24)
+    residency.admit("qwen3-14b", 10, priority=1)
+    residency.admit("mistral-7b", 8, priority=6)
+
+    assert residency.plan("deepseek-coder", 12) == ["mistral-7b"]
+
+
+def test_lru_within_same_priority():
+    """Among equal priorities the least recently used goes first"""
+    residency = ResidencyManager(budget_gb=10)
+    residency.admit("a", 4, priority=5)
+    residency.admit("b", 4, priority=5)
+    residency.touch("a")
+
+    assert residency.plan("c", 4) == ["b"]
+
+
+def test_pinned_and_busy_models_are_kept():
+    """Pinned models and models serving requests are never victims"""
+    busy = {"mistral-7b"}
+    residency = ResidencyManager(budget_gb=24, in_use=lambda model_id: model_id in busy)
+    residency.admit("qwen3-14b", 10, priority=1, pinned=True)
+    residency.admit("mistral-7b", 8, priority=6)
+    residency.admit("phi-3", 5, priority=7)
+
+    with pytest.raises(ResidencyError):
+        residency.plan("deepseek-coder", 12)
+
+    busy.clear()
+    assert residency.plan("deepseek-coder", 12) == ["phi-3", "mistral-7b"]
+
+
+def test_rejects_model_larger_than_budget():
+    """A model bigger than the whole budget is rejected and recorded"""
+    residency = ResidencyManager(budget_gb=8)
+
+    with pytest.raises(ResidencyError):
+        residency.plan("llama-vision", 12)
+    assert residency.events[-1]["action"] == "reject"
+
+
+def test_idle_models_past_ttl():
+    """Only unpinned, unused models idle past the TTL are reported"""
+    residency = ResidencyManager(budget_gb=24, idle_ttl_seconds=0.05)
+    residency.admit("old", 4, priority=5)
+    residency.admit("pinned", 4, priority=5, pinned=True)
+    time.sleep(0.1)
+    residency.admit("fresh", 4, priority=5)
+
+    assert residency.idle_models() == ["old"]
+
+
+def test_events_and_stats():
+    """Loads and unloads are logged with their reason"""
+    residency = ResidencyManager(budget_gb=24)
+    residency.admit("a", 4, priority=5)
+    residency.remove("a", reason="memory_pressure")
+
+    actions = [(e["model"], e["action"], e["reason"]) for e in residency.events]
+    assert actions == [("a", "load", "requested"), ("a", "unload", "memory_pressure")]
+    assert residency.stats["used_gb"] == 0
+
+
+def test_used_memory_follows_reserve_admit_and_remove():
+    """The running total matches the tracked models through a load's lifecycle"""
+    residency = ResidencyManager(budget_gb=24)
+    residency.reserve("a", 4, priority=5)
+    residency.admit("a", 4.5, priority=5)
+    residency.reserve("b", 6, priority=5)
+    assert residency.used_gb == pytest.approx(10.5)
+
+    residency.remove("b", reason="load_failed")
+    residency.remove("missing")
+    assert residency.used_gb == pytest.approx(4.5)
+    residency.remove("a")
+    assert residency.used_gb == 0
@@ -0,0 +1,154 @@
+"""Test the deterministic response cache"""
+import pytest
+
+from src.config import config
+from src.engine import BatchScheduler, GenerationResult, SamplingParams
+from src.response_cache import ResponseCache, cache_allowed, cache_key, is_deterministic
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def result(text: str = "Hello there", finish_reason: str = "stop") -> GenerationResult:
+    return GenerationResult(text=text, prompt_tokens=4, completion_tokens=2, finish_reason=finish_reason)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def aclose(self):
+        pass
+
+
+def test_key_covers_model_prompt_and_params():
+    """Anything that changes the output changes the key"""
+    params = SamplingParams(temperature=0, max_tokens=16)
+    key = cache_key("org/model", [1, 2, 3], params)
+
+    assert key == cache_key("org/model", [1, 2, 3], SamplingParams(temperature=0, max_tokens=16))
+    assert key != cache_key("org/other", [1, 2, 3], params)
+    assert key != cache_key("org/model", [1, 2, 4], params)
+    assert key != cache_key("org/model", [1, 2, 3], SamplingParams(temperature=0, max_tokens=17))
+    assert key != cache_key("org/model", [1, 2, 3], SamplingParams(temperature=0, stop_strings=("\n",)))
+    # Greedy decoding ignores the seed and top_p
+    assert key == cache_key("org/model", [1, 2, 3], SamplingParams(temperature=0, max_tokens=16, seed=5, top_p=0.5))
+    seeded = SamplingParams(temperature=0.7, max_tokens=16, seed=5)
+    assert cache_key("m", [1], seeded) != cache_key("m", [1], SamplingParams(temperature=0.7, max_tokens=16, seed=6))
+
+
+def test_only_deterministic_requests_are_cacheable():
+    assert is_deterministic(SamplingParams(temperature=0))
+    assert not is_deterministic(SamplingParams(temperature=0.9, seed=1))
+    assert not is_deterministic(SamplingParams(temperature=0.9))
+
+
+def test_cache_control_opts_out():
+    assert cache_allowed({})
+    assert cache_allowed({"cache-control": "max-age=60"})
+    assert not cache_allowed({"cache-control": "no-cache"})
+    assert not cache_allowed({"cache-control": "private, No-Store"})
+
+
+async def test_lru_evicts_and_entries_expire(monkeypatch):
+    """The in-process tier holds max_entries and drops entries past their TTL"""
+    now = [1000.0]
+    monkeypatch.setattr("src.response_cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=2, ttl_seconds=10)
+
+    await cache.put("a", result("a"))
+    await cache.put("b", result("b"))
+    assert (await cache.get("m", "a")).text == "a"  # a is now most recent
+    await cache.put("c", result("c"))
+
+    assert await cache.get("m", "b") is None
+    assert len(cache) == 2
+    now[0] += 11
+    assert await cache.get("m", "a") is None
+
+
+async def test_unfinished_results_are_not_cached():
+    cache = ResponseCache(max_entries=8, ttl_seconds=60)
+
+    await cache.put("k", result(finish_reason="cancelled"))
+
+    assert await cache.get("m", "k") is None
+
+
+async def test_redis_tier_shares_results_between_processes():
+    """A result stored by one process is found by another through Redis"""
+    redis = FakeRedis()
+    writer = ResponseCache(max_entries=8, ttl_seconds=60, redis_url="redis://test")
+    reader = ResponseCache(max_entries=8, ttl_seconds=60, redis_url="redis://test")
+    writer._redis = reader._redis = redis
+
+    await writer.put("k", result())
+
+    assert await reader.get("m", "k") == result()
+    assert len(reader) == 1  # Promoted to memory
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 0)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "enable_response_cache", True)
+    monkeypatch.setattr(config, "response_cache_redis", False)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    submitted = []
+    submit = BatchScheduler.submit
+
+    async def counting_submit(self, *args, **kwargs):
+        submitted.append(args)
+        return await submit(self, *args, **kwargs)
+
+    monkeypatch.setattr(BatchScheduler, "submit", counting_submit)
+    manager.submitted = submitted
+    try:
+        yield manager
+    finally:
+        await manager.shutdown()
+
+
+async def test_repeated_greedy_request_is_served_from_cache(manager):
+    first = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=8)
+    again = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=8)
+
+    assert again == first
+    assert len(manager.submitted) == 1
+
+
+async def test_sampled_and_opted_out_requests_generate(manager):
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.7, max_tokens=4)
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.7, max_tokens=4)
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.7, max_tokens=4, seed=1)
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0.7, max_tokens=4, seed=1)
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=4, cache=False)
+    await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=4, cache=False)
+
+    assert len(manager.submitted) == 6
+
+
+async def test_streamed_response_is_cached_and_replayed(manager):
+    """A finished stream fills the cache; the repeat replays deltas and the same result"""
+    stream = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=40, stream=True)
+    live = [item async for item in stream]
+
+    stream = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=40, stream=True)
+    replayed = [item async for item in stream]
+
+    assert replayed[-1] == live[-1]
+    assert "".join(i for i in replayed if isinstance(i, str)) == live[-1].text
+    assert sum(isinstance(i, str) for i in replayed) > 1
+    nonstream = await manager.generate_completion("synthetic/tiny", MESSAGES, temperature=0, max_tokens=40)
+    assert nonstream == live[-1]
+    assert manager.submitted == []
@@ -0,0 +1,381 @@
+"""Test the continuous-batching scheduler against a deterministic stub model"""
+import asyncio
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.engine.scheduler import BatchScheduler, SamplingParams
+
+
+class StubStepModel:
+    """Counts upwards from the last prompt token; token 0 is EOS"""
+
+    def __init__(self, vocab_size=100, kv_bytes=1, step_delay=0.0):
+        self.vocab_size = vocab_size
+        self.kv_bytes = kv_bytes
+        self.step_delay = step_delay
+        self.eos_token_ids = {0}
+        self.batch_sizes: list[int] = []
+        self.prefilled_tokens: list[int] = []
+
+    def kv_bytes_per_token(self):
+        return self.kv_bytes
+
+    def prefill(self, tokens, params, cache=None, cached_tokens=0):
+        if cache is not None:
+            assert list(cache) == list(tokens[:cached_tokens])
+        self.prefilled_tokens.append(len(tokens) - cached_tokens)
+        return {"tokens": list(tokens)}, (tokens[-1] + 1) % self.vocab_size
+
+    def decode(self, states, tokens):
+        self.batch_sizes.append(len(states))
+        if self.step_delay:
+            time.sleep(self.step_delay)
+        for state, token in zip(states, tokens, strict=True):
+            state["tokens"].append(token)
+        return [(t + 1) % self.vocab_size for t in tokens]
+
+    def detokenize(self, tokens):
+        return " ".join(str(t) for t in tokens)
+
+    def export_cache(self, state):
+        tokens = list(state["tokens"])
+        return tokens, len(tokens) * self.kv_bytes
+
+    def import_cache(self, handle, n_tokens, copy=True):
+        if n_tokens > len(handle):
+            return None
+        return handle[:n_tokens]
+
+    def release_cache(self, state):
+        return self.export_cache(state)
+
+
+@pytest.fixture
+def stub():
+    return StubStepModel(step_delay=0.001)
+
+
+async def test_single_sequence_is_deterministic(stub):
+    """A lone request decodes until max_tokens"""
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        result = await scheduler.submit([1, 2, 3], SamplingParams(max_tokens=4))
+    finally:
+        scheduler.stop()
+
+    assert result.text == "4 5 6 7"
+    assert result.prompt_tokens == 3
+    assert result.completion_tokens == 4
+    assert result.finish_reason == "length"
+
+
+async def test_eos_finishes_with_stop(stub):
+    """EOS ends the sequence and is not part of the output"""
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        result = await scheduler.submit([97], SamplingParams(max_tokens=10))
+    finally:
+        scheduler.stop()
+
+    assert result.text == "98 99"
+    assert result.finish_reason == "stop"
+
+
+async def test_stop_token_ids(stub):
+    """Explicit stop token ids end generation"""
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        result = await scheduler.submit([10], SamplingParams(max_tokens=10, stop_token_ids=frozenset({13})))
+    finally:
+        scheduler.stop()
+
+    assert result.text == "11 12"
+    assert result.finish_reason == "stop"
+
+
+async def test_concurrent_requests_share_decode_loop(stub):
+    """Concurrent sequences are decoded together in one batch"""
+    scheduler = BatchScheduler("stub", stub, max_batch_size=8)
+    try:
+        results = await asyncio.gather(*[
+            scheduler.submit([i * 10], SamplingParams(max_tokens=20)) for i in range(1, 5)
+        ])
+    finally:
+        scheduler.stop()
+
+    assert [r.completion_tokens for r in results] == [20, 20, 20, 20]
+    assert results[0].text.split()[0] == "11"
+    assert max(stub.batch_sizes) > 1
+
+
+async def test_short_sequence_retires_without_waiting(stub):
+    """A finished sequence resolves while longer ones keep decoding"""
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        long_task = asyncio.create_task(scheduler.submit([1], SamplingParams(max_tokens=80)))
+        short = await scheduler.submit([1], SamplingParams(max_tokens=2))
+        assert short.completion_tokens == 2
+        assert not long_task.done()
+        long = await long_task
+    finally:
+        scheduler.stop()
+
+    assert long.completion_tokens == 80
+
+
+async def test_batch_size_limited_by_kv_budget():
+    """Admission respects the KV budget, running one sequence at a time"""
+    stub = StubStepModel(kv_bytes=1, step_delay=0.001)
+    # Each sequence reserves 1 prompt + 10 new tokens = 11 bytes
+    scheduler = BatchScheduler("stub", stub, max_batch_size=8, kv_budget_bytes=lambda: 15)
+    try:
+        results = await asyncio.gather(*[
+            scheduler.submit([5], SamplingParams(max_tokens=10)) for _ in range(3)
+        ])
+    finally:
+        scheduler.stop()
+
+    assert all(r.completion_tokens == 10 for r in results)
+    assert max(stub.batch_sizes) == 1
+
+
+async def test_max_batch_size_cap(stub):
+    """The batch never grows past max_batch_size"""
+    scheduler = BatchScheduler("stub", stub, max_batch_size=2)
+    try:
+        await asyncio.gather(*[
+            scheduler.submit([5], SamplingParams(max_tokens=5)) for _ in range(6)
+        ])
+    finally:
+        scheduler.stop()
+
+    assert max(stub.batch_sizes) <= 2
+
+
+async def test_prefill_error_fails_only_that_request(stub):
+    """A failing prefill doesn't take down the rest of the batch"""
+    original = stub.prefill
+
+    def flaky_prefill(tokens, params):
+        if tokens == [-1]:
+            raise ValueError("bad prompt")
+        return original(tokens, params)
+
+    stub.prefill = flaky_prefill
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        good, bad = await asyncio.gather(
+            scheduler.submit([1], SamplingParams(max_tokens=3)),
+            scheduler.submit([-1], SamplingParams(max_tokens=3)),
+            return_exceptions=True,
+        )
+    finally:
+        scheduler.stop()
+
+    assert good.text == "2 3 4"
+    assert isinstance(bad, ValueError)
+
+
+async def test_queue_wait_and_service_time_are_recorded(stub):
+    """Each request's queue wait and service time land in per-model histograms"""
+    def count(name, **labels):
+        return REGISTRY.get_sample_value(f"{name}_count", {"model": "stub-metrics", **labels}) or 0
+
+    before = (count("llm_engine_queue_wait_seconds", priority="0"), count("llm_engine_service_seconds"))
+    scheduler = BatchScheduler("stub-metrics", stub, max_batch_size=1)
+    try:
+        await asyncio.gather(*[scheduler.submit([1], SamplingParams(max_tokens=3)) for _ in range(3)])
+    finally:
+        scheduler.stop()
+
+    assert count("llm_engine_queue_wait_seconds", priority="0") - before[0] == 3
+    assert count("llm_engine_service_seconds") - before[1] == 3
+    busy = REGISTRY.get_sample_value("llm_engine_worker_busy_seconds_total", {"model": "stub-metrics"})
+    assert busy > 0
+
+
+async def test_higher_priority_is_admitted_first():
+    """With one slot busy, an urgent request overtakes an earlier batch one"""
+    stub = StubStepModel(step_delay=0.002)
+    scheduler = BatchScheduler("stub", stub, max_batch_size=1)
+    done: list[str] = []
+
+    async def run(name, priority, max_tokens):
+        await scheduler.submit([1], SamplingParams(max_tokens=max_tokens), priority=priority)
+        done.append(name)
+
+    try:
+        blocker = asyncio.create_task(run("blocker", 0, 20))
+        await asyncio.sleep(0.01)
+        batch = asyncio.create_task(run("batch", 4, 3))
+        await asyncio.sleep(0)
+        urgent = asyncio.create_task(run("urgent", 0, 3))
+        await asyncio.gather(blocker, batch, urgent)
+    finally:
+        scheduler.stop()
+
+    assert done == ["blocker", "urgent", "batch"]
+
+
+async def test_aging_prevents_starvation():
+    """A long-waiting low-priority request is promoted above fresh urgent ones"""
+    stub = StubStepModel(step_delay=0.002)
+    scheduler = BatchScheduler("stub", stub, max_batch_size=1, aging_seconds=0.005)
+    done: list[str] = []
+
+    async def run(name, priority, max_tokens):
+        await scheduler.submit([1], SamplingParams(max_tokens=max_tokens), priority=priority)
+        done.append(name)
+
+    try:
+        blocker = asyncio.create_task(run("blocker", 0, 20))
+        await asyncio.sleep(0.005)
+        batch = asyncio.create_task(run("batch", 4, 3))
+        # Waits ~40ms, i.e. ~8 aging periods: outranks anything fresh at class 0
+        await asyncio.sleep(0.035)
+        urgent = asyncio.create_task(run("urgent", 0, 3))
+        await asyncio.gather(blocker, batch, urgent)
+    finally:
+        scheduler.stop()
+
+    assert done == ["blocker", "batch", "urgent"]
+
+
+async def test_flooding_tenant_does_not_starve_others():
+    """A tenant's backlog delays its own requests, not a newcomer's"""
+    stub = StubStepModel(step_delay=0.002)
+    scheduler = BatchScheduler("stub", stub, max_batch_size=1)
+    done: list[str] = []
+
+    async def run(name, tenant, max_tokens=3):
+        await scheduler.submit([1], SamplingParams(max_tokens=max_tokens), tenant=tenant)
+        done.append(name)
+
+    try:
+        blocker = asyncio.create_task(run("blocker", "noisy", 20))
+        await asyncio.sleep(0.005)
+        flood = [asyncio.create_task(run(f"noisy-{i}", "noisy")) for i in range(6)]
+        await asyncio.sleep(0)
+        quiet = asyncio.create_task(run("quiet", "quiet"))
+        await asyncio.gather(blocker, quiet, *flood)
+    finally:
+        scheduler.stop()
+
+    # At most one of the flood (tied tag, earlier arrival) goes before it
+    assert done.index("quiet") <= 2
+
+
+async def test_tenant_weights_skew_token_share():
+    """A weight-3 tenant is served three requests per one of a weight-1 tenant"""
+    stub = StubStepModel(step_delay=0.002)
+    weights = {"heavy": 3.0, "light": 1.0}
+    scheduler = BatchScheduler("stub", stub, max_batch_size=1, tenant_weight=lambda t: weights.get(t, 1.0))
+    done: list[str] = []
+
+    async def run(tenant, max_tokens=3):
+        await scheduler.submit([1], SamplingParams(max_tokens=max_tokens), tenant=tenant)
+        done.append(tenant)
+
+    try:
+        blocker = asyncio.create_task(run("blocker", 10))
+        await asyncio.sleep(0.005)
+        tasks = [asyncio.create_task(run("light")) for _ in range(4)]
+        tasks += [asyncio.create_task(run("heavy")) for _ in range(4)]
+        await asyncio.gather(blocker, *tasks)
+    finally:
+        scheduler.stop()
+
+    assert done[1:5] == ["heavy", "heavy", "light", "heavy"]
+    wait = REGISTRY.get_sample_value("llm_engine_tenant_queue_wait_seconds_count", {"model": "stub", "tenant": "heavy"})
+    assert wait >= 4
+
+
+async def test_submit_batch_prefills_each_prompt_once():
+    """n > 1 forks the prompt's KV cache instead of prefilling it again"""
+    stub = StubStepModel(step_delay=0.001)
+    scheduler = BatchScheduler("stub", stub)
+    prompts = [[1, 2, 3, 4], [10, 11, 12]]
+    try:
+        results = await scheduler.submit_batch(prompts, SamplingParams(max_tokens=3), n=3)
+    finally:
+        scheduler.stop()
+
+    assert [[r.text for r in choices] for choices in results] == [["5 6 7"] * 3, ["13 14 15"] * 3]
+    # One full prefill per prompt, then only the last prompt token per fork
+    assert sorted(stub.prefilled_tokens) == [1, 1, 1, 1, 3, 4]
+    # Everything decoded side by side
+    assert max(stub.batch_sizes) == 6
+
+
+async def test_submit_batch_cancels_all_when_abandoned():
+    stub = StubStepModel(vocab_size=10_000, step_delay=0.002)
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        task = asyncio.create_task(scheduler.submit_batch([[1], [2]], SamplingParams(max_tokens=5000), n=2))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.02)
+        assert scheduler._active == []
+    finally:
+        scheduler.stop()
+
+
+async def test_failed_prefill_leaves_its_fork_group():
+    """Siblings of a member whose prefill fails still fork, and the last one frees the snapshot"""
+    stub = StubStepModel(step_delay=0.001)
+    original = stub.prefill
+    calls = []
+
+    def failing_first(tokens, params, cache=None, cached_tokens=0):
+        calls.append(cached_tokens)
+        if len(calls) == 1:
+            raise ValueError("bad prefill")
+        return original(tokens, params, cache, cached_tokens)
+
+    stub.prefill = failing_first
+    scheduler = BatchScheduler("stub", stub)
+    groups = []
+    prefill = scheduler._prefill
+
+    def recording_prefill(seq):
+        groups.append(seq.fork_group)
+        return prefill(seq)
+
+    scheduler._prefill = recording_prefill
+    try:
+        with pytest.raises(ValueError, match="bad prefill"):
+            await scheduler.submit_batch([[1, 2, 3, 4]], SamplingParams(max_tokens=3), n=3)
+    finally:
+        scheduler.stop()
+
+    group = groups[0]
+    assert all(g is group for g in groups)
+    # The second member prefilled in full, the third forked its snapshot
+    assert calls == [0, 0, 3]
+    assert group.remaining == 0
+    assert group.handle is None
+
+
+async def test_loop_error_fails_waiting_requests_and_keeps_running(stub):
+    """An unexpected error in admission fails the queue instead of killing the decode thread"""
+    calls = []
+
+    def flaky_budget():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("dictionary changed size during iteration")
+        return None
+
+    scheduler = BatchScheduler("stub", stub, kv_budget_bytes=flaky_budget)
+    try:
+        with pytest.raises(RuntimeError, match="dictionary changed size"):
+            await asyncio.wait_for(scheduler.submit([1], SamplingParams(max_tokens=3)), timeout=5)
+        result = await asyncio.wait_for(scheduler.submit([1], SamplingParams(max_tokens=3)), timeout=5)
+    finally:
+        scheduler.stop()
+
+    assert result.text == "2 3 4"
@@ -0,0 +1,121 @@
+"""Test KV caches pinned to chat sessions between turns"""
+from src.engine.scheduler import BatchScheduler, SamplingParams
+from src.engine.session_cache import SessionKVCache
+
+from .test_scheduler import StubStepModel
+
+SYSTEM = list(range(100, 140))
+
+
+def make_scheduler(stub, **cache_kwargs):
+    options = {"max_total_bytes": 10_000, "max_session_bytes": 10_000, "min_tokens": 4}
+    options.update(cache_kwargs)
+    session_cache = SessionKVCache(**options)
+    return BatchScheduler("stub", stub, session_cache=session_cache), session_cache
+
+
+async def test_second_turn_prefills_only_new_messages():
+    """Turn two reuses the prompt and reply of turn one"""
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(stub)
+    try:
+        turn1_prompt = [*SYSTEM, 1, 2]
+        turn1 = await scheduler.submit(turn1_prompt, SamplingParams(max_tokens=3), session_id="vista-1")
+        reply = [int(t) for t in turn1.text.split()]
+        turn2_prompt = [*turn1_prompt, *reply, 7, 8]
+        await scheduler.submit(turn2_prompt, SamplingParams(max_tokens=3), session_id="vista-1")
+    finally:
+        scheduler.stop()
+
+    # The final reply token was never fed back, so it is prefilled with the new turn
+    assert stub.prefilled_tokens == [len(turn1_prompt), 3]
+    assert session_cache.hits == 1
+
+
+async def test_edited_history_is_trimmed_to_common_prefix():
+    """A changed history reuses only the part that still matches"""
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(stub)
+    try:
+        await scheduler.submit([*SYSTEM, 1, 2], SamplingParams(max_tokens=3), session_id="s")
+        await scheduler.submit([*SYSTEM, 9, 9, 9], SamplingParams(max_tokens=3), session_id="s")
+    finally:
+        scheduler.stop()
+
+    assert stub.prefilled_tokens[1] == 3
+    assert session_cache.hits == 1
+
+
+async def test_diverged_history_invalidates_cache():
+    """Too little overlap drops the pinned cache"""
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(stub)
+    try:
+        await scheduler.submit([*SYSTEM, 1], SamplingParams(max_tokens=2), session_id="s")
+        await scheduler.submit([1, 2, 3, 4, 5, 6], SamplingParams(max_tokens=2), session_id="s")
+    finally:
+        scheduler.stop()
+
+    assert stub.prefilled_tokens[1] == 6
+    assert session_cache.invalidations == 1
+
+
+async def test_sessions_do_not_share_caches():
+    """A different session id never reuses another conversation's cache"""
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(stub)
+    try:
+        await scheduler.submit([*SYSTEM, 1], SamplingParams(max_tokens=2), session_id="a")
+        await scheduler.submit([*SYSTEM, 1, 2, 3], SamplingParams(max_tokens=2), session_id="b")
+        assert "a" in session_cache and "b" in session_cache
+    finally:
+        scheduler.stop()
+
+    assert stub.prefilled_tokens[1] == len(SYSTEM) + 3
+    assert session_cache.hits == 0
+
+
+async def test_global_cap_evicts_least_recent_session():
+    """Pinned caches are evicted LRU to honour the global cap"""
+    evicted = []
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(
+        stub,
+        max_total_bytes=100,
+        on_evict=lambda session_id, *_: evicted.append(session_id),
+    )
+    try:
+        for session_id in ["a", "b", "c"]:
+            await scheduler.submit([*SYSTEM, 1], SamplingParams(max_tokens=2), session_id=session_id)
+        assert session_cache.total_bytes <= 100
+        assert "a" not in session_cache
+        assert "c" in session_cache
+    finally:
+        scheduler.stop()
+
+    assert evicted == ["a"]
+
+
+async def test_per_session_cap_skips_oversized_caches():
+    """A single conversation larger than the per-session cap is not pinned"""
+    stub = StubStepModel()
+    scheduler, session_cache = make_scheduler(stub, max_session_bytes=10)
+    try:
+        await scheduler.submit([*SYSTEM, 1], SamplingParams(max_tokens=2), session_id="s")
+    finally:
+        scheduler.stop()
+
+    assert len(session_cache) == 0
+
+
+def test_drop_session():
+    """Deleting a session releases its pinned cache"""
+    stub = StubStepModel()
+    session_cache = SessionKVCache(max_total_bytes=1000, max_session_bytes=1000, min_tokens=4)
+    session_cache.pin("s", "stub", SYSTEM, stub, {"tokens": list(SYSTEM)})
+    assert session_cache.total_bytes == len(SYSTEM)
+
+    session_cache.drop("s")
+
+    assert session_cache.total_bytes == 0
+    assert session_cache.take("s", "stub", [*SYSTEM, 1]) is None
@@ -0,0 +1,83 @@
+"""Test streaming stop-string matching"""
+import random
+
+from src.engine.scheduler import BatchScheduler, SamplingParams
+from src.engine.stop import StopStringMatcher
+
+from .test_scheduler import StubStepModel
+
+
+def run(stops, deltas):
+    matcher = StopStringMatcher(tuple(stops))
+    out = [matcher.feed(d) for d in deltas]
+    if not matcher.stopped:
+        out.append(matcher.flush())
+    return out, matcher.stopped
+
+
+def test_stop_split_across_deltas_is_never_emitted():
+    out, stopped = run(["</answer>"], ["The cat</", "ans", "wer> and more"])
+    assert stopped
+    assert "".join(out) == "The cat"
+    assert all("<" not in chunk for chunk in out)
+
+
+def test_partial_match_is_released_when_it_diverges():
+    out, stopped = run(["STOP"], ["ST", "O", "x", " done"])
+    assert not stopped
+    assert out[:2] == ["", ""]
+    assert "".join(out) == "STOx done"
+
+
+def test_overlapping_stops_cut_at_earliest_start():
+    out, stopped = run(["bcd", "abcde", "c"], ["xab", "cde"])
+    assert stopped
+    assert "".join(out) == "xab"
+
+
+def test_matches_naive_search():
+    rng = random.Random(0)
+    for _ in range(300):
+        stops = ["".join(rng.choices("ab", k=rng.randint(1, 4))) for _ in range(rng.randint(1, 4))]
+        text = "".join(rng.choices("abc", k=rng.randint(0, 20)))
+        cuts = sorted(rng.sample(range(len(text) + 1), k=min(3, len(text) + 1)))
+        deltas = [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)], strict=True)]
+
+        out, stopped = run(stops, deltas)
+        # Reference: earliest-ending occurrence, longest stop among those ending there
+        ends = [(text.find(s) + len(s), -len(s)) for s in stops if s in text]
+        if ends:
+            end, neg_len = min(ends)
+            assert stopped and "".join(out) == text[:end + neg_len], (stops, text)
+        else:
+            assert not stopped and "".join(out) == text
+
+
+async def test_scheduler_stops_at_multi_token_string():
+    """Decoding ends as soon as the stop string appears; it is not returned"""
+    stub = StubStepModel()
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        result = await scheduler.submit([1], SamplingParams(max_tokens=50, stop_strings=("4 5",)))
+        stream = scheduler.stream([1], SamplingParams(max_tokens=50, stop_strings=("4 5",)))
+        deltas = [d async for d in stream]
+    finally:
+        scheduler.stop()
+
+    assert result.text == "2 3 "
+    assert result.finish_reason == "stop"
+    assert result.completion_tokens == 4
+    assert "".join(deltas) == "2 3 "
+    assert stream.result.finish_reason == "stop"
+
+
+async def test_unmatched_stop_reports_length():
+    stub = StubStepModel()
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        result = await scheduler.submit([1], SamplingParams(max_tokens=3, stop_strings=("4 5",)))
+    finally:
+        scheduler.stop()
+
+    assert result.text == "2 3 4"
+    assert result.finish_reason == "length"
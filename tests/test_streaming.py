@@ -0,0 +1,145 @@
+"""Test token-by-token streaming through the batch scheduler"""
+import asyncio
+import itertools
+import time
+
+from src.engine.detokenizer import IncrementalDetokenizer
+from src.engine.scheduler import BatchScheduler, SamplingParams
+from src.engine.streaming import QueuePosition, iter_with_queue_position
+
+from .test_scheduler import StubStepModel
+
+
+class TestIncrementalDetokenizer:
+    """Test text deltas produced from token ids"""
+
+    def test_deltas_join_to_full_text(self):
+        vocab = {1: "Dzień", 2: " dobry", 3: ",", 4: " doktorze"}
+        detok = IncrementalDetokenizer(lambda ids: "".join(vocab[i] for i in ids))
+
+        deltas = [detok.add_token(t) for t in [1, 2, 3, 4]]
+        deltas.append(detok.finalize())
+
+        assert deltas[:4] == ["Dzień", " dobry", ",", " doktorze"]
+        assert detok.text == "Dzień dobry, doktorze"
+
+    def test_holds_back_partial_utf8(self):
+        # Byte-level tokens: "ż" is two bytes split across tokens
+        raw = "żaba".encode()
+        detok = IncrementalDetokenizer(lambda ids: bytes(ids).decode("utf-8", errors="replace"))
+
+        first = detok.add_token(raw[0])
+        second = detok.add_token(raw[1])
+
+        assert first == ""
+        assert second == "ż"
+        for b in raw[2:]:
+            detok.add_token(b)
+        detok.finalize()
+        assert detok.text == "żaba"
+
+
+async def test_stream_yields_each_token_as_sampled():
+    """First delta arrives long before the sequence finishes"""
+    stub = StubStepModel(step_delay=0.01)
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        start = time.monotonic()
+        stream = scheduler.stream([1], SamplingParams(max_tokens=20))
+        arrivals = []
+        deltas = []
+        async for delta in stream:
+            arrivals.append(time.monotonic() - start)
+            deltas.append(delta)
+    finally:
+        scheduler.stop()
+
+    ttft = arrivals[0]
+    total = arrivals[-1]
+    inter_token = [b - a for a, b in itertools.pairwise(arrivals)]
+
+    assert len(deltas) == 20
+    assert "".join(deltas) == stream.result.text
+    assert stream.result.finish_reason == "length"
+    assert ttft < total / 4
+    assert max(inter_token) < 0.5
+
+
+async def test_streaming_does_not_block_event_loop():
+    """Other coroutines keep running while a stream decodes"""
+    stub = StubStepModel(step_delay=0.005)
+    scheduler = BatchScheduler("stub", stub)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.create_task(ticker())
+    try:
+        async for _ in scheduler.stream([1], SamplingParams(max_tokens=20)):
+            pass
+    finally:
+        task.cancel()
+        scheduler.stop()
+
+    assert ticks > 10
+
+
+async def test_slow_reader_pauses_only_its_sequence():
+    """Backpressure holds a stalled stream without stalling the batch"""
+    stub = StubStepModel(step_delay=0.001)
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        slow = scheduler.stream([1], SamplingParams(max_tokens=50), buffer_size=2)
+        fast = await scheduler.submit([1], SamplingParams(max_tokens=30))
+        # The slow stream hasn't been read, so it must not have run ahead
+        assert fast.completion_tokens == 30
+        assert slow._backlog <= 2
+
+        deltas = [delta async for delta in slow]
+    finally:
+        scheduler.stop()
+
+    assert len(deltas) == 50
+
+
+async def test_closing_stream_frees_the_sequence():
+    """Closing a stream early retires its sequence"""
+    stub = StubStepModel(step_delay=0.001)
+    scheduler = BatchScheduler("stub", stub)
+    try:
+        stream = scheduler.stream([1], SamplingParams(max_tokens=1000), buffer_size=4)
+        await stream.__anext__()
+        stream.close()
+        for _ in range(100):
+            if scheduler.active_count == 0:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert scheduler.active_count == 0
+
+
+async def test_queued_stream_reports_position():
+    """A stream waiting for a slot yields QueuePosition events, then text"""
+    stub = StubStepModel(step_delay=0.002)
+    scheduler = BatchScheduler("stub", stub, max_batch_size=1)
+    try:
+        blocker = asyncio.create_task(scheduler.submit([1], SamplingParams(max_tokens=30)))
+        await asyncio.sleep(0.01)
+        stream = scheduler.stream([10], SamplingParams(max_tokens=3))
+        items = [item async for item in iter_with_queue_position(stream, interval=0.01)]
+        await blocker
+    finally:
+        scheduler.stop()
+
+    positions = [item for item in items if isinstance(item, QueuePosition)]
+    text = [item for item in items if isinstance(item, str)]
+    assert positions and positions[0].position == 0
+    assert items.index(positions[-1]) < items.index(text[0])
+    assert "".join(text) == "11 12 13"
+    assert stream.queue_position() is None
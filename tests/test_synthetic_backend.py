@@ -0,0 +1,141 @@
+"""Test the deterministic synthetic backend and serving through it"""
+import time
+
+import pytest
+
+from src.config import config
+from src.engine import BatchScheduler, SamplingParams, SyntheticBackend, SyntheticTokenizer
+
+
+def test_tokenizer_round_trips_text_and_special_tokens():
+    """Bytes and ChatML markers encode to ids and decode back unchanged"""
+    tokenizer = SyntheticTokenizer()
+    text = tokenizer.apply_chat_template([{"role": "user", "content": "zażółć"}], add_generation_prompt=True)
+    tokens = tokenizer.encode(text)
+
+    assert tokenizer.decode(tokens) == text
+    assert tokens[0] in tokenizer.all_special_ids
+    assert tokens.count(tokenizer.SPECIAL_TOKENS.index("<|im_end|>")) == 1
+
+
+async def test_output_is_deterministic_and_independent_of_batching():
+    """The same prompt and seed produce the same text alone or in a batch"""
+    loaded = SyntheticBackend().load("org/model")
+    tokenizer = loaded.tokenizer
+    prompt = tokenizer.encode("Hello")
+    params = SamplingParams(max_tokens=12, seed=7)
+
+    scheduler = BatchScheduler("synthetic", loaded.step_model)
+    try:
+        alone = await scheduler.submit(prompt, params)
+        batched = await scheduler.submit_batch([prompt, tokenizer.encode("Other")], params, n=2)
+    finally:
+        scheduler.stop()
+
+    assert alone.completion_tokens == 12
+    assert alone.text.strip()
+    assert batched[0][0].text == alone.text
+
+
+def test_decode_latency_is_applied_per_step():
+    """Each decode step costs the configured time regardless of batch size"""
+    step_model = SyntheticBackend(decode_ms_per_step=20).load("org/model").step_model
+    states = [step_model.prefill([10 + i], SamplingParams())[0] for i in range(4)]
+
+    start = time.perf_counter()
+    step_model.decode(states, [11, 12, 13, 14])
+
+    assert 0.015 < time.perf_counter() - start < 0.2
+
+
+def test_kv_handles_follow_the_cache_contract():
+    """Exported caches truncate on import and survive the disk codec"""
+    step_model = SyntheticBackend(kv_bytes_per_token=16).load("org/model").step_model
+    state, _ = step_model.prefill([11, 12, 13, 14], SamplingParams())
+    handle, nbytes = step_model.export_cache(state)
+
+    assert nbytes == 4 * 16
+    assert step_model.import_cache(handle, 2) == [11, 12]
+    assert step_model.import_cache(handle, 5) is None
+    arrays, metadata = step_model.cache_to_arrays(handle)
+    assert step_model.cache_from_arrays(arrays, metadata) == (handle, nbytes)
+
+
+def test_memory_usage_tracks_resident_models():
+    """Loaded models count towards active memory until they are dropped"""
+    backend = SyntheticBackend(model_gb=2)
+    loaded = backend.load("org/model")
+
+    assert backend.memory_usage()["active_gb"] == pytest.approx(2.0)
+    del loaded
+    assert backend.memory_usage()["active_gb"] == 0
+    assert backend.memory_usage()["peak_gb"] == pytest.approx(2.0)
+
+
+async def test_model_manager_serves_chat_with_synthetic_backend(monkeypatch):
+    """Load, prompt rendering and generation run end to end without MLX"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "synthetic_decode_ms_per_step", 0)
+    monkeypatch.setattr(config, "synthetic_prefill_ms_per_token", 0)
+    monkeypatch.setattr(config, "enable_warmup", False)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    try:
+        messages = [{"role": "user", "content": "Hi"}]
+        first = await manager.generate_completion("synthetic/tiny", messages, max_tokens=8, seed=1)
+        again = await manager.generate_completion("synthetic/tiny", messages, max_tokens=8, seed=1)
+    finally:
+        await manager.shutdown()
+
+    assert first.completion_tokens == 8
+    assert first.text == again.text
+    assert "synthetic/tiny" in manager.models
+    assert manager.memory_usage["active_gb"] > 0
+
+
+async def test_failed_load_releases_reservation_and_stops_scheduler(monkeypatch):
+    """A load that fails after its scheduler started leaves nothing behind"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "enable_warmup", False)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    started = []
+
+    def failing_admit(*args, **kwargs):
+        started.extend(manager.schedulers.values())
+        raise RuntimeError("admit failed")
+
+    monkeypatch.setattr(manager.residency, "admit", failing_admit)
+    try:
+        with pytest.raises(RuntimeError, match="admit failed"):
+            await manager.load_model("synthetic/tiny")
+    finally:
+        await manager.shutdown()
+
+    assert len(started) == 1
+    assert not started[0]._running
+    assert manager.schedulers == {}
+    assert manager.prompt_caches == {}
+    assert manager.models == {}
+    assert "synthetic/tiny" not in manager.residency.models
+
+
+async def test_headroom_counts_unconfigured_model_footprints(monkeypatch):
+    """Cache budgets shrink by the weights residency tracks, configured or not"""
+    monkeypatch.setattr(config, "inference_backend", "synthetic")
+    monkeypatch.setattr(config, "enable_warmup", False)
+    monkeypatch.setattr(config, "synthetic_model_gb", 4)
+    monkeypatch.setattr(config, "max_model_memory_gb", 16)
+    from src.model_manager import ModelManager
+
+    manager = ModelManager()
+    try:
+        assert manager._headroom_bytes() == 16 * 1024**3
+        await manager.load_model("synthetic/tiny")
+        footprint = manager.residency.models["synthetic/tiny"].memory_gb
+        assert footprint > 0
+        assert manager._headroom_bytes() == int((16 - footprint) * 1024**3)
+    finally:
+        await manager.shutdown()
@@ -0,0 +1,65 @@
+"""Test the post-load warmup pass"""
+import pytest
+
+from src.engine.prefix_cache import PrefixCache
+from src.engine.warmup import synthetic_prompt, warmup
+
+from .test_scheduler import StubStepModel
+
+
+class TrackingStub(StubStepModel):
+    """Stub that also records released caches"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.released = 0
+
+    def release_cache(self, state):
+        self.released += 1
+        return super().release_cache(state)
+
+
+def test_synthetic_prompt_lengths():
+    """Prompts are the base tokens repeated to the exact length"""
+    assert synthetic_prompt([1, 2, 3], 7) == [1, 2, 3, 1, 2, 3, 1]
+    assert synthetic_prompt([], 3) == [0, 0, 0]
+
+
+def test_warmup_prefills_each_length_and_decodes_batched():
+    """Every prompt is prefilled, then decoded together for the given steps"""
+    stub = TrackingStub()
+    prompts = [synthetic_prompt([5, 6], n) for n in (4, 16, 64)]
+
+    elapsed = warmup("stub", stub, prompts, decode_steps=2)
+
+    assert elapsed >= 0
+    assert stub.prefilled_tokens == [4, 16, 64]
+    assert stub.batch_sizes == [3, 3]
+    assert stub.released == 3
+
+
+def test_warmup_seeds_prefix_cache_with_system_prompts():
+    """Cached prompts are snapshotted so real requests reuse them"""
+    stub = TrackingStub()
+    cache = PrefixCache("stub", stub, budget_bytes=lambda: 1 << 20, min_tokens=4)
+    system = list(range(1, 41))
+
+    warmup("stub", stub, [[1, 2, 3, 4]], decode_steps=1, cache_prompts=[system], prefix_cache=cache)
+
+    hit = cache.lookup([*system, 90, 91, 92])
+    assert hit is not None
+    assert hit.n_tokens == len(system)
+    assert stub.released == 2
+
+
+def test_warmup_releases_states_on_error():
+    """A failing decode still frees the prefilled caches"""
+    stub = TrackingStub()
+
+    def broken_decode(states, tokens):
+        raise RuntimeError("kernel failure")
+
+    stub.decode = broken_decode
+    with pytest.raises(RuntimeError):
+        warmup("stub", stub, [[1, 2], [3, 4]])
+    assert stub.released == 2